@@ -46,3 +46,12 @@ class Dummy:
         if random_number >= 1.0 - self.p:
             return 1.0
         return 0.0
+
+    def score_batch(self, matrix):
+        """Classifies each row of matrix as anomalous with probability p.
+
+        :param matrix: (numpy.ndarray) N x D data matrix (only N is used).
+        :return: (numpy.ndarray) anomaly scores for the N elements.
+        """
+        random_numbers = np.random.uniform(size=matrix.shape[0])
+        return np.where(random_numbers >= 1.0 - self.p, 1.0, 0.0)
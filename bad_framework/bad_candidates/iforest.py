@@ -43,3 +43,8 @@ class IForest:
             raise ValueError("invalid state. The model has not been trained.")
         element = element.reshape(1, -1)
         return -self._model.decision_function(element)[0]
+
+    def score_batch(self, matrix):
+        if not self._model:
+            raise ValueError("invalid state. The model has not been trained.")
+        return -self._model.decision_function(matrix)
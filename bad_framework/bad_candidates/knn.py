@@ -16,8 +16,12 @@ class KNN:
     - k: (int) number of neighbors to consider (defaults to 10). Must
     be smaller than the data set size.
     - seed: (int) random number generator seed.
+
+    Supports sweeps over k: the neighbors are computed once for the largest k.
     """
 
+    sweep_parameter = "k"
+
     def __init__(self, **kwargs):
         param_k = int(kwargs.get("k", 10))
         if param_k < 1:
@@ -42,3 +46,34 @@ class KNN:
         )  # neighbor_distances has shape (1, k)
         knn_distance = neighbor_distances[0][-1]
         return knn_distance
+
+    def score_batch(self, matrix):
+        if not self._model:
+            raise ValueError("invalid state. The model has not been trained.")
+
+        neighbor_distances, _ = self._model.kneighbors(
+            matrix
+        )  # neighbor_distances has shape (N, k)
+        return neighbor_distances[:, -1]
+
+    def score_sweep(self, matrix, values):
+        """Scores matrix for each value of k in values.
+
+        The candidate must be fitted with the largest k in values.
+
+        :param matrix: (numpy.ndarray) N x D data matrix.
+        :param values: (list[int]) values of k.
+        :return: (list[numpy.ndarray]) anomaly scores for each value of k.
+        :raises ValueError: if any value of k is not positive.
+        """
+        if not self._model:
+            raise ValueError("invalid state. The model has not been trained.")
+
+        for k in values:
+            if int(k) < 1:
+                raise ValueError(
+                    "invalid parameter value. k must be positive: k={}".format(k)
+                )
+
+        neighbor_distances, _ = self._model.kneighbors(matrix, n_neighbors=max(values))
+        return [neighbor_distances[:, int(k) - 1] for k in values]
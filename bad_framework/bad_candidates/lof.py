@@ -3,6 +3,20 @@
 All rights reserved.
 """
 from sklearn.neighbors import LocalOutlierFactor
+import numpy as np
+
+
+def _local_reachability_density(distances, indices, k_distances):
+    """Computes the local reachability density of the query elements.
+
+    :param distances: (numpy.ndarray) distances to the k neighbors of each element.
+    :param indices: (numpy.ndarray) indices of the k neighbors of each element.
+    :param k_distances: (numpy.ndarray) k-distance of each training element.
+    :return: (numpy.ndarray) local reachability density of each element.
+    """
+    reach_distances = np.maximum(distances, k_distances[indices])
+    # 1e-10 avoids division by zero with many duplicates, as in scikit-learn
+    return 1.0 / (np.mean(reach_distances, axis=1) + 1e-10)
 
 
 class LOF:
@@ -18,8 +32,12 @@ class LOF:
 
     This class wraps the implementation provided by the scikit-learn library
     (https://scikit-learn.org/stable/modules/generated/sklearn.neighbors.LocalOutlierFactor.html).  # noqa 501
+
+    Supports sweeps over k: the neighbors are computed once for the largest k.
     """
 
+    sweep_parameter = "k"
+
     def __init__(self, **kwargs):
         self.k = int(kwargs.get("k", 10))
         self._model = None
@@ -38,3 +56,46 @@ class LOF:
             raise ValueError("invalid state. The model has not been trained.")
         element = element.reshape(1, -1)
         return -self._model.decision_function(element)[0]
+
+    def score_batch(self, matrix):
+        if not self._model:
+            raise ValueError("invalid state. The model has not been trained.")
+        return -self._model.decision_function(matrix)
+
+    def score_sweep(self, matrix, values):
+        """Scores matrix for each value of k in values.
+
+        The candidate must be fitted with the largest k in values. Scores match
+        the ones of a candidate fitted with each k, up to ties in neighbor distances.
+
+        :param matrix: (numpy.ndarray) N x D data matrix.
+        :param values: (list[int]) values of k.
+        :return: (list[numpy.ndarray]) anomaly scores for each value of k.
+        :raises ValueError: if any value of k is not positive.
+        """
+        if not self._model:
+            raise ValueError("invalid state. The model has not been trained.")
+
+        for k in values:
+            if int(k) < 1:
+                raise ValueError(
+                    "invalid parameter value. k must be positive: k={}".format(k)
+                )
+
+        max_k = self._model.n_neighbors_
+        fit_distances, fit_indices = self._model.kneighbors(n_neighbors=max_k)
+        distances, indices = self._model.kneighbors(matrix, n_neighbors=max_k)
+
+        scores = []
+        for k in values:
+            k = min(int(k), max_k)
+            k_distances = fit_distances[:, k - 1]
+            fit_lrd = _local_reachability_density(
+                fit_distances[:, :k], fit_indices[:, :k], k_distances
+            )
+            lrd = _local_reachability_density(
+                distances[:, :k], indices[:, :k], k_distances
+            )
+            lof = np.mean(fit_lrd[indices[:, :k]] / lrd[:, np.newaxis], axis=1)
+            scores.append(lof + self._model.offset_)
+        return scores
@@ -100,6 +100,20 @@ class PartKNN:
         element_key = tuple(element)
         return self._model.get(element_key, 0.0)
 
+    def score_batch(self, matrix):
+        """Returns the scores corresponding to each row of matrix.
+
+        :param matrix:
+        :return:
+        """
+        if not self._model:
+            raise ValueError("invalid state. The model has not been trained.")
+        return np.fromiter(
+            (self._model.get(element_key, 0.0) for element_key in map(tuple, matrix)),
+            dtype=float,
+            count=matrix.shape[0],
+        )
+
 
 def main():
 
@@ -123,7 +137,7 @@ def main():
     print("Done.")
 
     print("Generating scores...")
-    np.apply_along_axis(model.score, axis=1, arr=sample_matrix)
+    model.score_batch(sample_matrix)
     print("Scores generated correctly.")
 
 
@@ -149,13 +149,27 @@ def _load_data_spec(data_url):
 
 
 def _load_workers(workers_filepath):
+    """Loads the worker addresses from the workers file.
 
+    Each line has the form host:port[:slots]. When the number of slots is not
+    specified, the worker advertises its own slots to the master.
+
+    :param workers_filepath: (string) path to the workers file.
+    :return: (list[tuple]) list of (host, port, slots) tuples, slots may be None.
+    """
     with open(workers_filepath, "r") as workers_file:
         workers = []
         for line in workers_file:
             if line.strip() and not line.startswith("#"):
-                worker_host, worker_port = line.strip().split(":")
-                workers.append((worker_host, worker_port))
+                fields = line.strip().split(":")
+                if len(fields) == 2:
+                    worker_host, worker_port = fields
+                    worker_slots = None
+                elif len(fields) == 3:
+                    worker_host, worker_port, worker_slots = fields
+                else:
+                    raise ValueError("invalid worker specification: {}".format(line))
+                workers.append((worker_host, worker_port, worker_slots))
     return workers
 
 
@@ -197,16 +211,16 @@ def _start_server(config):
 
     workers_path = config["bad.workers"]
     workers = _load_workers(workers_path)
-    for hostname, port in workers:
+    for hostname, port, slots in workers:
         log.info(">>> Starting BAD worker at %s on port %s", hostname, port)
-        start_bad_worker(hostname, port, debug)
+        start_bad_worker(hostname, port, debug, slots)
         log.info("<<< Done.")
 
 
 def _stop_server(config):
 
     workers = _load_workers(config["bad.workers"])
-    for hostname, port in workers:
+    for hostname, port, _ in workers:
         log.info(">>> Stopping BAD worker at %s on port %s", hostname, port)
         stop_bad_worker(hostname)
         log.info("<<< Done.")
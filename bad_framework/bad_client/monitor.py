@@ -4,69 +4,62 @@ All rights reserved.
 """
 import datetime
 import logging
-import time
 
 from bad_framework.bad_client.ui import print_status_bar
-from bad_framework.bad_utils.adt import ExperimentStatus
 
 log = logging.getLogger("bad.client")
 
 
-def initialize_status_cache(suite_experiments):
-    if not suite_experiments:
-        raise ValueError("suite not found.")
-    status_cache = {}
-    for experiment in suite_experiments:
-        status_cache[experiment["id"]] = experiment["status"]
-    return status_cache
-
-
-def get_suite_experiments(master_session, suite_id):
-    suite_status_url = "suite/{suite_id}/status/".format(suite_id=suite_id)
-    suite_status = master_session.get_json(suite_status_url)
-    if not suite_status:
-        raise ValueError("suite not found.")
-    return suite_status["experiments"]
-
-
-def get_count_by_status(status_cache, query_status):
-    if not status_cache:
-        raise ValueError("invalid status cache: {}".format(status_cache))
-    if query_status not in ExperimentStatus.valid_statuses():
-        raise ValueError("invalid status: {}", query_status)
-    experiments_with_status = [
-        status for status in status_cache.values() if status == query_status
-    ]
-    return len(experiments_with_status)
-
+def get_suite_status_update(master_session, suite_id, version, timeout):
+    """Waits for the suite status to change after a given feed version.
 
-def update_status_cache(suite_experiments, status_cache):
-    for experiment in suite_experiments:
-        if status_cache[experiment["id"]] != experiment["status"]:
-            status_cache[experiment["id"]] = experiment["status"]
+    :param master_session: (HTTPSession) session to the BAD master.
+    :param suite_id: (string) suite identifier.
+    :param version: (int) last feed version received.
+    :param timeout: (float) maximum waiting time on the master, in seconds.
+    :return: (dict) status update with the new feed version, the status
+    counters and the changed experiments.
+    """
+    suite_stream_url = (
+        "suite/{suite_id}/status/stream/?version={version}&timeout={timeout}".format(
+            suite_id=suite_id, version=version, timeout=timeout
+        )
+    )
+    return master_session.get_json(suite_stream_url)
 
 
 def monitor_suite(master_session, suite_id, heartbeat_interval=1):
-    """Monitors the suite execution from the client. Polls status updates
-    at regular intervals and prints a status bar.
+    """Monitors the suite execution from the client. Waits for status updates
+    from the master and prints a status bar.
+
+    Updates are long-polled: the master replies as soon as some experiment
+    status changes, or after the heartbeat interval at the latest, and only
+    sends the changed experiments and the status counters.
 
-    :param master_session:
+    :param master_session: (HTTPSession) session to the BAD master.
     :param suite_id: (string) suite identifier.
-    :param heartbeat_interval:
+    :param heartbeat_interval: (float) maximum interval between status bar updates,
+    in seconds.
     :return: None
     """
     log.info(">>> Starting run monitor")
-    suite_experiments = get_suite_experiments(master_session, suite_id)
-    status_cache = initialize_status_cache(suite_experiments)
-
-    total = len(status_cache)
+    status_update = get_suite_status_update(master_session, suite_id, 0, 0)
+    total = sum(status_update["summary"].values())
+    if not total:
+        raise ValueError("suite not found.")
     start_ts = datetime.datetime.now()
+    version = 0
 
     while True:
-        suite_experiments = get_suite_experiments(master_session, suite_id)
-        update_status_cache(suite_experiments, status_cache)
-        completed = get_count_by_status(status_cache, "completed")
-        failed = get_count_by_status(status_cache, "failed")
+        status_update = get_suite_status_update(
+            master_session, suite_id, version, heartbeat_interval
+        )
+        version = status_update["version"]
+        for experiment in status_update["changes"]:
+            if experiment["status"] == "failed":
+                log.warning("Experiment %s failed.", experiment["id"])
+        completed = status_update["summary"].get("completed", 0)
+        failed = status_update["summary"].get("failed", 0)
         print_status_bar(
             start_ts=start_ts,
             completed_num=completed,
@@ -74,12 +67,7 @@ def monitor_suite(master_session, suite_id, heartbeat_interval=1):
             experiments_num=total,
         )
         # If the suite is completed break
-        if all(
-            status == "completed" or status == "failed"
-            for status in status_cache.values()
-        ):
+        if completed + failed >= total:
             print()  # Print a newline to skip over the status bar
             break
-        # Otherwise, wait and retry
-        time.sleep(heartbeat_interval)
     log.info("<<< Run completed.")
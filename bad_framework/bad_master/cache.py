@@ -0,0 +1,128 @@
+"""Copyright (C) 2020 Sivam Pasupathipillai <sivam.pasupathipillai@gmail.com>.
+
+All rights reserved.
+
+Content-addressed cache of experiment results for the BAD master.
+"""
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+
+from bad_framework.bad_utils import get_parameter_string, load_parameter_string
+
+log = logging.getLogger("bad.server.master")
+
+
+def get_result_key(candidate_digest, data_digest, parameters):
+    """Returns the cache key of an experiment result.
+
+    The key only depends on the content of the candidate source and data set,
+    and on the experiment parameters, regardless of their order.
+
+    :param candidate_digest: (string) SHA-256 digest of the candidate source.
+    :param data_digest: (string) SHA-256 digest of the data set.
+    :param parameters: (string) experiment parameter string.
+    :return: (string) hexadecimal cache key.
+
+    >>> get_result_key("c", "d", "a=1;b=2") == get_result_key("c", "d", "b=2;a=1")
+    True
+    """
+    normalized_parameters = get_parameter_string(
+        dict(sorted(load_parameter_string(parameters).items()))
+    )
+    result_key = hashlib.sha256()
+    for key_field in (candidate_digest, data_digest, normalized_parameters):
+        result_key.update(key_field.encode())
+        result_key.update(b"\0")
+    return result_key.hexdigest()
+
+
+class ResultCache:
+    """Stores experiment results on disk, one directory per result key.
+
+    Each entry holds the metrics file, including the ROC curve, and the
+    experiment execution time. Entries are written to a temporary directory and renamed
+    into place, so a partially written entry is never visible.
+
+    Cached files belong to the experiment that first produced them, use
+    copy_result() to reuse them for another experiment.
+    """
+
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+
+    def _get_entry_dir(self, result_key):
+        return os.path.join(self.cache_dir, result_key)
+
+    def get(self, result_key):
+        """Returns a cached experiment result.
+
+        :param result_key: (string) cache key, see get_result_key().
+        :return: (dict) metrics_path and execution_time of the cached result,
+        None if the result is not cached.
+        """
+        entry_dir = self._get_entry_dir(result_key)
+        try:
+            with open(os.path.join(entry_dir, "entry.json"), "r") as entry_file:
+                entry = json.load(entry_file)
+        except FileNotFoundError:
+            return None
+        return {
+            "metrics_path": os.path.join(entry_dir, "metrics.json"),
+            "execution_time": entry["execution_time"],
+        }
+
+    def put(self, result_key, metrics_path, execution_time):
+        """Copies an experiment result into the cache.
+
+        :param result_key: (string) cache key, see get_result_key().
+        :param metrics_path: (string) path to the metrics file.
+        :param execution_time: (int) experiment execution time, in microseconds.
+        """
+        entry_dir = self._get_entry_dir(result_key)
+        if os.path.exists(entry_dir):
+            return
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp_dir = tempfile.mkdtemp(dir=self.cache_dir)
+        try:
+            shutil.copyfile(metrics_path, os.path.join(tmp_dir, "metrics.json"))
+            with open(os.path.join(tmp_dir, "entry.json"), "w") as entry_file:
+                json.dump({"execution_time": execution_time}, entry_file)
+        except Exception:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            raise
+        try:
+            os.rename(tmp_dir, entry_dir)
+        except OSError:
+            # Another request cached the same result in the meantime
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    def copy_result(self, result_key, experiment_dir, experiment_id):
+        """Copies a cached experiment result into an experiment directory.
+
+        The experiment id in the metrics file is replaced with the given one.
+
+        :param result_key: (string) cache key, see get_result_key().
+        :param experiment_dir: (string) path to the experiment directory.
+        :param experiment_id: (string) id of the experiment reusing the result.
+        :return: (dict) metrics_path and execution_time of the copied result,
+        None if the result is not cached.
+        """
+        cached_result = self.get(result_key)
+        if cached_result is None:
+            return None
+        with open(cached_result["metrics_path"], "r") as metrics_file:
+            metrics = json.load(metrics_file)
+        metrics["experiment_id"] = experiment_id
+
+        os.makedirs(experiment_dir, exist_ok=True)
+        metrics_path = os.path.join(experiment_dir, "metrics.json")
+        with open(metrics_path, "w") as metrics_file:
+            metrics_file.write(json.dumps(metrics, indent=2))
+        return {
+            "metrics_path": metrics_path,
+            "execution_time": cached_result["execution_time"],
+        }
@@ -0,0 +1,147 @@
+"""Copyright (C) 2020 Sivam Pasupathipillai <sivam.pasupathipillai@gmail.com>.
+
+All rights reserved.
+
+Experiment cost model for the BAD master.
+"""
+import heapq
+import math
+
+from bad_framework.bad_utils import load_parameter_string
+
+DEFAULT_RATE = 1e-8  # seconds per work unit, before any observation
+SMOOTHING = 0.3
+
+
+def _get_parameter(parameters, name, default):
+    try:
+        return max(float(parameters.get(name, default)), 1.0)
+    except ValueError:
+        return default
+
+
+def _get_forest_work(n, d, parameters):
+    trees_num = _get_parameter(parameters, "m", 10)
+    partition_size = _get_parameter(parameters, "partition_size", 50)
+    return trees_num * (partition_size + n) * math.log2(partition_size + 1) * d
+
+
+def _get_bagging_work(n, d, parameters):
+    estimators_num = _get_parameter(parameters, "m", 10)
+    return estimators_num * (n * n * d + n * _get_parameter(parameters, "k", 10))
+
+
+def _get_partitioned_work(n, d, parameters):
+    partitions_num = _get_parameter(parameters, "partitions_num", 10)
+    return n * n * d / partitions_num + n * _get_parameter(parameters, "k", 10)
+
+
+# Candidate name -> function(elements, features, parameters) returning the
+# asymptotic work of an experiment, in arbitrary units
+_work_functions = {
+    "FeatureBagging": _get_bagging_work,
+    "IForest": _get_forest_work,
+    "KNN": lambda n, d, p: n * n * d + n * _get_parameter(p, "k", 10),
+    "LOCI": lambda n, d, p: n * n * (n + d),
+    "LOF": lambda n, d, p: n * n * d + 2 * n * _get_parameter(p, "k", 10),
+    "OCSVM": lambda n, d, p: n * n * d,
+    "PartKNN": _get_partitioned_work,
+}
+
+
+def get_experiment_work(candidate_name, dataset_shape, parameters):
+    """Returns the asymptotic work of an experiment.
+
+    Unknown candidates are assumed to be linear in the data set size.
+
+    :param candidate_name: (string) candidate class name.
+    :param dataset_shape: (tuple) (number of elements, number of features).
+    :param parameters: (string) experiment parameter string.
+    :return: (float) work units.
+
+    >>> get_experiment_work("KNN", (100, 2), "k=10") > get_experiment_work(
+    ...     "KNN", (10, 2), "k=10")
+    True
+    >>> get_experiment_work("Custom", (100, 2), "seed=1")
+    200.0
+    """
+    elements_num, features_num = (max(float(size), 1.0) for size in dataset_shape)
+    work_function = _work_functions.get(candidate_name, lambda n, d, p: n * d)
+    return work_function(elements_num, features_num, load_parameter_string(parameters))
+
+
+def get_lpt_makespan(costs, slots):
+    """Returns the makespan of the longest-processing-time-first schedule of
+    tasks on identical slots.
+
+    :param costs: (list[float]) task costs, in seconds.
+    :param slots: (int) number of slots.
+    :return: (float) makespan, in seconds.
+
+    >>> get_lpt_makespan([3, 3, 2, 2, 2], 2)
+    7
+    >>> get_lpt_makespan([], 2)
+    0
+    """
+    slot_loads = [0] * max(slots, 1)
+    for cost in sorted(costs, reverse=True):
+        heapq.heapreplace(slot_loads, slot_loads[0] + cost)
+    return max(slot_loads)
+
+
+class CostModel:
+    """Estimates the execution time of the experiments.
+
+    The estimate is the work of the experiment, see get_experiment_work(),
+    times the rate, i.e. seconds per work unit, of its candidate on its data set.
+    Rates are refined online from the execution times of the completed
+    experiments, as exponential moving averages of their logarithm. A candidate
+    without observations on a data set uses its rate on the other data sets.
+    """
+
+    def __init__(self, default_rate=DEFAULT_RATE, smoothing=SMOOTHING):
+        self._default_log_rate = math.log(default_rate)
+        self._smoothing = smoothing
+        self._log_rates = {}  # (candidate, data set) or candidate -> log(rate)
+
+    def _get_log_rate(self, candidate_name, dataset_name):
+        return self._log_rates.get(
+            (candidate_name, dataset_name),
+            self._log_rates.get(candidate_name, self._default_log_rate),
+        )
+
+    def estimate(self, candidate_name, dataset_name, dataset_shape, parameters):
+        """Returns the estimated execution time of an experiment.
+
+        :param candidate_name: (string) candidate class name.
+        :param dataset_name: (string) data set name.
+        :param dataset_shape: (tuple) (number of elements, number of features).
+        :param parameters: (string) experiment parameter string.
+        :return: (float) execution time, in seconds.
+        """
+        work = get_experiment_work(candidate_name, dataset_shape, parameters)
+        return work * math.exp(self._get_log_rate(candidate_name, dataset_name))
+
+    def observe(
+        self, candidate_name, dataset_name, dataset_shape, parameters, execution_time
+    ):
+        """Refines the rates with the execution time of a completed experiment.
+
+        :param candidate_name: (string) candidate class name.
+        :param dataset_name: (string) data set name.
+        :param dataset_shape: (tuple) (number of elements, number of features).
+        :param parameters: (string) experiment parameter string.
+        :param execution_time: (float) execution time, in seconds.
+        """
+        work = get_experiment_work(candidate_name, dataset_shape, parameters)
+        if execution_time <= 0 or work <= 0:
+            return
+        observed_log_rate = math.log(execution_time / work)
+        for rate_key in ((candidate_name, dataset_name), candidate_name):
+            log_rate = self._log_rates.get(rate_key)
+            if log_rate is None:
+                self._log_rates[rate_key] = observed_log_rate
+            else:
+                self._log_rates[rate_key] = log_rate + self._smoothing * (
+                    observed_log_rate - log_rate
+                )
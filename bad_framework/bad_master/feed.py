@@ -0,0 +1,69 @@
+"""Copyright (C) 2020 Sivam Pasupathipillai <sivam.pasupathipillai@gmail.com>.
+
+All rights reserved.
+
+Suite status feeds for the BAD master.
+"""
+import asyncio
+
+
+class StatusFeed:
+    """Log of the experiment status changes of a suite.
+
+    Each change increments the feed version, so a client that knows the
+    version it last saw only needs the changes that followed, see get_changes().
+    Clients can wait for new changes with wait(), which implements long-polling.
+    """
+
+    _feeds = {}
+
+    def __init__(self):
+        self._changes = []  # (experiment id, status string), in order
+        self._waiters = set()
+
+    @classmethod
+    def get_by_suite(cls, suite_id):
+        if suite_id not in cls._feeds:
+            cls._feeds[suite_id] = StatusFeed()
+        return cls._feeds[suite_id]
+
+    @property
+    def version(self):
+        return len(self._changes)
+
+    def publish(self, experiment_id, status):
+        """Appends a status change and wakes up the waiting clients.
+
+        :param experiment_id: (string) experiment id.
+        :param status: (string) new experiment status.
+        """
+        self._changes.append((experiment_id, status))
+        for waiter in self._waiters:
+            if not waiter.done():
+                waiter.set_result(None)
+        self._waiters.clear()
+
+    def get_changes(self, version):
+        """Returns the latest status of each experiment that changed after a version.
+
+        :param version: (int) feed version known to the client.
+        :return: (dict) experiment id -> status string.
+        """
+        return dict(self._changes[version:])
+
+    async def wait(self, version, timeout):
+        """Waits until the feed moves past a version, or the timeout expires.
+
+        :param version: (int) feed version known to the client.
+        :param timeout: (float) maximum waiting time, in seconds.
+        """
+        if version != self.version or timeout <= 0:
+            return
+        waiter = asyncio.get_event_loop().create_future()
+        self._waiters.add(waiter)
+        try:
+            await asyncio.wait_for(waiter, timeout=timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            self._waiters.discard(waiter)
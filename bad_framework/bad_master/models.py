@@ -8,9 +8,15 @@ import glob
 import json
 import logging
 import os
-
-from bad_framework.bad_utils.adt import ExperimentStatus
-from bad_framework.bad_utils.files import get_candidate_name, get_include_dir
+import time
+
+from bad_framework.bad_master.feed import StatusFeed
+from bad_framework.bad_utils.adt import ExperimentStatus, RangeParameter, ValueParameter
+from bad_framework.bad_utils.files import (
+    get_candidate_name,
+    get_candidate_sweep_parameter,
+    get_include_dir,
+)
 from bad_framework.bad_utils.network import AsyncHTTPSessionManager
 
 logging.basicConfig(
@@ -20,6 +26,16 @@ log = logging.getLogger("bad.server.master")
 
 
 class Model:
+    """Base class for the master models.
+
+    Objects are kept in the class-level _objects dict. When a ModelStore is
+    set, every object is also saved to the store on creation and on update,
+    see save(), and can be restored after a master restart, see restore_models().
+    """
+
+    _store = None  # Shared by all models, None when persistence is disabled
+    _fields = ()  # Attributes saved to the store
+
     @classmethod
     def get_by_id(cls, query_id):
         return cls._objects[query_id]
@@ -32,15 +48,62 @@ class Model:
     def _get_id(cls, tag):
         return tag[:4] + str(uuid4())[:8]
 
+    @classmethod
+    def set_store(cls, store):
+        Model._store = store
+
+    @classmethod
+    def _register(cls, new_object):
+        """Adds an object to the model collection and indexes."""
+        cls._objects[new_object.id] = new_object
+
+    def to_record(self):
+        """Returns the JSON-serializable state of the object."""
+        return {field: getattr(self, field) for field in self._fields}
+
+    @classmethod
+    def from_record(cls, record):
+        """Rebuilds an object from its state, as returned by to_record()."""
+        restored_object = cls.__new__(cls)
+        restored_object.__dict__.update(record)
+        return restored_object
+
+    @classmethod
+    def restore(cls, record):
+        restored_object = cls.from_record(record)
+        cls._register(restored_object)
+        return restored_object
+
+    def save(self):
+        if Model._store:
+            Model._store.save(type(self).__name__, self.id, self.to_record())
+
+    def delete(self):
+        """Removes the object from the model collection and from the store."""
+        del type(self)._objects[self.id]
+        if Model._store:
+            Model._store.delete(type(self).__name__, self.id)
+
 
 class Candidate(Model):
 
     _objects = {}
+    _suite_index = {}  # suite id -> candidate id
+    _fields = (
+        "id",
+        "suite",
+        "name",
+        "sweep_parameter",
+        "source",
+        "parameters",
+        "requirements",
+    )
 
     def __init__(self, suite_id, source_filename, parameters, requirements):
         self.id = self._get_id("candidate")
         self.suite = suite_id
         self.name = get_candidate_name(source_filename)
+        self.sweep_parameter = get_candidate_sweep_parameter(source_filename)
         self.source = source_filename
         self.parameters = parameters
         self.requirements = requirements
@@ -48,19 +111,43 @@ class Candidate(Model):
     @classmethod
     def create(cls, suite_id, source_filename, parameters, requirements):
         new_candidate = Candidate(suite_id, source_filename, parameters, requirements)
-        cls._objects[new_candidate.id] = new_candidate
+        cls._register(new_candidate)
+        new_candidate.save()
         return new_candidate
 
+    @classmethod
+    def _register(cls, new_candidate):
+        cls._objects[new_candidate.id] = new_candidate
+        cls._suite_index.setdefault(new_candidate.suite, new_candidate.id)
+
+    def to_record(self):
+        record = super().to_record()
+        record["parameters"] = {
+            name: list(parameter) for name, parameter in self.parameters.items()
+        }
+        return record
+
+    @classmethod
+    def from_record(cls, record):
+        candidate = super().from_record(record)
+        candidate.parameters = {
+            name: ValueParameter(*value) if len(value) == 1 else RangeParameter(*value)
+            for name, value in record["parameters"].items()
+        }
+        return candidate
+
     @classmethod
     def get_by_suite(cls, suite_id):
-        for candidate in cls._objects.values():
-            if candidate.suite == suite_id:
-                return candidate
+        candidate_id = cls._suite_index.get(suite_id)
+        if candidate_id:
+            return cls._objects[candidate_id]
 
 
 class Dataset(Model):
 
     _objects = {}
+    _name_index = {}  # dataset name -> dataset id
+    _fields = ("id", "name", "path")
 
     def __init__(self, dataset_name, file_path):
         self.id = self._get_id("dataset")
@@ -70,27 +157,60 @@ class Dataset(Model):
     @classmethod
     def create(cls, dataset_name, file_path):
         new_dataset = Dataset(dataset_name, file_path)
-        cls._objects[new_dataset.id] = new_dataset
+        cls._register(new_dataset)
+        new_dataset.save()
         return new_dataset
 
+    @classmethod
+    def _register(cls, new_dataset):
+        cls._objects[new_dataset.id] = new_dataset
+        cls._name_index.setdefault(new_dataset.name, new_dataset.id)
+
     @classmethod
     def get_by_name(cls, name):
-        for dataset in cls._objects.values():
-            if dataset.name == name:
-                return dataset
+        dataset_id = cls._name_index.get(name)
+        if dataset_id:
+            return cls._objects[dataset_id]
 
     @classmethod
     def setup(cls):
+        """Creates the data sets bundled with the framework, unless already created.
+
+        Bundled data sets live in the package directory, which may change across
+        master restarts, hence they are set up on every start and never saved.
+        """
         data_dir = os.path.join(get_include_dir(), "data")
         arff_files = glob.glob("{data_dir}/*.arff".format(data_dir=data_dir))
         for dataset_file in arff_files:
             dataset_name = os.path.splitext(os.path.basename(dataset_file))[0]
-            cls.create(dataset_name=dataset_name, file_path=dataset_file)
+            if not cls.get_by_name(dataset_name):
+                cls.create(dataset_name=dataset_name, file_path=dataset_file)
+
+    def save(self):
+        pass  # See setup()
 
 
 class Experiment(Model):
 
     _objects = {}
+    _suite_index = {}  # suite id -> list of experiment ids, in creation order
+    _status_counts = {}  # suite id -> {status: number of experiments}
+    _fields = (
+        "id",
+        "suite",
+        "candidate",
+        "completed_ts",
+        "dataset",
+        "metrics",
+        "parameters",
+        "roc",
+        "scheduled_ts",
+        "scores",
+        "status",
+        "cache_key",
+        "execution_time",
+    )
+    _timestamp_fields = ("completed_ts", "scheduled_ts")
 
     _status_strings = {
         ExperimentStatus.CREATED: "created",
@@ -112,13 +232,33 @@ class Experiment(Model):
         self.scheduled_ts = None
         self.scores = None
         self.status = ExperimentStatus.CREATED
+        self.cache_key = None
+        self.execution_time = None  # microseconds
+
+    def update_status(self, status, execution_time=None):
+        """Updates the experiment status and publishes the change.
 
-    def update_status(self, status):
+        :param status: (string) new experiment status.
+        :param execution_time: (int) execution time in microseconds, as measured
+        by the worker. When missing, a completed experiment's execution time is
+        the time elapsed since it started running.
+        """
         if status == ExperimentStatus.RUNNING:
             self.scheduled_ts = datetime.datetime.now()
         if status == ExperimentStatus.COMPLETED:
             self.completed_ts = datetime.datetime.now()
+            if execution_time is not None:
+                self.execution_time = execution_time
+            elif self.scheduled_ts:
+                self.execution_time = int(
+                    (self.completed_ts - self.scheduled_ts).total_seconds() * 1e6
+                )
+        status_counts = self._status_counts[self.suite]
+        status_counts[self.status] -= 1
+        status_counts[status] += 1
         self.status = status
+        self.save()
+        StatusFeed.get_by_suite(self.suite).publish(self.id, self.get_status_string())
 
     def load_metrics(self):
         if self.metrics:
@@ -130,16 +270,55 @@ class Experiment(Model):
     @classmethod
     def create(cls, suite_id, candidate_id, dataset_name, parameters):
         new_experiment = Experiment(suite_id, candidate_id, dataset_name, parameters)
-        cls._objects[new_experiment.id] = new_experiment
+        cls._register(new_experiment)
+        new_experiment.save()
         return new_experiment
 
+    @classmethod
+    def _register(cls, new_experiment):
+        cls._objects[new_experiment.id] = new_experiment
+        cls._suite_index.setdefault(new_experiment.suite, []).append(new_experiment.id)
+        status_counts = cls._status_counts.setdefault(
+            new_experiment.suite, {status: 0 for status in cls._status_strings}
+        )
+        status_counts[new_experiment.status] += 1
+
+    def to_record(self):
+        record = super().to_record()
+        for field in self._timestamp_fields:
+            if record[field]:
+                record[field] = record[field].isoformat()
+        return record
+
+    @classmethod
+    def from_record(cls, record):
+        experiment = super().from_record(record)
+        for field in cls._timestamp_fields:
+            if record[field]:
+                setattr(experiment, field, datetime.datetime.fromisoformat(record[field]))
+        return experiment
+
     @classmethod
     def get_by_suite(cls, suite_id):
-        suite_experiments = []
-        for experiment in cls._objects.values():
-            if experiment.suite == suite_id:
-                suite_experiments.append(experiment)
-        return suite_experiments
+        return [
+            cls._objects[experiment_id]
+            for experiment_id in cls._suite_index.get(suite_id, [])
+        ]
+
+    @classmethod
+    def get_status_counts(cls, suite_id):
+        """Returns the number of experiments of a suite for each status.
+
+        The counts are kept up to date by update_status(), so this does not
+        scan the suite experiments.
+
+        :param suite_id: (string) suite id.
+        :return: (dict) status string -> number of experiments.
+        """
+        status_counts = cls._status_counts.get(suite_id, {})
+        return {
+            cls._status_strings[status]: count for status, count in status_counts.items()
+        }
 
     def get_status_string(self):
         return self._status_strings[self.status]
@@ -148,6 +327,7 @@ class Experiment(Model):
 class Suite(Model):
 
     _objects = {}
+    _fields = ("id", "created_ts")
 
     def __init__(self):
         self.id = self._get_id("suite")
@@ -156,30 +336,110 @@ class Suite(Model):
     @classmethod
     def create(cls):
         new_suite = Suite()
-        cls._objects[new_suite.id] = new_suite
+        cls._register(new_suite)
+        new_suite.save()
         return new_suite
 
 
 class Worker(Model):
 
     _objects = {}
+    _fields = ("id", "hostname", "port", "master_address", "configured_slots", "slots")
+    last_heartbeat = None  # time.monotonic() of the last sign of life, not saved
 
-    def __init__(self, hostname, port, master_address):
+    def __init__(self, hostname, port, master_address, slots=None):
         self.id = self._get_id("worker")
         self.hostname = hostname
         self.port = int(port)
         self.master_address = master_address
-        self.session = AsyncHTTPSessionManager(
+        # Slots set in the workers file take precedence over the advertised ones
+        self.configured_slots = int(slots) if slots else None
+        self.slots = self.configured_slots or 1
+        self.session = self._get_session()
+
+    def _get_session(self):
+        return AsyncHTTPSessionManager.get_session(
             domain="{hostname}:{port}".format(hostname=self.hostname, port=self.port)
         )
 
+    def set_advertised_slots(self, slots):
+        """Sets the number of slots advertised by the worker process,
+        unless the slots are already configured in the workers file.
+
+        :param slots: (int) number of experiments the worker can run concurrently.
+        """
+        if not self.configured_slots:
+            self.slots = max(int(slots), 1)
+            self.save()
+
+    def record_heartbeat(self):
+        self.last_heartbeat = time.monotonic()
+
     @classmethod
-    def create(cls, hostname, port, master_address):
-        new_worker = Worker(hostname, port, master_address)
-        cls._objects[new_worker.id] = new_worker
+    def create(cls, hostname, port, master_address, slots=None):
+        new_worker = Worker(hostname, port, master_address, slots)
+        cls._register(new_worker)
+        new_worker.save()
         return new_worker
 
+    @classmethod
+    def from_record(cls, record):
+        worker = super().from_record(record)
+        worker.session = worker._get_session()
+        return worker
+
     @classmethod
     def setup(cls, workers, master_address):
-        for hostname, port in workers:
-            cls.create(hostname, port, master_address)
+        """Reconciles the workers with the ones listed in the workers file.
+
+        Existing workers, e.g. restored after a master restart, are kept if
+        listed with the same hostname and port, and updated with the listed
+        settings. Missing workers are created, unlisted workers are removed.
+
+        :param workers: (list[tuple]) list of (hostname, port, slots) tuples.
+        :param master_address: (string) master address, as seen by the workers.
+        """
+        current_workers = {(w.hostname, w.port): w for w in cls.get_all()}
+        for hostname, port, slots in workers:
+            worker = current_workers.pop((hostname, int(port)), None)
+            if worker is None:
+                cls.create(hostname, port, master_address, slots)
+            else:
+                worker.master_address = master_address
+                worker.configured_slots = int(slots) if slots else None
+                worker.slots = worker.configured_slots or worker.slots
+                worker.save()
+        for worker in current_workers.values():
+            log.info("Removing worker %s:%d", worker.hostname, worker.port)
+            worker.delete()
+
+
+def restore_models(store):
+    """Restores the master state saved in a store and saves all further
+    updates to it.
+
+    Experiments that were scheduled or running when the master stopped are
+    set back to created, so that they are dispatched again. Completed and
+    failed experiments are left untouched.
+
+    :param store: (store.ModelStore) model store.
+    """
+    for model_class in (Suite, Candidate, Worker, Experiment):
+        for record in store.load(model_class.__name__):
+            model_class.restore(record)
+    Model.set_store(store)
+
+    interrupted_experiments = [
+        experiment
+        for experiment in Experiment.get_all()
+        if experiment.status in (ExperimentStatus.SCHEDULED, ExperimentStatus.RUNNING)
+    ]
+    for experiment in interrupted_experiments:
+        experiment.update_status(ExperimentStatus.CREATED)
+    store.flush()
+    log.info(
+        "Restored %d suites from %s (%d interrupted experiments).",
+        len(Suite.get_all()),
+        store.db_path,
+        len(interrupted_experiments),
+    )
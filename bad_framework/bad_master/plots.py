@@ -0,0 +1,67 @@
+"""Copyright (C) 2020 Sivam Pasupathipillai <sivam.pasupathipillai@gmail.com>.
+
+All rights reserved.
+
+Result plots for the BAD master.
+
+Workers send the ROC curve points in the metrics file, see bad_worker.runner,
+and the master renders the ROC plots on demand. Plots are rendered with the
+object-oriented Figure API, without the pyplot global state, so they can be
+rendered in background threads.
+"""
+import json
+import os
+import tempfile
+
+from bad_framework.bad_utils.lazy import lazy_import
+
+backend_agg = lazy_import("matplotlib.backends.backend_agg")
+figure = lazy_import("matplotlib.figure")
+
+
+def render_roc_plot(fpr, tpr, roc_file):
+    """Renders a ROC curve as a PNG image.
+
+    :param fpr: (list[float]) false positive rates of the curve points.
+    :param tpr: (list[float]) true positive rates of the curve points.
+    :param roc_file: (file) binary file the image is written to.
+    :return: None
+    """
+    roc_figure = figure.Figure()
+    backend_agg.FigureCanvasAgg(roc_figure)
+    axes = roc_figure.add_subplot(1, 1, 1)
+    axes.set_xlabel("False Positive Rate")
+    axes.set_ylabel("True Positive Rate")
+    axes.plot([0, 1], [0, 1], color="navy", linestyle="--")
+    axes.set_xlim([0.0, 1.0])
+    axes.set_ylim([0.0, 1.05])
+    axes.set_title("ROC")
+    axes.plot(fpr, tpr, color="blue", lw=2)
+    roc_figure.savefig(roc_file, format="png")
+
+
+def render_roc_file(metrics_path, roc_path):
+    """Renders the ROC curve of a metrics file to a PNG file.
+
+    The image is written to a temporary file, renamed into place once complete,
+    so concurrent requests never read a partially written plot.
+
+    :param metrics_path: (string) path to the metrics file.
+    :param roc_path: (string) path to the PNG file.
+    :return: None
+    """
+    with open(metrics_path, "r") as metrics_file:
+        roc_curve = json.load(metrics_file).get("roc_curve")
+    if roc_curve is None:
+        raise ValueError("ROC curve not found in metrics file.")
+
+    tmp_file = tempfile.NamedTemporaryFile(
+        dir=os.path.dirname(roc_path) or ".", delete=False
+    )
+    try:
+        with tmp_file:
+            render_roc_plot(roc_curve["fpr"], roc_curve["tpr"], tmp_file)
+        os.replace(tmp_file.name, roc_path)
+    except BaseException:
+        os.remove(tmp_file.name)
+        raise
@@ -0,0 +1,667 @@
+"""Copyright (C) 2020 Sivam Pasupathipillai <sivam.pasupathipillai@gmail.com>.
+
+All rights reserved.
+
+Event-driven experiment scheduler for the BAD master.
+"""
+import asyncio
+import collections
+import logging
+import time
+import traceback
+
+from bad_framework.bad_master.costs import CostModel, get_lpt_makespan
+from bad_framework.bad_utils import get_parameter_string, load_parameter_string
+from bad_framework.bad_utils.adt import ExperimentStatus
+from bad_framework.bad_utils.errors import SchedulingError
+
+log = logging.getLogger("bad.server.master")
+
+
+class Task:
+    """A group of experiments of a suite, dispatched together to the same worker.
+
+    All experiments in a task use the same data set. Among tasks with the same
+    estimated cost, pending tasks are dispatched in increasing order.
+    """
+
+    def __init__(self, experiments, order=0, cost=0.0):
+        self.experiments = list(experiments)
+        self.order = order
+        self.cost = cost  # estimated execution time, in seconds
+        self.retries = 0
+
+    @property
+    def dataset(self):
+        return self.experiments[0].dataset
+
+    def get_pending_experiments(self):
+        return [
+            experiment
+            for experiment in self.experiments
+            if experiment.status
+            not in (ExperimentStatus.COMPLETED, ExperimentStatus.FAILED)
+        ]
+
+    def is_done(self):
+        return not self.get_pending_experiments()
+
+
+def group_experiments(experiments, sweep_parameter=None):
+    """Groups the experiments that only differ in the value of the sweep parameter.
+
+    Each group runs as a single task, so that the worker fits the candidate once
+    for the whole parameter sweep. Without a sweep parameter, each experiment
+    is a group on its own.
+
+    :param experiments: (list[models.Experiment]) experiments to group.
+    :param sweep_parameter: (string) name of the candidate sweep parameter.
+    :return: (list[list[models.Experiment]]) experiment groups, in order.
+    """
+    if not sweep_parameter:
+        return [[experiment] for experiment in experiments]
+    groups = {}
+    for experiment in experiments:
+        parameters = load_parameter_string(experiment.parameters)
+        if sweep_parameter in parameters:
+            del parameters[sweep_parameter]
+            group_key = (experiment.dataset, get_parameter_string(parameters))
+        else:
+            group_key = (experiment.id,)
+        groups.setdefault(group_key, []).append(experiment)
+    return list(groups.values())
+
+
+class SuiteScheduler:
+    """Dispatches the experiments of a suite to the workers.
+
+    Tasks are dispatched longest first, so that the longest tasks do not
+    delay the suite completion by starting last. Task costs are estimated by
+    the cost model, which is shared by all suites and refined with the
+    execution time of each completed experiment, see costs.CostModel.
+
+    Pending tasks are kept in queues, one for each data set, sorted by their
+    initial cost estimate. A free worker gets the costliest task heading the
+    queue of a data set it already holds, so that workers download and load as
+    few data sets as possible. Only when it holds none of the pending data
+    sets, it gets the costliest task heading any queue, so that it does not
+    idle.
+
+    Each worker runs up to worker.slots tasks concurrently and has a free-slot
+    signal, which is set while the worker can accept a new task. The signal is
+    cleared when all the worker slots are taken and set again when all the
+    experiments of one of its tasks are either completed or failed.
+
+    The scheduling loop only wakes up on these events, so it never blocks
+    the IOLoop while waiting for a free worker.
+
+    Workers that are still being set up join the scheduling as soon as they are
+    ready, see set_worker_ready(), while workers whose setup failed are removed,
+    see remove_worker().
+
+    Running tasks are checked periodically, see check_runs(). Workers whose
+    last heartbeat is older than worker_timeout seconds are removed, and
+    runs lasting longer than experiment_timeout seconds per experiment are
+    stopped. Their tasks are dispatched again, up to MAX_RETRIES times, after
+    which their experiments fail.
+
+    When speculation_factor is set, once all tasks are dispatched, tasks that
+    have run speculation_factor times longer than their estimated cost are run
+    again on a free worker. Each run of a task has its own run id, which the
+    worker sends back with the results: the first run to send a result wins
+    and the other runs are stopped.
+    """
+
+    _schedulers = {}
+    cost_model = CostModel()
+    speculation_factor = 0.0  # disabled when 0
+    worker_timeout = 30.0  # seconds, disabled when 0
+    experiment_timeout = 0.0  # seconds, disabled when 0
+    MAX_RETRIES = 2
+    MIN_SPECULATION_TIME = 5.0  # seconds a task runs before it can be copied
+
+    def __init__(self, suite_id, workers, ready=True):
+        if not workers:
+            raise SchedulingError("no workers available for suite {}".format(suite_id))
+        self.suite_id = suite_id
+        self._workers = list(workers)
+        self._pending = {}  # data set -> deque of pending tasks
+        self._pending_num = 0
+        self._free_slots = {}
+        self._free_slot = {}
+        self._ready_workers = set()  # ids of the workers that completed setup
+        self._worker_datasets = {worker.id: set() for worker in self._workers}
+        self._affinity_hits = 0
+        for worker in self._workers:
+            self._free_slots[worker.id] = 0
+            self._free_slot[worker.id] = asyncio.Event()
+            if ready:
+                self.set_worker_ready(worker)
+        self._workers_changed = asyncio.Event()
+        self._tasks = {}  # experiment id -> Task
+        self._running = {}  # Task -> {run id: worker}, one entry per run
+        self._run_started = {}  # run id -> start time
+        self._runs_num = 0
+        self._next_worker = 0
+        self._drained = False  # True once run() has dispatched all tasks
+        self._candidate_name = None
+        self._dataset_shapes = {}  # data set name -> (elements, features)
+        self._predicted_makespan = None
+        self._start_time = None  # time of the first dispatch
+
+    @classmethod
+    def create(
+        cls,
+        suite_id,
+        workers,
+        experiments,
+        sweep_parameter=None,
+        ready=True,
+        candidate_name=None,
+        dataset_shapes=None,
+    ):
+        """Creates the scheduler for a suite and enqueues the suite experiments.
+
+        :param suite_id: (string) suite id.
+        :param workers: (list[models.Worker]) workers available to the suite.
+        :param experiments: (list[models.Experiment]) experiments to schedule.
+        :param sweep_parameter: (string) name of the candidate sweep parameter,
+        None if the candidate does not support parameter sweeps.
+        :param ready: (bool) False if the workers are still being set up.
+        :param candidate_name: (string) candidate class name, used to estimate
+        the task costs.
+        :param dataset_shapes: (dict) data set name -> (number of elements,
+        number of features), used to estimate the task costs.
+        :return: (SuiteScheduler) the new scheduler.
+        """
+        scheduler = SuiteScheduler(suite_id, workers, ready)
+        scheduler._candidate_name = candidate_name
+        scheduler._dataset_shapes = dataset_shapes or {}
+        tasks = [
+            Task(experiment_group, order)
+            for order, experiment_group in enumerate(
+                group_experiments(experiments, sweep_parameter)
+            )
+        ]
+        for task in tasks:
+            task.cost = scheduler._estimate_cost(task)
+        for task in sorted(tasks, key=lambda task: (-task.cost, task.order)):
+            for experiment in task.experiments:
+                scheduler._tasks[experiment.id] = task
+            scheduler._push_task(task)
+        cls._schedulers[suite_id] = scheduler
+        return scheduler
+
+    @classmethod
+    def get_by_suite(cls, suite_id):
+        return cls._schedulers.get(suite_id)
+
+    @classmethod
+    def check_all(cls):
+        """Checks the running tasks of all suites, see check_runs()."""
+        for scheduler in list(cls._schedulers.values()):
+            scheduler.check_runs()
+
+    @classmethod
+    def notify_done(cls, experiment, run_id=None):
+        """Signals that an experiment is done, i.e. it either completed or failed.
+
+        Frees the worker slot the experiment was running on, once all the
+        experiments of its task are done.
+
+        :param experiment: (models.Experiment) experiment object.
+        :param run_id: (string) id of the task run that sent the experiment
+        results, None if unknown.
+        """
+        scheduler = cls.get_by_suite(experiment.suite)
+        if scheduler:
+            scheduler.release(experiment, run_id)
+
+    @classmethod
+    def is_live_run(cls, experiment, run_id):
+        """Returns whether a run of an experiment is still running, i.e. its
+        status updates are not stale. Runs without id are assumed live.
+
+        :param experiment: (models.Experiment) experiment object.
+        :param run_id: (string) id of the task run, None if unknown.
+        :return: (bool) False if the run has ended.
+        """
+        scheduler = cls.get_by_suite(experiment.suite)
+        if scheduler is None or run_id is None:
+            return True
+        task = scheduler._tasks.get(experiment.id)
+        return run_id in scheduler._running.get(task, {})
+
+    @classmethod
+    def notify_failed(cls, experiment, run_id=None):
+        """Signals that a run of an experiment failed.
+
+        The experiment only fails if no other run of its task goes on,
+        otherwise the failed run is stopped and the other runs go on.
+
+        :param experiment: (models.Experiment) experiment object.
+        :param run_id: (string) id of the failed task run, None if unknown.
+        """
+        scheduler = cls.get_by_suite(experiment.suite)
+        if scheduler is None:
+            experiment.update_status(ExperimentStatus.FAILED)
+        else:
+            scheduler.fail_run(experiment, run_id)
+
+    def set_worker_ready(self, worker, datasets=()):
+        """Makes the slots of a worker available to the scheduler.
+
+        :param worker: (models.Worker) worker object.
+        :param datasets: (list[string]) names of the data sets the worker holds.
+        """
+        self._worker_datasets[worker.id].update(datasets)
+        self._ready_workers.add(worker.id)
+        self._free_slots[worker.id] = worker.slots
+        self._free_slot[worker.id].set()
+
+    def remove_worker(self, worker):
+        """Removes a worker from the scheduling, e.g. because its setup failed.
+
+        The tasks running on the worker are dispatched again.
+
+        :param worker: (models.Worker) worker object.
+        """
+        if worker in self._workers:
+            self._workers.remove(worker)
+            self._free_slot[worker.id].clear()
+            self._next_worker = 0
+            self._workers_changed.set()
+        for task, task_runs in list(self._running.items()):
+            for run_id, run_worker in list(task_runs.items()):
+                if run_worker is worker:
+                    self._retry_run(task, run_id, "worker removed")
+
+    def _acquire_slot(self, worker):
+        self._free_slots[worker.id] -= 1
+        if self._free_slots[worker.id] == 0:
+            self._free_slot[worker.id].clear()
+
+    def _get_dataset_shape(self, dataset_name):
+        return self._dataset_shapes.get(dataset_name, (1, 1))
+
+    def _estimate_cost(self, task):
+        """Returns the estimated execution time of a task, in seconds."""
+        return sum(
+            self.cost_model.estimate(
+                self._candidate_name,
+                experiment.dataset,
+                self._get_dataset_shape(experiment.dataset),
+                experiment.parameters,
+            )
+            for experiment in task.experiments
+        )
+
+    def _observe_cost(self, experiment):
+        """Refines the cost model with the execution time of an experiment."""
+        if experiment.status == ExperimentStatus.COMPLETED and experiment.execution_time:
+            self.cost_model.observe(
+                self._candidate_name,
+                experiment.dataset,
+                self._get_dataset_shape(experiment.dataset),
+                experiment.parameters,
+                experiment.execution_time / 1e6,
+            )
+
+    def release(self, experiment, run_id=None):
+        task = self._tasks.get(experiment.id)
+        task_runs = self._running.get(task)
+        if task_runs:
+            self._observe_cost(experiment)
+            if run_id in task_runs and len(task_runs) > 1:
+                # The first run sending results wins, the others are stopped
+                for lost_run_id in [r for r in task_runs if r != run_id]:
+                    worker = self._end_run(task, lost_run_id)
+                    asyncio.ensure_future(self._stop_run(worker, lost_run_id))
+            if task.is_done():
+                # e.g. the copies of a task whose last experiment failed
+                stop_runs = len(task_runs) > 1
+                for task_run_id in list(task_runs):
+                    worker = self._end_run(task, task_run_id)
+                    if stop_runs:
+                        asyncio.ensure_future(self._stop_run(worker, task_run_id))
+        self._drop_if_done()
+
+    def fail_run(self, experiment, run_id=None):
+        """Handles the failure of an experiment in a task run, see notify_failed().
+
+        :param experiment: (models.Experiment) experiment object.
+        :param run_id: (string) id of the failed task run, None if unknown.
+        """
+        task = self._tasks.get(experiment.id)
+        task_runs = self._running.get(task, {})
+        if run_id in task_runs and len(task_runs) > 1:
+            worker = self._end_run(task, run_id)
+            log.warning(
+                "Experiment %s failed in run %s on worker %s, other runs go on",
+                experiment.id,
+                run_id,
+                worker.id,
+            )
+            asyncio.ensure_future(self._stop_run(worker, run_id))
+            return
+        experiment.update_status(ExperimentStatus.FAILED)
+        self.release(experiment, run_id)
+
+    def _start_run(self, task, worker):
+        """Takes a slot of a worker and sends it a task in the background."""
+        run_id = "{}-{}".format(self.suite_id, self._runs_num)
+        self._runs_num += 1
+        self._acquire_slot(worker)
+        self._running.setdefault(task, {})[run_id] = worker
+        self._run_started[run_id] = time.monotonic()
+        asyncio.ensure_future(self._dispatch(task, worker, run_id))
+
+    def _end_run(self, task, run_id):
+        """Frees the worker slot taken by a task run and returns the worker."""
+        task_runs = self._running[task]
+        worker = task_runs.pop(run_id)
+        del self._run_started[run_id]
+        if not task_runs:
+            del self._running[task]
+        self._free_slots[worker.id] += 1
+        self._free_slot[worker.id].set()
+        return worker
+
+    async def _stop_run(self, worker, run_id):
+        log.info("Stopping run %s on worker %s", run_id, worker.id)
+        try:
+            await worker.session.post_json("stop/", {"run_id": run_id})
+        except Exception:
+            log.warning(traceback.format_exc())
+
+    def _retry_run(self, task, run_id, reason):
+        """Ends a failed or lost task run and dispatches the task again, unless
+        other runs of the task go on or the task ran out of retries.
+
+        :param task: (Task) task object.
+        :param run_id: (string) id of the task run.
+        :param reason: (string) why the run ended, for the log.
+        """
+        worker = self._end_run(task, run_id)
+        log.warning("Run %s on worker %s ended: %s", run_id, worker.id, reason)
+        if task not in self._running:
+            pending_experiments = task.get_pending_experiments()
+            if task.retries < self.MAX_RETRIES:
+                task.retries += 1
+                for experiment in pending_experiments:
+                    experiment.update_status(ExperimentStatus.CREATED)
+                self._push_task(task)
+                if self._drained:
+                    self._drained = False
+                    asyncio.ensure_future(self._dispatch_pending())
+            else:
+                for experiment in pending_experiments:
+                    experiment.update_status(ExperimentStatus.FAILED)
+                self._drop_if_done()
+
+    def check_runs(self):
+        """Removes the workers that missed their heartbeats, stops the runs
+        that timed out and runs copies of the straggler tasks, see the class
+        docstring."""
+        now = time.monotonic()
+        if self.worker_timeout:
+            for worker in list(self._workers):
+                if worker.id not in self._ready_workers or not worker.last_heartbeat:
+                    continue
+                if now - worker.last_heartbeat > self.worker_timeout:
+                    log.error("Worker %s missed its heartbeats", worker.id)
+                    self.remove_worker(worker)
+        if self.experiment_timeout:
+            for task, task_runs in list(self._running.items()):
+                timeout = self.experiment_timeout * len(task.experiments)
+                for run_id, worker in list(task_runs.items()):
+                    if now - self._run_started[run_id] > timeout:
+                        asyncio.ensure_future(self._stop_run(worker, run_id))
+                        self._retry_run(task, run_id, "timed out")
+        if self.speculation_factor and self._drained:
+            self._speculate()
+
+    def _drop_if_done(self):
+        """Unregisters the scheduler once all its tasks are done."""
+        if self._drained and not self._running:
+            if SuiteScheduler._schedulers.get(self.suite_id) is self:
+                del SuiteScheduler._schedulers[self.suite_id]
+                self._log_makespan()
+
+    def _log_makespan(self):
+        if self._start_time is None:
+            return
+        log.info(
+            "Suite %s makespan: %.2f seconds predicted, %.2f seconds actual.",
+            self.suite_id,
+            self._predicted_makespan,
+            time.monotonic() - self._start_time,
+        )
+
+    def _push_task(self, task):
+        self._pending.setdefault(task.dataset, collections.deque()).append(task)
+        self._pending_num += 1
+
+    def _get_priority(self, task):
+        # Costs are estimated again, since the cost model may have changed
+        return self._estimate_cost(task), -task.order
+
+    def _pop_task(self, worker):
+        """Returns the next pending task for a worker, see the class docstring.
+
+        :param worker: (models.Worker) worker object.
+        :return: (Task) task object.
+        """
+        worker_datasets = self._worker_datasets[worker.id]
+        held_datasets = [
+            dataset for dataset in worker_datasets if dataset in self._pending
+        ]
+        if held_datasets:
+            self._affinity_hits += 1
+        dataset = max(
+            held_datasets or self._pending,
+            key=lambda dataset: self._get_priority(self._pending[dataset][0]),
+        )
+        dataset_tasks = self._pending[dataset]
+        task = dataset_tasks.popleft()
+        if not dataset_tasks:
+            del self._pending[dataset]
+        self._pending_num -= 1
+        worker_datasets.add(dataset)  # The worker downloads it if missing
+        return task
+
+    def _get_free_worker(self, excluded_workers=()):
+        """Returns a worker with a free slot, or None if all workers are busy.
+
+        Workers are visited in round-robin order to spread the load.
+
+        :param excluded_workers: (list[models.Worker]) workers not to return.
+        """
+        workers_num = len(self._workers)
+        if not workers_num:
+            raise SchedulingError("no workers left for suite {}".format(self.suite_id))
+        for offset in range(workers_num):
+            worker = self._workers[(self._next_worker + offset) % workers_num]
+            if worker in excluded_workers:
+                continue
+            if self._free_slot[worker.id].is_set():
+                self._next_worker = (self._next_worker + offset + 1) % workers_num
+                return worker
+        return None
+
+    async def _wait_free_worker(self):
+        """Waits until at least one worker has a free slot and returns it."""
+        worker = self._get_free_worker()
+        while worker is None:
+            waiters = [
+                asyncio.ensure_future(self._free_slot[worker.id].wait())
+                for worker in self._workers
+            ]
+            waiters.append(asyncio.ensure_future(self._workers_changed.wait()))
+            _, pending = await asyncio.wait(waiters, return_when=asyncio.FIRST_COMPLETED)
+            for waiter in pending:
+                waiter.cancel()
+            self._workers_changed.clear()
+            worker = self._get_free_worker()
+        return worker
+
+    def _get_dataset_source(self, dataset, worker):
+        """Returns a ready worker holding a data set, other than the given one,
+        so that workers fetch the data set from each other instead of the master.
+
+        :param dataset: (string) data set name.
+        :param worker: (models.Worker) worker fetching the data set.
+        :return: (models.Worker) worker with the most free slots, None if none.
+        """
+        holders = [
+            holder
+            for holder in self._workers
+            if holder is not worker
+            and holder.id in self._ready_workers
+            and dataset in self._worker_datasets[holder.id]
+        ]
+        if not holders:
+            return None
+        return max(holders, key=lambda holder: self._free_slots[holder.id])
+
+    async def _dispatch(self, task, worker, run_id):
+        """Sends a task to a worker.
+
+        The request completes when the worker is done with the task,
+        hence it runs in the background with respect to the scheduling loop.
+        Workers that do not hold the task data set fetch it from the worker
+        in the dataset_source field, if any, see _get_dataset_source().
+
+        :param task: (Task) task object.
+        :param worker: (models.Worker) worker object.
+        :param run_id: (string) id of the task run.
+        """
+        message = {
+            "run_id": run_id,
+            "suite_id": self.suite_id,
+            "data_name": task.dataset,
+            "experiments": [
+                {"experiment_id": experiment.id, "parameters": experiment.parameters}
+                for experiment in task.get_pending_experiments()
+            ],
+            "master_address": worker.master_address,
+        }
+        dataset_source = self._get_dataset_source(task.dataset, worker)
+        if dataset_source:
+            message["dataset_source"] = "{hostname}:{port}".format(
+                hostname=dataset_source.hostname, port=dataset_source.port
+            )
+        try:
+            await worker.session.post_json("run/", message)
+        except Exception:
+            log.error(traceback.format_exc())
+            if run_id in self._running.get(task, {}):
+                self._retry_run(task, run_id, "dispatch failed")
+
+    def _fail_pending_tasks(self):
+        """Marks the experiments of all pending tasks as failed."""
+        pending_tasks = [task for tasks in self._pending.values() for task in tasks]
+        self._pending = {}
+        self._pending_num = 0
+        for task in sorted(pending_tasks, key=lambda task: task.order):
+            for experiment in task.experiments:
+                experiment.update_status(ExperimentStatus.FAILED)
+
+    def _predict_makespan(self):
+        """Returns the predicted makespan of the pending tasks, in seconds.
+
+        Workers still being set up only advertise their slots once ready, so
+        they only count with their configured slots, if any.
+        """
+        slots = sum(
+            worker.slots
+            if worker.id in self._ready_workers
+            else worker.configured_slots or 0
+            for worker in self._workers
+        )
+        return get_lpt_makespan(
+            [task.cost for tasks in self._pending.values() for task in tasks], slots
+        )
+
+    async def run(self):
+        """Runs the scheduling loop until all experiments have been dispatched."""
+        tasks_num = self._pending_num
+        experiments_num = len(self._tasks)
+
+        log.info(">>> Starting scheduling loop")
+        log.info(
+            "Found %d workers (%d ready slots).",
+            len(self._workers),
+            sum(self._free_slots.values()),
+        )
+        log.info("Running %d experiments (%d tasks).", experiments_num, tasks_num)
+
+        scheduled_experiments_num = await self._dispatch_pending()
+        log.info(
+            "<<< Scheduling loop completed (%d/%d).",
+            scheduled_experiments_num,
+            experiments_num,
+        )
+        log.info(
+            "%d/%d tasks dispatched to workers holding their data set.",
+            self._affinity_hits,
+            tasks_num,
+        )
+
+    async def _dispatch_pending(self):
+        """Dispatches the pending tasks as workers get free slots.
+
+        :return: (int) number of dispatched experiments.
+        """
+        scheduled_experiments_num = 0
+        while self._pending_num:
+            try:
+                worker = await self._wait_free_worker()
+            except SchedulingError as e:
+                log.error("Scheduling error: %s", e)
+                self._fail_pending_tasks()
+                break
+            if self._start_time is None:
+                self._start_time = time.monotonic()
+                self._predicted_makespan = self._predict_makespan()
+            task = self._pop_task(worker)
+            pending_experiments = task.get_pending_experiments()
+            for experiment in pending_experiments:
+                experiment.update_status(ExperimentStatus.SCHEDULED)
+            self._start_run(task, worker)
+            scheduled_experiments_num += len(pending_experiments)
+
+        self._drained = True
+        self._drop_if_done()
+        return scheduled_experiments_num
+
+    def _get_stragglers(self):
+        """Returns the running tasks that have run speculation_factor times
+        longer than their estimated cost and have not been copied yet, slowest
+        first."""
+        now = time.monotonic()
+        slowdowns = {}
+        for task, task_runs in self._running.items():
+            elapsed_time = now - min(self._run_started[r] for r in task_runs)
+            if len(task_runs) > 1 or elapsed_time < self.MIN_SPECULATION_TIME:
+                continue
+            slowdown = elapsed_time / max(self._estimate_cost(task), 1e-9)
+            if slowdown > self.speculation_factor:
+                slowdowns[task] = slowdown
+        return sorted(slowdowns, key=slowdowns.get, reverse=True)
+
+    def _speculate(self):
+        """Runs copies of the straggler tasks on free workers."""
+        for task in self._get_stragglers():
+            try:
+                worker = self._get_free_worker(self._running[task].values())
+            except SchedulingError:
+                return
+            if worker is None:
+                break
+            log.info(
+                "Running a copy of straggler task %s on worker %s",
+                ", ".join(experiment.id for experiment in task.experiments),
+                worker.id,
+            )
+            self._start_run(task, worker)
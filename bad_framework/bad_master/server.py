@@ -9,6 +9,9 @@ import tornado.httpserver
 import tornado.ioloop
 import tornado.web
 
+from .models import Dataset, restore_models
+from .scheduler import SuiteScheduler
+from .store import ModelStore
 from .views import (
     CandidateHandler,
     DatasetHandler,
@@ -18,6 +21,10 @@ from .views import (
     SuiteHandler,
     SuiteDumpHandler,
     SuiteStatusHandler,
+    SuiteStatusStreamHandler,
+    WorkerHeartbeatHandler,
+    precompress_datasets,
+    resume_suites,
 )
 
 # Define tornado options
@@ -28,6 +35,34 @@ define(
 )
 define("master_port", default=3290, help="Port for the master process.")
 define("master_debug", default=False, help="Activate development mode.")
+define(
+    "master_db",
+    default="",
+    help="SQLite database where the master state is saved. Disabled when empty.",
+)
+define(
+    "master_db_flush_interval",
+    default=1000,
+    help="Interval between writes to the master database, in milliseconds.",
+)
+define(
+    "master_speculation_factor",
+    default=0.0,
+    help="Experiments running this many times longer than their estimated "
+    "execution time are run again on a free worker. Disabled when 0.",
+)
+define(
+    "master_worker_timeout",
+    default=30.0,
+    help="Seconds without heartbeats after which a worker is considered dead. "
+    "Disabled when 0.",
+)
+define(
+    "master_experiment_timeout",
+    default=0.0,
+    help="Seconds an experiment can run before it is dispatched again. "
+    "Disabled when 0.",
+)
 
 # Define our own logging configuration
 logging.basicConfig(
@@ -39,8 +74,24 @@ log = logging.getLogger("bad.server.master")
 
 
 class BADMasterServer:
-    def __init__(self, port, home_dir):
+    def __init__(
+        self,
+        port,
+        home_dir,
+        db_path=None,
+        speculation_factor=0.0,
+        worker_timeout=30.0,
+        experiment_timeout=0.0,
+    ):
         self._port = int(port)
+        SuiteScheduler.speculation_factor = float(speculation_factor)
+        SuiteScheduler.worker_timeout = float(worker_timeout)
+        SuiteScheduler.experiment_timeout = float(experiment_timeout)
+        self._store = None
+        if db_path:
+            self._store = ModelStore(db_path)
+            restore_models(self._store)
+        Dataset.setup()
         self._app = tornado.web.Application(
             [
                 (r"^/$", IndexHandler),
@@ -68,18 +119,44 @@ class BADMasterServer:
                     r"^/suite/(?P<suite_id>[a-z0-9-]+)/status/$",
                     SuiteStatusHandler,
                 ),
+                (
+                    r"^/suite/(?P<suite_id>[a-z0-9-]+)/status/stream/$",
+                    SuiteStatusStreamHandler,
+                ),
+                (
+                    r"^/worker/(?P<worker_id>[a-z0-9-]+)/heartbeat/$",
+                    WorkerHeartbeatHandler,
+                ),
             ],
+            compress_response=True,
             debug=options.master_debug,
             master_home=home_dir,
             master_port=self._port,
         )
-        self._server = tornado.httpserver.HTTPServer(self._app, max_buffer_size=524288000)
+        self._server = tornado.httpserver.HTTPServer(
+            self._app, decompress_request=True, max_buffer_size=524288000
+        )
 
     def start(self):
         log.info(">>> Starting BAD master on port %d", self._port)
         self._server.bind(self._port)
         self._server.start(1)
-        tornado.ioloop.IOLoop.current().start()
+        tornado.ioloop.IOLoop.current().add_callback(
+            precompress_datasets, self._app.settings["master_home"]
+        )
+        tornado.ioloop.PeriodicCallback(SuiteScheduler.check_all, 1000).start()
+        if self._store:
+            tornado.ioloop.PeriodicCallback(
+                self._store.flush, options.master_db_flush_interval
+            ).start()
+            tornado.ioloop.IOLoop.current().add_callback(
+                resume_suites, self._app.settings["master_home"]
+            )
+        try:
+            tornado.ioloop.IOLoop.current().start()
+        finally:
+            if self._store:
+                self._store.close()
 
 
 def main():
@@ -89,7 +166,14 @@ def main():
     for k, v in options.items():
         log.info("  %s = %r", k, v)
 
-    bad_master = BADMasterServer(options.master_port, options.master_home)
+    bad_master = BADMasterServer(
+        options.master_port,
+        options.master_home,
+        options.master_db,
+        options.master_speculation_factor,
+        options.master_worker_timeout,
+        options.master_experiment_timeout,
+    )
     bad_master.start()
 
 
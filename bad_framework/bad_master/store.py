@@ -0,0 +1,102 @@
+"""Copyright (C) 2020 Sivam Pasupathipillai <sivam.pasupathipillai@gmail.com>.
+
+All rights reserved.
+
+SQLite persistence for the BAD master state.
+"""
+import json
+import logging
+import sqlite3
+
+log = logging.getLogger("bad.server.master")
+
+
+class ModelStore:
+    """Stores model records in a SQLite database.
+
+    Each record is the JSON-encoded state of a model object, keyed by model
+    name and object id. The database runs in WAL mode and writes are batched:
+    save() and delete() only queue the change, which is written to the database
+    by the next flush(). Repeated changes of the same object before a flush
+    are coalesced into a single write.
+
+    The store is not thread-safe, it must only be used from the IOLoop thread.
+    """
+
+    def __init__(self, db_path, batch_size=500):
+        """
+        :param db_path: (string) path to the SQLite database file.
+        :param batch_size: (int) number of queued records that triggers a flush.
+        """
+        self.db_path = db_path
+        self._batch_size = batch_size
+        self._pending = {}
+        self._connection = sqlite3.connect(db_path)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        with self._connection:
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS records ("
+                " model TEXT NOT NULL,"
+                " id TEXT NOT NULL,"
+                " record TEXT NOT NULL,"
+                " PRIMARY KEY (model, id))"
+            )
+
+    def save(self, model_name, object_id, record):
+        """Queues a model record for writing.
+
+        :param model_name: (string) model name.
+        :param object_id: (string) object id.
+        :param record: (dict) JSON-serializable object state.
+        """
+        self._pending[(model_name, object_id)] = json.dumps(record)
+        if len(self._pending) >= self._batch_size:
+            self.flush()
+
+    def delete(self, model_name, object_id):
+        """Queues the removal of a model record.
+
+        :param model_name: (string) model name.
+        :param object_id: (string) object id.
+        """
+        self._pending[(model_name, object_id)] = None
+        if len(self._pending) >= self._batch_size:
+            self.flush()
+
+    def flush(self):
+        """Writes all queued changes to the database in a single transaction."""
+        if not self._pending:
+            return
+        rows = [
+            (model_name, object_id, record)
+            for (model_name, object_id), record in self._pending.items()
+            if record is not None
+        ]
+        deleted_rows = [key for key, record in self._pending.items() if record is None]
+        self._pending = {}
+        with self._connection:
+            self._connection.executemany(
+                "INSERT INTO records (model, id, record) VALUES (?, ?, ?) "
+                "ON CONFLICT (model, id) DO UPDATE SET record = excluded.record",
+                rows,
+            )
+            self._connection.executemany(
+                "DELETE FROM records WHERE model = ? AND id = ?", deleted_rows
+            )
+        log.debug("Flushed %d records to %s", len(rows) + len(deleted_rows), self.db_path)
+
+    def load(self, model_name):
+        """Returns the stored records of a model, in insertion order.
+
+        :param model_name: (string) model name.
+        :return: (list[dict]) model records.
+        """
+        cursor = self._connection.execute(
+            "SELECT record FROM records WHERE model = ? ORDER BY rowid", (model_name,)
+        )
+        return [json.loads(record) for (record,) in cursor]
+
+    def close(self):
+        self.flush()
+        self._connection.close()
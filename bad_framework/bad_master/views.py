@@ -4,14 +4,15 @@ All rights reserved.
 
 Main module for the BAD master process implementation.
 """
-from time import sleep
+import asyncio
 import json
 import logging
 import os
+import time
 import traceback
 
-from jinja2 import Environment, PackageLoader
 from tornado.ioloop import IOLoop
+from tornado.iostream import StreamClosedError
 import tornado.web
 
 from bad_framework.bad_candidates import (
@@ -26,9 +27,18 @@ from bad_framework.bad_utils.adt import (
     RangeParameter,
     ValueParameter,
 )
+from bad_framework.bad_utils.compression import get_supported_encodings
 from bad_framework.bad_utils.errors import get_response_message, get_error_message
+from bad_framework.bad_utils.transfer import (
+    DatasetTransferMixin,
+    get_compressed_dataset,
+)
+from bad_framework.bad_utils.lazy import lazy_import
+from bad_framework.bad_utils.magic import RESOURCE_USAGE_FIELDS, TIMING_FIELDS
 from bad_framework.bad_utils.files import (
+    get_cached_file_hash,
     get_candidate_filename,
+    get_data_shape,
     get_include_dir,
     save_file,
 )
@@ -39,9 +49,190 @@ from bad_framework.bad_master.models import (
     Suite,
     Worker,
 )
+from bad_framework.bad_master.cache import ResultCache, get_result_key
+from bad_framework.bad_master.feed import StatusFeed
+from bad_framework.bad_master.plots import render_roc_file
+from bad_framework.bad_master.scheduler import SuiteScheduler
 
 log = logging.getLogger("bad.server.master")
 
+j2 = lazy_import("jinja2")
+
+MAX_CONCURRENT_WORKER_SETUPS = 8
+DATASET_FANOUT = 2  # Number of workers each worker sends datasets to
+
+
+def get_dataset_path(home_dir, dataset_name):
+    """Returns the path to a default or locally uploaded dataset.
+
+    :param home_dir: (string) path to the master working directory.
+    :param dataset_name: (string) dataset name.
+    :return: (string) path to the dataset file.
+    """
+    dataset = Dataset.get_by_name(dataset_name)
+    if dataset:
+        return dataset.path
+    return os.path.join(home_dir, "dataset", dataset_name + ".arff")
+
+
+def get_dataset_shapes(home_dir, dataset_names):
+    """Returns the shapes of the datasets, see files.get_data_shape().
+
+    Datasets that cannot be read are left out.
+
+    :param home_dir: (string) path to the master working directory.
+    :param dataset_names: (list[string]) list of dataset names.
+    :return: (dict) dataset name -> (number of elements, number of features).
+    """
+    dataset_shapes = {}
+    for dataset_name in dataset_names:
+        try:
+            dataset_shapes[dataset_name] = get_data_shape(
+                get_dataset_path(home_dir, dataset_name)
+            )
+        except OSError:
+            log.warning("Cannot read dataset %s", dataset_name)
+    return dataset_shapes
+
+
+async def precompress_datasets(home_dir):
+    """Compresses the bundled datasets with each supported encoding, so that
+    workers never wait for the compression at suite start.
+
+    :param home_dir: (string) path to the master working directory.
+    """
+    for dataset in list(Dataset.get_all()):
+        for encoding in get_supported_encodings():
+            try:
+                await get_compressed_dataset(home_dir, dataset.path, encoding)
+            except Exception:
+                log.warning(traceback.format_exc())
+
+
+def get_dataset_sources(workers, fanout=DATASET_FANOUT):
+    """Arranges the workers in a dataset distribution tree rooted at the master.
+
+    The master sends datasets to the first fanout workers, each worker sends
+    them to the next fanout workers, and so on. Hence, the distribution time
+    grows logarithmically with the number of workers.
+
+    :param workers: (list) workers, in setup order.
+    :param fanout: (int) number of children of each node of the tree.
+    :return: (list) the parent of each worker, None for the master.
+
+    >>> get_dataset_sources(["w0", "w1", "w2", "w3", "w4"])
+    [None, None, 'w0', 'w0', 'w1']
+    """
+    return [
+        workers[index // fanout - 1] if index >= fanout else None
+        for index in range(len(workers))
+    ]
+
+
+def get_worker_dataset_sources(workers, assigned_datasets, fanout=DATASET_FANOUT):
+    """Arranges the workers assigned each dataset in a distribution tree of
+    that dataset, see get_dataset_sources().
+
+    Each dataset is sent by the master to at most fanout workers, whatever the
+    datasets assigned to the other workers.
+
+    :param workers: (list) workers, in setup order.
+    :param assigned_datasets: (list[list[string]]) datasets assigned to each
+    worker, see assign_datasets().
+    :param fanout: (int) number of children of each node of the trees.
+    :return: (list[dict]) dataset name -> parent, None for the master, of each
+    worker.
+
+    >>> sources = get_worker_dataset_sources(
+    ...     ["w0", "w1", "w2"], [["d0", "d1"], ["d0"], ["d0", "d1"]], fanout=1
+    ... )
+    >>> [sorted(worker_sources.items()) for worker_sources in sources]
+    [[('d0', None), ('d1', None)], [('d0', 'w0')], [('d0', 'w1'), ('d1', 'w0')]]
+    """
+    dataset_workers = {}
+    for worker, worker_datasets in zip(workers, assigned_datasets):
+        for dataset in worker_datasets:
+            dataset_workers.setdefault(dataset, []).append(worker)
+    worker_sources = {worker: {} for worker in workers}
+    for dataset, holders in dataset_workers.items():
+        for worker, source in zip(holders, get_dataset_sources(holders, fanout)):
+            worker_sources[worker][dataset] = source
+    return [worker_sources[worker] for worker in workers]
+
+
+def assign_datasets(datasets, workers_num):
+    """Assigns the datasets to the workers, so that each dataset is assigned to
+    at least one worker and each worker to at least one dataset, if any.
+
+    Workers only download their datasets at setup, the others are downloaded
+    when needed, which the scheduler avoids, see scheduler.SuiteScheduler.
+
+    :param datasets: (list[string]) list of dataset names.
+    :param workers_num: (int) number of workers.
+    :return: (list[list[string]]) datasets assigned to each worker.
+
+    >>> assign_datasets(["d0", "d1", "d2"], 2)
+    [['d0', 'd2'], ['d1']]
+    >>> assign_datasets(["d0", "d1"], 3)
+    [['d0'], ['d1'], ['d0']]
+    """
+    if not datasets or len(datasets) >= workers_num:
+        return [datasets[index::workers_num] for index in range(workers_num)]
+    return [[datasets[index % len(datasets)]] for index in range(workers_num)]
+
+
+def get_result_cache(home_dir):
+    return ResultCache(os.path.join(home_dir, "result_cache"))
+
+
+async def complete_cached_experiments(home_dir, candidate, experiments):
+    """Completes the experiments whose results are already in the result cache.
+
+    Cached experiments are marked as completed with a copy of the cached result
+    files in their experiment directory, the others are returned, so that only
+    they are dispatched to the workers. Files are hashed in the default
+    executor, so that the IOLoop keeps serving requests meanwhile.
+
+    :param home_dir: (string) path to the master working directory.
+    :param candidate: (models.Candidate) candidate object.
+    :param experiments: (list[models.Experiment]) experiments to look up.
+    :return: (list[models.Experiment]) experiments not found in the cache.
+    """
+    io_loop = IOLoop.current()
+    result_cache = get_result_cache(home_dir)
+    candidate_digest = await io_loop.run_in_executor(
+        None, get_cached_file_hash, candidate.source
+    )
+    data_digests = {}
+    missed_experiments = []
+    for experiment in experiments:
+        if experiment.dataset not in data_digests:
+            data_digests[experiment.dataset] = await io_loop.run_in_executor(
+                None,
+                get_cached_file_hash,
+                get_dataset_path(home_dir, experiment.dataset),
+            )
+        experiment.cache_key = get_result_key(
+            candidate_digest, data_digests[experiment.dataset], experiment.parameters
+        )
+        experiment_dir = os.path.join(home_dir, experiment.suite, experiment.id)
+        cached_result = result_cache.copy_result(
+            experiment.cache_key, experiment_dir, experiment.id
+        )
+        if cached_result:
+            experiment.metrics = cached_result["metrics_path"]
+            experiment.update_status(
+                ExperimentStatus.COMPLETED, cached_result["execution_time"]
+            )
+        else:
+            missed_experiments.append(experiment)
+    log.info(
+        "Found %d of %d experiment results in cache.",
+        len(experiments) - len(missed_experiments),
+        len(experiments),
+    )
+    return missed_experiments
+
 
 class BaseMasterHandler(tornado.web.RequestHandler):
     """Base handler for BAD master HTTP requests."""
@@ -84,8 +275,8 @@ class IndexHandler(BaseMasterHandler):
     def _render_index(self):
         """Renders the index HTML page."""
         suites = Suite.get_all()
-        jinja2_env = Environment(
-            loader=PackageLoader("bad_framework.bad_master", "templates")
+        jinja2_env = j2.Environment(
+            loader=j2.PackageLoader("bad_framework.bad_master", "templates")
         )
         template = jinja2_env.get_template("index.html")
         rendered_template = template.render(suites=suites)
@@ -140,36 +331,28 @@ class CandidateHandler(BaseMasterHandler):
             self.finish()
 
 
-class DatasetHandler(BaseMasterHandler):
-    """Handler for dataset related requests."""
+class DatasetHandler(DatasetTransferMixin, BaseMasterHandler):
+    """Handler for dataset related requests, see DatasetTransferMixin."""
 
-    def get(self, dataset_name):
+    async def get(self, dataset_name):
         """Handler for HTTP GET method.
 
-        Writes the requested dataset to the output stream.
+        Writes the requested dataset, or the requested byte range of it,
+        to the output stream.
 
         :param dataset_name: (string) dataset name.
         """
         try:
-            dataset = Dataset.get_by_name(dataset_name)
-            if dataset:
-                # Default dataset
-                dataset_path = dataset.path
-            else:
-                # Locally uploaded dataset
-                dataset_path = os.path.join(
-                    self.get_wd(), "dataset", dataset_name + ".arff"
-                )
-            with open(dataset_path, "rb") as data_file:
-                content = data_file.read()
-                self.write(content)
-            self.set_status(200)
+            await self.write_dataset(
+                get_dataset_path(self.get_wd(), dataset_name), self.get_wd()
+            )
+        except StreamClosedError:
+            # The worker resumes the download with a range request
+            log.warning("Transfer of dataset %s interrupted.", dataset_name)
         except Exception as e:
             log.error(traceback.format_exc())  # Write on master log
             self.set_status(status_code=500, reason=str(e))
-        finally:
-            self.flush()
-            self.finish()
+            await self.finish()
 
 
 class ExperimentHandler(BaseMasterHandler):
@@ -182,8 +365,8 @@ class ExperimentHandler(BaseMasterHandler):
         """
         experiment = Experiment.get_by_id(experiment_id)
         candidate = Candidate.get_by_id(experiment.candidate)
-        jinja2_env = Environment(
-            loader=PackageLoader("bad_framework.bad_master", "templates")
+        jinja2_env = j2.Environment(
+            loader=j2.PackageLoader("bad_framework.bad_master", "templates")
         )
         template = jinja2_env.get_template("experiment_details.html")
         rendered_template = template.render(candidate=candidate, experiment=experiment)
@@ -199,7 +382,16 @@ class ExperimentHandler(BaseMasterHandler):
         """
         message = json.loads(self.request.body)
         experiment = Experiment.get_by_id(experiment_id)
-        experiment.update_status(message["status"])
+        run_id = message.get("run_id")
+        if experiment.status == ExperimentStatus.COMPLETED:
+            return  # Sent by another run of the experiment, see ResultHandler
+        if not SuiteScheduler.is_live_run(experiment, run_id):
+            log.info("Ignoring status of ended run %s", run_id)
+            return
+        if message["status"] == ExperimentStatus.FAILED:
+            SuiteScheduler.notify_failed(experiment, run_id)
+        else:
+            experiment.update_status(message["status"])
 
     def get(self, experiment_id):
         """Handler for HTTP GET method.
@@ -242,10 +434,16 @@ class ResultHandler(BaseMasterHandler):
         """Saves the results experiment results received from a worker in a local file.
         Updates the experiment with the paths to the result files.
 
+        Experiments may run more than once, see scheduler.SuiteScheduler: only
+        the first results received are saved.
+
         :param experiment_id: (string) experiment id.
         """
-        log.info("Saving results for experiment %s", experiment_id)
         experiment = Experiment.get_by_id(experiment_id)
+        if experiment.status == ExperimentStatus.COMPLETED:
+            log.info("Ignoring late results for experiment %s", experiment_id)
+            return
+        log.info("Saving results for experiment %s", experiment_id)
 
         base_path = "{home_dir}/{suite_id}/{experiment_id}/".format(
             home_dir=self.get_wd(),
@@ -259,14 +457,23 @@ class ResultHandler(BaseMasterHandler):
             metrics_content = self.get_file_contents("metrics.json")
             save_file(metrics_content, metrics_path)
 
-        roc_path = base_path + "roc.png"
-        if not os.path.exists(roc_path):
-            roc_content = self.get_file_contents("roc.png")
-            save_file(roc_content, roc_path)
-
         experiment.metrics = metrics_path
-        experiment.roc = roc_path
-        experiment.update_status(ExperimentStatus.COMPLETED)
+        execution_time = self.get_query_argument("execution_time", None)
+        experiment.update_status(
+            ExperimentStatus.COMPLETED,
+            int(execution_time) if execution_time is not None else None,
+        )
+        SuiteScheduler.notify_done(experiment, self.get_query_argument("run_id", None))
+        if experiment.cache_key:
+            try:
+                get_result_cache(self.get_wd()).put(
+                    experiment.cache_key,
+                    metrics_path,
+                    experiment.execution_time,
+                )
+            except Exception:
+                # The result is saved anyway, it will just be computed again
+                log.warning(traceback.format_exc())
 
     def post(self, experiment_id):
         """Handler for HTTP POST method.
@@ -294,17 +501,28 @@ class ResultHandler(BaseMasterHandler):
             self.set_header("Content-type", "application/json")
             self.write(metrics_file.read())
 
-    def _get_roc_file(self, experiment_id):
+    async def _get_roc_file(self, experiment_id):
         """Writes the roc.png file contents to the output stream.
 
+        The ROC plot is rendered from the metrics file on the first request,
+        in a background thread, and saved next to the metrics file.
+
         :param experiment_id: (string) experiment id.
         """
         experiment = Experiment.get_by_id(experiment_id)
+        if not experiment.roc:
+            roc_path = os.path.join(os.path.dirname(experiment.metrics), "roc.png")
+            if not os.path.exists(roc_path):
+                await IOLoop.current().run_in_executor(
+                    None, render_roc_file, experiment.metrics, roc_path
+                )
+            experiment.roc = roc_path
+            experiment.save()
         with open(experiment.roc, "rb") as roc_file:
             self.set_header("Content-type", "image/png")
             self.write(roc_file.read())
 
-    def get(self, experiment_id):
+    async def get(self, experiment_id):
         """Handler for HTTP GET method.
 
         Returns the experiment's results file.
@@ -315,7 +533,7 @@ class ResultHandler(BaseMasterHandler):
             if "metrics.json" in self.request.path:
                 self._get_metrics_file(experiment_id)
             elif "roc.png" in self.request.path:
-                self._get_roc_file(experiment_id)
+                await self._get_roc_file(experiment_id)
             self.set_status(200)
         except Exception as e:
             log.error(traceback.format_exc())
@@ -325,6 +543,29 @@ class ResultHandler(BaseMasterHandler):
             self.finish()
 
 
+class WorkerHeartbeatHandler(BaseMasterHandler):
+    """Handler for the heartbeats the workers send while they are alive,
+    see scheduler.SuiteScheduler.check_runs()."""
+
+    def post(self, worker_id):
+        """Handler for HTTP POST method.
+
+        Records a heartbeat of a worker.
+
+        :param worker_id: (string) worker id.
+        """
+        try:
+            Worker.get_by_id(worker_id).record_heartbeat()
+            self.set_status(200)
+        except KeyError:
+            self.set_status(404, reason="unknown worker {}".format(worker_id))
+        except Exception as e:
+            log.error(traceback.format_exc())
+            self.set_status(500, reason=str(e))
+        finally:
+            self.finish()
+
+
 class SuiteHandler(BaseMasterHandler):
     """Handler for Suite related requests."""
 
@@ -371,108 +612,148 @@ class SuiteHandler(BaseMasterHandler):
         return Experiment.get_by_suite(suite.id)
 
     @classmethod
-    async def _schedule_experiment(cls, experiment, worker):
-        """Sends an experiment to be scheduled to a worker.
+    async def _initialize_worker_env(
+        cls, suite_id, candidate, worker, datasets, dataset_sources=None
+    ):
+        """Initializes a worker's environment with the dependencies
+        required to run the experiments.
 
-        :param worker: (models.Worker) worker object.
-        :param experiment: (models.Experiment) experiment object.
+        :param suite_id: (string) suite id.
+        :param candidate: (models.Candidate) candidate object.
+        :param worker: (models.Worker) worker to initialize.
+        :param datasets: (list[string]) list of dataset names.
+        :param dataset_sources: (dict) dataset name -> peer worker the dataset
+        is downloaded from, None or missing to download it from the master.
+        :return: (list[string]) names of the datasets the worker holds.
         """
+        log.info("Setting up worker at %s on port %d", worker.hostname, worker.port)
+        await worker.session.check_health()
         message = {
-            "suite_id": experiment.suite,
-            "data_name": experiment.dataset,
-            "experiment_id": experiment.id,
             "master_address": worker.master_address,
-            "parameters": experiment.parameters,
+            "worker_id": worker.id,
+            "suite_id": suite_id,
+            "candidate_id": candidate.id,
+            "requirements": candidate.requirements,
+            "datasets": datasets,
         }
-        experiment.update_status(ExperimentStatus.SCHEDULED)
-        await worker.session.post_json("run/", message)
-
-    @classmethod
-    def _count_running_experiments(cls, experiments):
-        running_experiments = [
-            experiment
-            for experiment in experiments
-            if experiment.status == ExperimentStatus.RUNNING
-        ]
-        return len(running_experiments)
+        message["dataset_sources"] = {
+            dataset: "{hostname}:{port}".format(
+                hostname=source.hostname, port=source.port
+            )
+            for dataset, source in (dataset_sources or {}).items()
+            if source
+        }
+        response = await worker.session.post_json("setup/", message)
+        if response.status_code != 200:
+            raise ValueError("worker initialization failed: ", response.reason)
+        setup_result = json.loads(response.content)
+        worker.record_heartbeat()
+        worker.set_advertised_slots(setup_result["slots"])
+        return setup_result.get("datasets", datasets)
 
     @classmethod
-    def _get_update_message(cls, running, scheduled, total):
-        return "...{r} ({s}/{t}) running (scheduled/total) experiments.".format(
-            r=running,
-            s=scheduled,
-            t=total,
-        )
+    async def _initialize_worker_envs(cls, scheduler, candidate, workers, datasets):
+        """Initializes the workers' environments concurrently, at most
+        MAX_CONCURRENT_WORKER_SETUPS at a time.
 
-    async def _start_scheduling_loop(self, experiments, workers):
-        """Starts the experiment scheduling loop. Experiments are scheduled
-        in time in order not to overload the workers.
+        Each worker joins the scheduling as soon as it is ready, workers whose
+        setup fails are removed from the scheduling. Each worker only downloads
+        the datasets assigned to it, see assign_datasets(). Workers assigned
+        the same dataset download it from each other, see
+        get_worker_dataset_sources().
 
-        Each worker runs one experiment at-a-time.
-
-        TODO:
-         - make more clear/elegant/split
-
-        :param experiments: (list[models.Experiment]) list of experiments to schedule.
-        :param workers: (list[models.Worker]) list of workers to
-        schedule the experiment on.
+        :param scheduler: (scheduler.SuiteScheduler) suite scheduler.
+        :param candidate: (models.Candidate) candidate object.
+        :param workers: (list[models.Worker]) list of workers to initialize.
+        :param datasets: (list[string]) list of dataset names.
         """
-        workers_num = len(workers)
-        experiments_num = len(experiments)
-
-        log.info(">>> Starting scheduling loop")
-        log.info("Found %d available workers.", workers_num)
-        log.info("Running %d experiments.", experiments_num)
-
-        scheduled_experiments = []
-        todo_experiments = experiments
-        worker_index = 0
-        scheduled_experiments_num = 0
-
-        while todo_experiments:
-            running_experiments_num = self._count_running_experiments(
-                experiments=scheduled_experiments
-            )
-            if running_experiments_num < workers_num:
-                next_experiment, *todo_experiments = todo_experiments
-                await self._schedule_experiment(
-                    experiment=next_experiment,
-                    worker=workers[worker_index],
+        setup_limit = asyncio.Semaphore(MAX_CONCURRENT_WORKER_SETUPS)
+
+        async def initialize_worker_env(worker, worker_datasets, dataset_sources):
+            async with setup_limit:
+                start_time = time.perf_counter()
+                try:
+                    held_datasets = await cls._initialize_worker_env(
+                        scheduler.suite_id,
+                        candidate,
+                        worker,
+                        worker_datasets,
+                        dataset_sources,
+                    )
+                except Exception:
+                    log.error(traceback.format_exc())
+                    log.error(
+                        "Setup of worker %s:%d failed after %.2f seconds.",
+                        worker.hostname,
+                        worker.port,
+                        time.perf_counter() - start_time,
+                    )
+                    scheduler.remove_worker(worker)
+                    return False
+                log.info(
+                    "Worker %s:%d initialized in %.2f seconds (%d slots).",
+                    worker.hostname,
+                    worker.port,
+                    time.perf_counter() - start_time,
+                    worker.slots,
                 )
-                scheduled_experiments.append(next_experiment)
-                worker_index = (worker_index + 1) % workers_num
-            sleep(0.1)
-            scheduled_experiments_num = len(scheduled_experiments)
+                scheduler.set_worker_ready(worker, held_datasets)
+                return True
+
+        assigned_datasets = assign_datasets(datasets, len(workers))
+        dataset_sources = get_worker_dataset_sources(workers, assigned_datasets)
+
+        start_time = time.perf_counter()
+        ready_workers = await asyncio.gather(
+            *[
+                initialize_worker_env(worker, worker_datasets, worker_sources)
+                for worker, worker_datasets, worker_sources in zip(
+                    workers, assigned_datasets, dataset_sources
+                )
+            ]
+        )
         log.info(
-            "<<< Scheduling loop completed (%d/%d).",
-            scheduled_experiments_num,
-            experiments_num,
+            "%d/%d workers initialized in %.2f seconds.",
+            sum(ready_workers),
+            len(workers),
+            time.perf_counter() - start_time,
         )
 
     @classmethod
-    async def _initialize_worker_envs(cls, suite_id, candidate, workers, datasets):
-        """Initializes each worker's environment with the dependencies
-        required to run the experiments.
+    async def _start_suite(
+        cls, home_dir, suite_id, candidate, workers, experiments, datasets
+    ):
+        """Starts the scheduling of the suite experiments in the background.
 
+        Workers are initialized concurrently and receive experiments as soon
+        as they are ready. Datasets are parsed for their shapes in the default
+        executor, so that the IOLoop keeps serving requests meanwhile.
+
+        :param home_dir: (string) path to the master working directory.
         :param suite_id: (string) suite id.
-        :param workers: (list[models.Worker]) list of workers to initialize.
+        :param candidate: (models.Candidate) candidate object.
+        :param workers: (list[models.Worker]) list of workers.
+        :param experiments: (list[models.Experiment]) experiments to schedule.
         :param datasets: (list[string]) list of dataset names.
-        for the experiments.
         """
-        for worker in workers:
-            log.info("Setting up worker at %s on port %d", worker.hostname, worker.port)
-            message = {
-                "master_address": worker.master_address,
-                "suite_id": suite_id,
-                "candidate_id": candidate.id,
-                "requirements": candidate.requirements,
-                "datasets": datasets,
-            }
-            response = await worker.session.post_json("setup/", message)
-            if response.status_code == 200:
-                log.info("worker initialized correctly.")
-            else:
-                raise ValueError("worker initialization failed: ", response.reason)
+        if not experiments:
+            return
+        dataset_shapes = await IOLoop.current().run_in_executor(
+            None, get_dataset_shapes, home_dir, datasets
+        )
+        scheduler = SuiteScheduler.create(
+            suite_id,
+            workers,
+            experiments,
+            sweep_parameter=candidate.sweep_parameter,
+            ready=False,
+            candidate_name=candidate.name,
+            dataset_shapes=dataset_shapes,
+        )
+        IOLoop.current().add_callback(callback=scheduler.run)
+        IOLoop.current().add_callback(
+            cls._initialize_worker_envs, scheduler, candidate, workers, datasets
+        )
 
     def _load_candidate(self, candidate_name):
         candidate_dir = os.path.join(get_include_dir(), "candidates")
@@ -543,8 +824,6 @@ class SuiteHandler(BaseMasterHandler):
             suite = Suite.create()
 
             data_name = self._add_local_dataset(message)
-            if not Dataset.get_all():
-                Dataset.setup()
 
             if data_name:
                 dataset_names = [data_name]
@@ -553,8 +832,7 @@ class SuiteHandler(BaseMasterHandler):
 
             master_address = message["master_address"]
             workers_list = message["workers"]
-            if not Worker.get_all():
-                Worker.setup(workers_list, master_address)
+            Worker.setup(workers_list, master_address)
             workers = list(Worker.get_all())  # this returns a non-subscriptable set-like
 
             candidate = self._get_candidate(suite.id, message)
@@ -565,15 +843,12 @@ class SuiteHandler(BaseMasterHandler):
                 datasets=dataset_names,
                 parameters=candidate.parameters,
             )
-            await self._initialize_worker_envs(
-                suite.id, candidate, workers, dataset_names
+            experiments = await complete_cached_experiments(
+                self.get_wd(), candidate, experiments
             )
-
-            # runs scheduling loop in the background
-            IOLoop.current().add_callback(
-                callback=self._start_scheduling_loop,
-                experiments=experiments,
-                workers=workers,
+            # sets up workers and runs the scheduling loop in the background
+            await self._start_suite(
+                self.get_wd(), suite.id, candidate, workers, experiments, dataset_names
             )
 
             message = get_response_message(status=200, payload={"suite_id": suite.id})
@@ -593,8 +868,8 @@ class SuiteHandler(BaseMasterHandler):
         """
         candidate = Candidate.get_by_suite(suite_id)
         experiments = Experiment.get_by_suite(suite_id)
-        jinja2_env = Environment(
-            loader=PackageLoader("bad_framework.bad_master", "templates")
+        jinja2_env = j2.Environment(
+            loader=j2.PackageLoader("bad_framework.bad_master", "templates")
         )
         template = jinja2_env.get_template("suite_details.html")
         rendered_template = template.render(candidate=candidate, experiments=experiments)
@@ -627,17 +902,21 @@ class SuiteStatusHandler(BaseMasterHandler):
         """
         message = {
             "suite_id": suite_id,
-            "experiments": [
+            "summary": Experiment.get_status_counts(suite_id),
+        }
+        if not self.get_query_argument("summary", default=None):
+            message["experiments"] = [
                 {"id": experiment.id, "status": experiment.get_status_string()}
                 for experiment in Experiment.get_by_suite(suite_id)
-            ],
-        }
+            ]
         self.write(chunk=message)
 
     def get(self, suite_id):
         """Handler for HTTP GET method.
 
         Returns information on the suite experiments as a JSON-encoded file.
+        The summary field holds the number of experiments for each status.
+        With the "summary" query argument, the experiments list is omitted.
         """
         try:
             self._get_suite_status(suite_id)
@@ -649,6 +928,55 @@ class SuiteStatusHandler(BaseMasterHandler):
             self.finish()
 
 
+class SuiteStatusStreamHandler(BaseMasterHandler):
+    """Handler for long-polling requests on the suite status.
+
+    Clients pass the feed version they last received in the "version" query
+    argument. The response is sent as soon as some experiment status changes
+    after that version, or when the "timeout" query argument expires, and only
+    holds the changed experiments and the status counters.
+    """
+
+    MAX_TIMEOUT = 60.0
+
+    async def _get_suite_status_update(self, suite_id):
+        """Writes the JSON-encoded suite status update to the output stream.
+
+        :param suite_id: (string) suite id.
+        """
+        feed = StatusFeed.get_by_suite(suite_id)
+        version = int(self.get_query_argument("version", default="0"))
+        timeout = float(self.get_query_argument("timeout", default="30"))
+        if version > feed.version:
+            # The master restarted since the client request, send all changes
+            version = 0
+
+        await feed.wait(version, min(timeout, self.MAX_TIMEOUT))
+        message = {
+            "suite_id": suite_id,
+            "version": feed.version,
+            "summary": Experiment.get_status_counts(suite_id),
+            "changes": [
+                {"id": experiment_id, "status": status}
+                for experiment_id, status in feed.get_changes(version).items()
+            ],
+        }
+        self.write(chunk=message)
+
+    async def get(self, suite_id):
+        """Handler for HTTP GET method.
+
+        Returns the suite status changes as a JSON-encoded file.
+        """
+        try:
+            await self._get_suite_status_update(suite_id)
+        except Exception as e:
+            log.error(traceback.format_exc())
+            self.set_status(500, reason=str(e))
+        finally:
+            await self.finish()
+
+
 class SuiteDumpHandler(BaseMasterHandler):
     """Handler for requests related to the suite results dump."""
 
@@ -667,6 +995,9 @@ class SuiteDumpHandler(BaseMasterHandler):
                 "candidate",
                 "roc_auc",
                 "average_precision",
+                "sweep_size",
+                *TIMING_FIELDS,
+                *RESOURCE_USAGE_FIELDS,
                 *parameter_names,
             ]
             return ",".join(fields) + "\n"
@@ -678,16 +1009,25 @@ class SuiteDumpHandler(BaseMasterHandler):
             parameter_values = [v for k, v in sorted(exp_parameters.items())]
             roc_auc = metrics["roc_auc"]
             average_precision = metrics["average_precision"]
-            execution_time_microseconds = int(
-                (exp.completed_ts - exp.scheduled_ts).total_seconds() * 1e6
-            )
+            # Results generated by older workers have no sweep size, timings
+            # and resource usage
+            sweep_size = metrics.get("sweep_size", "")
+            timings = metrics.get("timings", {})
+            timing_values = [str(timings.get(field, "")) for field in TIMING_FIELDS]
+            resources = metrics.get("resources", {})
+            resource_values = [
+                str(resources.get(field, "")) for field in RESOURCE_USAGE_FIELDS
+            ]
             digest_fields = [
                 exp.id,
-                str(execution_time_microseconds),
+                str(exp.execution_time),
                 exp.dataset,
                 Candidate.get_by_id(exp.candidate).name,
                 str(roc_auc),
                 str(average_precision),
+                str(sweep_size),
+                *timing_values,
+                *resource_values,
                 *parameter_values,
             ]
             return ",".join(digest_fields) + "\n"
@@ -713,3 +1053,35 @@ class SuiteDumpHandler(BaseMasterHandler):
         finally:
             self.flush()
             self.finish()
+
+
+async def resume_suites(home_dir):
+    """Resumes the scheduling of the suites restored from the master store.
+
+    Only the experiments that are not completed nor failed are scheduled again,
+    unless their results are cached. Workers are initialized again before
+    scheduling, since they may have been restarted together with the master.
+
+    :param home_dir: (string) path to the master working directory.
+    """
+    workers = list(Worker.get_all())
+    for suite in Suite.get_all():
+        experiments = [
+            experiment
+            for experiment in Experiment.get_by_suite(suite.id)
+            if experiment.status == ExperimentStatus.CREATED
+        ]
+        if not experiments:
+            continue
+        log.info("Resuming suite %s (%d experiments)", suite.id, len(experiments))
+        try:
+            candidate = Candidate.get_by_suite(suite.id)
+            experiments = await complete_cached_experiments(
+                home_dir, candidate, experiments
+            )
+            dataset_names = sorted({experiment.dataset for experiment in experiments})
+            await SuiteHandler._start_suite(
+                home_dir, suite.id, candidate, workers, experiments, dataset_names
+            )
+        except Exception:
+            log.error(traceback.format_exc())
@@ -2,12 +2,17 @@
 
 All rights reserved.
 """
+import hashlib
 import itertools
-import numpy as np
+import os
 import sys
 import subprocess
 
 from . import adt
+from .files import get_file_hash
+from .lazy import lazy_import
+
+np = lazy_import("numpy")
 
 
 def generate_experiments_settings(datasets, parameter_settings):
@@ -87,13 +92,56 @@ def init_worker_environments(workers, suite_id, candidate_id, datasets):
         worker.session.post_json("setup/", message)
 
 
-def install_requirements(requirements):
-    """Installs a requirements.txt file using the pip defined in the current interpreter.
+def get_requirements_hash(requirements, interpreter=sys.executable):
+    """Returns a digest identifying a requirement set installed in an interpreter.
+
+    The digest does not depend on the order of the requirements.
+
+    :param requirements: (list[string]) list of pip requirement specifiers.
+    :param interpreter: (string) path to the Python interpreter.
+    :return: (string) hexadecimal digest.
+
+    >>> get_requirements_hash(["a", "b"]) == get_requirements_hash(["b", "a"])
+    True
+    """
+    requirements_hash = hashlib.sha256(interpreter.encode())
+    for requirement in sorted(requirements):
+        requirements_hash.update(b"\n" + requirement.encode())
+    return requirements_hash.hexdigest()
+
+
+def install_requirements(requirements, wheelhouse_dir=None, interpreter=sys.executable):
+    """Installs a requirements.txt file using the pip defined in the interpreter.
+
+    With a wheelhouse directory, packages are installed from the wheels in the
+    directory, without reaching the package index. Missing wheels are built
+    into the wheelhouse first, so later installs of the same requirements
+    work offline.
 
     :param requirements: (list[string]) list of pip requirement specifiers.
+    :param wheelhouse_dir: (string) path to the wheelhouse directory, optional.
+    :param interpreter: (string) path to the Python interpreter.
     :return: None
     """
-    subprocess.check_call([sys.executable, "-m", "pip", "install", *requirements])
+    if not requirements:
+        return
+    pip_command = [interpreter, "-m", "pip"]
+    if not wheelhouse_dir:
+        subprocess.check_call([*pip_command, "install", *requirements])
+        return
+    offline_install = [
+        *pip_command,
+        "install",
+        "--no-index",
+        "--find-links",
+        wheelhouse_dir,
+        *requirements,
+    ]
+    if subprocess.call(offline_install) != 0:
+        subprocess.check_call(
+            [*pip_command, "wheel", "--wheel-dir", wheelhouse_dir, *requirements]
+        )
+        subprocess.check_call(offline_install)
 
 
 def load_data_matrix(path):
@@ -106,6 +154,60 @@ def load_data_matrix(path):
     return np.loadtxt(path, dtype=float, comments=["#", "@"], delimiter=",")
 
 
+def get_data_cache_path(cache_dir, digest):
+    """Returns the path of the binary cache file for a data set.
+
+    :param cache_dir: (string) path to the data cache directory.
+    :param digest: (string) SHA-256 digest of the data file content.
+    :return: (string) path to the cache file.
+
+    >>> get_data_cache_path("/tmp/cache", "abc123")
+    '/tmp/cache/abc123.npy'
+    """
+    return os.path.join(cache_dir, digest + ".npy")
+
+
+def cache_data_matrix(path, cache_dir, digest=None):
+    """Converts a data file in ARFF format to a binary .npy cache file,
+    unless the cache file already exists.
+
+    The cache file is keyed by the content hash of the data file and stores
+    the matrix in column-major order. It is written atomically, so concurrent
+    processes never observe a partially written cache file.
+
+    :param path: (string) path to data file.
+    :param cache_dir: (string) path to the data cache directory.
+    :param digest: (string) optional SHA-256 digest of the data file content.
+    :return: (string) the digest of the data file content.
+    """
+    digest = digest or get_file_hash(path)
+    cache_path = get_data_cache_path(cache_dir, digest)
+    if not os.path.exists(cache_path):
+        if not os.path.exists(cache_dir):
+            os.makedirs(cache_dir, exist_ok=True)
+        data_matrix = np.asfortranarray(load_data_matrix(path))
+        temp_path = "{}.{}.tmp".format(cache_path, os.getpid())
+        with open(temp_path, "wb") as cache_file:
+            np.save(cache_file, data_matrix)
+        os.replace(temp_path, cache_path)
+    return digest
+
+
+def load_cached_data_matrix(path, cache_dir, digest=None):
+    """Returns the numpy matrix corresponding to a data file in ARFF format,
+    memory-mapped from its binary cache file.
+
+    The cache file is created on first use. The returned matrix is read-only.
+
+    :param path: (string) path to data file.
+    :param cache_dir: (string) path to the data cache directory.
+    :param digest: (string) optional SHA-256 digest of the data file content.
+    :return: (numpy.ndarray) data matrix
+    """
+    digest = cache_data_matrix(path, cache_dir, digest)
+    return np.load(get_data_cache_path(cache_dir, digest), mmap_mode="r")
+
+
 def load_parameter_string(parameter_string):
     """Converts a parameter string into a dictionary parameter.
     Parameter values are represented as strings.
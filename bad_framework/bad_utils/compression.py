@@ -0,0 +1,147 @@
+"""Copyright (C) 2020 Sivam Pasupathipillai <sivam.pasupathipillai@gmail.com>.
+
+All rights reserved.
+
+Content-Encoding support for BAD transfers.
+
+gzip is always available. zstd is used when the optional zstandard package
+is installed, and preferred over gzip since it is much faster to decompress.
+"""
+import gzip
+import os
+import shutil
+import tempfile
+
+try:
+    import zstandard
+except ImportError:  # zstd is optional
+    zstandard = None
+
+COPY_BUFFER_SIZE = 1048576
+GZIP_LEVEL = 6
+ZSTD_LEVEL = 3
+
+
+def get_supported_encodings():
+    """Returns the supported content encodings, in order of preference.
+
+    :return: (list[string]) content encoding names.
+    """
+    if zstandard is not None:
+        return ["zstd", "gzip"]
+    return ["gzip"]
+
+
+def get_accept_encoding():
+    """Returns the Accept-Encoding header value for the supported encodings."""
+    return ", ".join(get_supported_encodings())
+
+
+def choose_encoding(accept_encoding):
+    """Chooses the preferred supported encoding accepted by the client.
+
+    :param accept_encoding: (string) Accept-Encoding header value, or None.
+    :return: (string) content encoding name, None if no encoding is accepted.
+
+    >>> choose_encoding("gzip, deflate")
+    'gzip'
+    >>> choose_encoding("gzip;q=0, br") is None
+    True
+    >>> choose_encoding(None) is None
+    True
+    """
+    accepted_encodings = set()
+    for coding in (accept_encoding or "").split(","):
+        name, _, quality = coding.partition(";")
+        quality = quality.strip()
+        if quality.startswith("q="):
+            try:
+                if float(quality[2:]) <= 0:
+                    continue
+            except ValueError:
+                continue
+        accepted_encodings.add(name.strip().lower())
+    for encoding in get_supported_encodings():
+        if encoding in accepted_encodings:
+            return encoding
+    return None
+
+
+def _open_encoder(encoding, output_file):
+    if encoding == "gzip":
+        return gzip.GzipFile(fileobj=output_file, mode="wb", compresslevel=GZIP_LEVEL)
+    if encoding == "zstd" and zstandard is not None:
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL).stream_writer(output_file)
+    raise ValueError("unsupported content encoding: {}".format(encoding))
+
+
+def _open_decoder(encoding, input_file):
+    if encoding == "gzip":
+        return gzip.GzipFile(fileobj=input_file, mode="rb")
+    if encoding == "zstd" and zstandard is not None:
+        return zstandard.ZstdDecompressor().stream_reader(input_file)
+    raise ValueError("unsupported content encoding: {}".format(encoding))
+
+
+def _transcode_file(source_path, target_path, transcode):
+    """Writes the transcoded content of a file to a temporary file, renamed
+    into place once complete."""
+    target_dir = os.path.dirname(target_path) or "."
+    os.makedirs(target_dir, exist_ok=True)
+    tmp_file = tempfile.NamedTemporaryFile(dir=target_dir, delete=False)
+    try:
+        with open(source_path, "rb") as source_file, tmp_file:
+            transcode(source_file, tmp_file)
+        os.replace(tmp_file.name, target_path)
+    except BaseException:
+        os.remove(tmp_file.name)
+        raise
+
+
+def compress_file(path, compressed_path, encoding):
+    """Compresses a file, streaming its content.
+
+    :param path: (string) path to the file.
+    :param compressed_path: (string) path to the compressed file.
+    :param encoding: (string) content encoding name.
+    :return: None
+    """
+
+    def compress(source_file, target_file):
+        with _open_encoder(encoding, target_file) as encoder:
+            shutil.copyfileobj(source_file, encoder, COPY_BUFFER_SIZE)
+
+    _transcode_file(path, compressed_path, compress)
+
+
+def decompress_file(compressed_path, path, encoding):
+    """Decompresses a file, streaming its content.
+
+    :param compressed_path: (string) path to the compressed file.
+    :param path: (string) path to the decompressed file.
+    :param encoding: (string) content encoding name.
+    :return: None
+    """
+
+    def decompress(source_file, target_file):
+        with _open_decoder(encoding, source_file) as decoder:
+            shutil.copyfileobj(decoder, target_file, COPY_BUFFER_SIZE)
+
+    _transcode_file(compressed_path, path, decompress)
+
+
+def compress_bytes(content, encoding):
+    """Compresses a byte string.
+
+    :param content: (bytes) content to compress.
+    :param encoding: (string) content encoding name.
+    :return: (bytes) compressed content.
+
+    >>> gzip.decompress(compress_bytes(b"bad", "gzip"))
+    b'bad'
+    """
+    if encoding == "gzip":
+        return gzip.compress(content, compresslevel=GZIP_LEVEL)
+    if encoding == "zstd" and zstandard is not None:
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(content)
+    raise ValueError("unsupported content encoding: {}".format(encoding))
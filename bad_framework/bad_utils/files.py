@@ -2,6 +2,7 @@
 
 All rights reserved.
 """
+import hashlib
 import os
 import re
 import shutil
@@ -10,6 +11,9 @@ from tempfile import TemporaryDirectory
 import bad_framework
 from bad_framework.bad_utils.adt import conditional_casting
 
+_file_hashes = {}  # file path -> ((size, modification time), digest)
+_data_shapes = {}  # file digest -> shape
+
 
 def get_candidate_filename(home_dir, suite_id):
     """Returns a suite-unique filename where to store a local candidate module.
@@ -42,6 +46,23 @@ def get_candidate_name(candidate_path):
     raise ValueError("invalid candidate file {}".format(candidate_path))
 
 
+def get_candidate_sweep_parameter(candidate_path):
+    """Parses the candidate file and returns the name of the parameter the
+    candidate supports sweeps over, as declared by its sweep_parameter attribute.
+
+    :param candidate_path: (string) filename of the candidate file
+    :return: (string) the sweep parameter name, or None if sweeps are not supported
+    """
+    # Matches a class attribute assignment and captures the parameter name.
+    sweep_parameter_re = re.compile(r"^[\s]+sweep_parameter[\s]*=[\s]*[\"'](\w+)[\"']")
+    with open(candidate_path, "r") as candidate_file:
+        for line in candidate_file.readlines():
+            match = sweep_parameter_re.match(line)
+            if match:
+                return str(match[1])
+    return None
+
+
 def parse_param_line(line):
     """Parses a line of text specifying a parameter and returns the
     parsed fields.
@@ -158,6 +179,61 @@ def parse_parameters(parameters_filename):
     return parameters
 
 
+def get_file_hash(path, chunk_size=1048576):
+    """Returns the SHA-256 digest of a file's content.
+
+    :param path: (string) path to the file.
+    :param chunk_size: (int) number of bytes read at a time.
+    :return: (string) hexadecimal digest.
+    """
+    file_hash = hashlib.sha256()
+    with open(path, "rb") as hashed_file:
+        for chunk in iter(lambda: hashed_file.read(chunk_size), b""):
+            file_hash.update(chunk)
+    return file_hash.hexdigest()
+
+
+def get_cached_file_hash(path):
+    """Returns the SHA-256 digest of a file's content, computed once per file
+    version, i.e. until the file size or modification time change.
+
+    :param path: (string) path to the file.
+    :return: (string) hexadecimal digest.
+    """
+    file_stat = os.stat(path)
+    file_version = (file_stat.st_size, file_stat.st_mtime_ns)
+    cached_version, digest = _file_hashes.get(path, (None, None))
+    if cached_version != file_version:
+        digest = get_file_hash(path)
+        _file_hashes[path] = (file_version, digest)
+    return digest
+
+
+def get_data_shape(path):
+    """Returns the number of elements and features of a data file in ARFF format,
+    computed once per file content, see get_cached_file_hash().
+
+    The first two columns of each element, i.e. the element id and the outlier
+    label, are not counted as features.
+
+    :param path: (string) path to the data file.
+    :return: (tuple) (number of elements, number of features).
+    """
+    digest = get_cached_file_hash(path)
+    shape = _data_shapes.get(digest)
+    if shape is None:
+        elements_num, columns_num = 0, 0
+        with open(path, "r") as data_file:
+            for line in data_file:
+                line = line.strip()
+                if line and not line.startswith(("#", "@")):
+                    elements_num += 1
+                    columns_num = columns_num or line.count(",") + 1
+        shape = (elements_num, max(columns_num - 2, 0))
+        _data_shapes[digest] = shape
+    return shape
+
+
 def get_include_dir():
     return os.path.join(os.path.dirname(bad_framework.__file__), "include")
 
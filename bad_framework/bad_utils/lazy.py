@@ -0,0 +1,49 @@
+"""Copyright (C) 2020 Sivam Pasupathipillai <sivam.pasupathipillai@gmail.com>.
+
+All rights reserved.
+
+Lazy imports for the BAD processes.
+
+Heavy dependencies, e.g. numpy, scikit-learn, matplotlib or httpx, are only
+needed by some requests, so the servers import them on first use, see
+lazy_import(), and start listening without paying their import time.
+"""
+import importlib
+import threading
+import types
+
+
+class LazyModule(types.ModuleType):
+    """Module proxy, importing the module on first attribute access."""
+
+    def __init__(self, name):
+        super().__init__(name)
+        self._lazy_module = None
+        self._lazy_lock = threading.Lock()
+
+    def _load(self):
+        if self._lazy_module is None:
+            with self._lazy_lock:
+                if self._lazy_module is None:
+                    self._lazy_module = importlib.import_module(self.__name__)
+        return self._lazy_module
+
+    def __getattr__(self, name):
+        # Only called for the attributes not found on the proxy itself
+        return getattr(self._load(), name)
+
+    def __dir__(self):
+        return dir(self._load())
+
+
+def lazy_import(module_name):
+    """Returns a proxy of a module, imported on first attribute access.
+
+    :param module_name: (string) absolute module name, e.g. "sklearn.metrics".
+    :return: (LazyModule) module proxy.
+
+    >>> json = lazy_import("json")
+    >>> json.dumps([1])
+    '[1]'
+    """
+    return LazyModule(module_name)
@@ -7,3 +7,22 @@ import os
 BAD_DIR = ".bad"
 BAD_CONF_DIR = os.path.join(BAD_DIR, "bad.conf")
 LOG_FORMAT = "%(asctime)s - %(name)s - %(levelname)5s - %(message)s"
+CONTENT_DIGEST_HEADER = "X-Content-SHA256"
+# Experiment resource usage, in seconds and bytes, see bad_worker.sandbox
+RESOURCE_USAGE_FIELDS = (
+    "fit_wall_time",
+    "fit_user_time",
+    "fit_sys_time",
+    "score_wall_time",
+    "score_user_time",
+    "score_sys_time",
+    "peak_rss",
+)
+# Experiment phase timings, in nanoseconds
+TIMING_FIELDS = (
+    "load_time_ns",
+    "fit_time_ns",
+    "score_time_ns",
+    "metrics_time_ns",
+    "roc_time_ns",
+)
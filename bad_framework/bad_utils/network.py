@@ -5,12 +5,37 @@ All rights reserved.
 from tempfile import NamedTemporaryFile
 from threading import Thread
 from http.server import HTTPServer, SimpleHTTPRequestHandler
-import httpx
+import asyncio
+import hashlib
 import json
+import os
 import random
-import requests
 
+from .compression import compress_bytes, decompress_file, get_accept_encoding
 from .files import save_file
+from .lazy import lazy_import
+from .magic import CONTENT_DIGEST_HEADER
+
+httpx = lazy_import("httpx")
+requests = lazy_import("requests")
+
+DEFAULT_MAX_CONNECTIONS = 100
+DEFAULT_MAX_KEEPALIVE_CONNECTIONS = 20
+
+
+def get_partial_file_hash(path, chunk_size=1048576):
+    """Returns the SHA-256 hash object of a file's content, so that it can be
+    updated with the content appended later.
+
+    :param path: (string) path to the file.
+    :param chunk_size: (int) number of bytes read at a time.
+    :return: (hashlib.sha256) hash object.
+    """
+    file_hash = hashlib.sha256()
+    with open(path, "rb") as hashed_file:
+        for chunk in iter(lambda: hashed_file.read(chunk_size), b""):
+            file_hash.update(chunk)
+    return file_hash
 
 
 class HTTPSessionManager:
@@ -82,14 +107,30 @@ class HTTPSessionManager:
 
 
 class AsyncHTTPSessionManager:
-    """Utility class for managing a persistent HTTP session."""
+    """Utility class for managing a persistent asynchronous HTTP session.
+
+    Each session manager owns a long-lived httpx.AsyncClient, so that connections
+    to the remote host are pooled and kept alive across requests.
+    Use get_session() to share a single session manager per remote host.
+    """
 
-    def __init__(self, domain, timeout=None):
+    _sessions = {}
+
+    def __init__(
+        self,
+        domain,
+        timeout=None,
+        max_connections=DEFAULT_MAX_CONNECTIONS,
+        max_keepalive_connections=DEFAULT_MAX_KEEPALIVE_CONNECTIONS,
+    ):
         """Initializes the SessionManager to connect to a given hostname.
-        A connection timeout can be optionally specified.
+        A connection timeout and the connection pool limits can be optionally specified.
 
         :param domain: (string) destination hostname.
-        :param timeout: (int) connection timeout in seconds (defaults=300, or 5 minutes).
+        :param timeout: (int) connection timeout in seconds (defaults to no timeout).
+        :param max_connections: (int) maximum number of concurrent connections.
+        :param max_keepalive_connections: (int) maximum number of idle connections
+        kept alive in the pool.
         """
         self._timeout = timeout
 
@@ -98,46 +139,155 @@ class AsyncHTTPSessionManager:
         else:
             self._fq_domain = "http://" + domain
 
-        if not httpx.head(self._fq_domain).status_code == 200:
+        self._client = httpx.AsyncClient(
+            timeout=timeout,
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_keepalive_connections,
+            ),
+        )
+
+    @classmethod
+    def get_session(cls, domain, **kwargs):
+        """Returns the shared session manager for a given hostname.
+        The session manager is created on first use.
+
+        :param domain: (string) destination hostname.
+        :param kwargs: (dict) keyword arguments for the session manager constructor.
+        :return: (AsyncHTTPSessionManager) session manager for domain.
+        """
+        session = cls._sessions.get(domain)
+        if session is None or session.is_closed:
+            session = AsyncHTTPSessionManager(domain, **kwargs)
+            cls._sessions[domain] = session
+        return session
+
+    @classmethod
+    async def close_all(cls):
+        """Closes all shared session managers."""
+        sessions = list(cls._sessions.values())
+        cls._sessions = {}
+        for session in sessions:
+            await session.aclose()
+
+    @property
+    def is_closed(self):
+        return self._client.is_closed
+
+    async def aclose(self):
+        """Closes the underlying HTTP client and all pooled connections."""
+        await self._client.aclose()
+
+    async def check_health(self):
+        """Checks that the remote host is reachable.
+
+        :return: None
+        :raises ValueError: if the remote host does not respond correctly.
+        """
+        try:
+            r = await self._client.head(self._fq_domain)
+        except httpx.HTTPError as e:
+            raise ValueError("cannot connect to host {}: {}".format(self._fq_domain, e))
+        if not r.status_code == 200:
             raise ValueError("cannot connect to host {}".format(self._fq_domain))
 
-    async def download_file(self, url, path=None):
-        """GETs the resource specified by URL and saves it in the temporary
-        files system folder.
+    async def _download_to_partial_file(self, get_url, partial_path):
+        """Downloads a resource to a partial file, resuming from its end when the
+        server supports range requests.
 
-        The file operates in binary mode. The user is responsible for file
-        resource deallocation.
+        The partial file holds the content as sent by the server, i.e. still
+        compressed if the server sent it with a content encoding.
+
+        :param get_url: (string) fully qualified resource URL.
+        :param partial_path: (string) path to the partial file.
+        :return: (string) content encoding of the partial file, None if the
+        content is not compressed.
+        :raises ValueError: if the request fails or the content digest sent by
+        the server does not match the downloaded content. A resumed download
+        whose digest does not match is first downloaded again from the start.
+        """
+        offset = os.path.getsize(partial_path) if os.path.exists(partial_path) else 0
+        headers = {"Accept-Encoding": get_accept_encoding()}
+        if offset:
+            headers["Range"] = "bytes={}-".format(offset)
+        async with self._client.stream("GET", get_url, headers=headers) as r:
+            if r.status_code == 416:
+                # The partial file is stale, e.g. the resource has changed
+                os.remove(partial_path)
+                return await self._download_to_partial_file(get_url, partial_path)
+            if r.status_code == 206:
+                content_range = r.headers.get("Content-Range", "")
+                if not content_range.startswith("bytes {}-".format(offset)):
+                    raise ValueError("invalid content range: {}".format(content_range))
+                file_hash = get_partial_file_hash(partial_path)
+                file_mode = "ab"
+            elif r.status_code == 200:
+                file_hash = hashlib.sha256()
+                file_mode = "wb"
+            else:
+                raise ValueError(r.status_code)
+
+            with open(partial_path, file_mode) as partial_file:
+                async for chunk in r.aiter_raw():
+                    partial_file.write(chunk)
+                    file_hash.update(chunk)
+
+            expected_digest = r.headers.get(CONTENT_DIGEST_HEADER)
+            if expected_digest and expected_digest != file_hash.hexdigest():
+                os.remove(partial_path)
+                if offset:
+                    # The partial file is corrupted, download it again from start
+                    return await self._download_to_partial_file(get_url, partial_path)
+                raise ValueError("checksum mismatch for {}".format(get_url))
+            return r.headers.get("Content-Encoding")
+
+    async def download_file(self, url, path=None, max_retries=3):
+        """GETs the resource specified by URL and streams it to a file.
+
+        The content is written in chunks to a partial file next to the
+        destination path, which is decompressed or renamed into place once the
+        download is complete. Interrupted downloads are retried up to
+        max_retries times, resuming from the end of the partial file with a
+        range request. When the server sends the content digest, see
+        magic.CONTENT_DIGEST_HEADER, the downloaded content is checked against it.
 
         :param url: (string) URL to the resource.
-        :param path: (string) optional path to file.
+        :param path: (string) optional path to file, a temporary file if missing.
+        The user is responsible for temporary file deallocation.
+        :param max_retries: (int) maximum number of retries on network errors.
         :return: (string) path to the downloaded file.
         """
+        if not path:
+            with NamedTemporaryFile(delete=False) as ntf:
+                path = ntf.name
+        elif not os.path.exists(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        partial_path = path + ".part"
         get_url = "{}/{}".format(self._fq_domain, url)
 
-        async with httpx.AsyncClient() as client:
-            r = await client.get(get_url, timeout=self._timeout)
-
-        if r.status_code == 200:
-            if path:
-                save_file(r.content, path)
-                return path
-            else:
-                with NamedTemporaryFile() as ntf:
-                    ntf.write(r.content)
-                return ntf.name
+        for attempt in range(max_retries + 1):
+            try:
+                encoding = await self._download_to_partial_file(get_url, partial_path)
+                break
+            except httpx.TransportError:
+                if attempt == max_retries:
+                    raise
+        if encoding and encoding != "identity":
+            await asyncio.get_event_loop().run_in_executor(
+                None, decompress_file, partial_path, path, encoding
+            )
+            os.remove(partial_path)
         else:
-            raise ValueError(r.status_code)
+            os.replace(partial_path, path)
+        return path
 
     async def get(self, url):
         get_url = "{}/{}".format(self._fq_domain, url)
-        async with httpx.AsyncClient() as client:
-            r = await client.get(get_url, timeout=self._timeout)
-        return r
+        return await self._client.get(get_url)
 
     async def get_json(self, url):
         get_url = "{}/{}".format(self._fq_domain, url)
-        async with httpx.AsyncClient() as client:
-            r = await client.get(get_url, timeout=self._timeout)
+        r = await self._client.get(get_url)
         if r.status_code == 200:
             return json.loads(r.content)
         raise ValueError(r.status_code)
@@ -147,18 +297,30 @@ class AsyncHTTPSessionManager:
 
         :param url: (string) resource URL to POST.
         :param data: (dict) JSON data in a python dict.
-        :return: (requests.Response) server response.
+        :return: (httpx.Response) server response.
         """
         post_url = "{}/{}".format(self._fq_domain, url)
-        async with httpx.AsyncClient() as client:
-            r = await client.post(post_url, json=data, timeout=self._timeout)
-        return r
+        return await self._client.post(post_url, json=data)
+
+    async def post_files(self, url, files, compress=False):
+        """POSTs files as multipart form data to the specified url.
 
-    async def post_files(self, url, files):
+        :param url: (string) resource URL to POST.
+        :param files: (dict) file name -> file content.
+        :param compress: (bool) whether to send the request body gzip-compressed,
+        the server must support request decompression.
+        :return: (httpx.Response) server response.
+        """
         post_url = "{}/{}".format(self._fq_domain, url)
-        async with httpx.AsyncClient() as client:
-            r = await client.post(post_url, files=files, timeout=self._timeout)
-        return r
+        if not compress:
+            return await self._client.post(post_url, files=files)
+        request = self._client.build_request("POST", post_url, files=files)
+        headers = {
+            "Content-Type": request.headers["Content-Type"],
+            "Content-Encoding": "gzip",
+        }
+        content = compress_bytes(await request.aread(), "gzip")
+        return await self._client.post(post_url, content=content, headers=headers)
 
 
 class MockHTTPHandler(SimpleHTTPRequestHandler):
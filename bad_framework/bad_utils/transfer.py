@@ -0,0 +1,175 @@
+"""Copyright (C) 2020 Sivam Pasupathipillai <sivam.pasupathipillai@gmail.com>.
+
+All rights reserved.
+
+Dataset transfers between BAD processes.
+
+Both the master and the workers serve datasets, see DatasetTransferMixin,
+so that workers can download datasets from each other.
+"""
+import logging
+import os
+
+from tornado.ioloop import IOLoop
+
+from bad_framework.bad_utils.compression import choose_encoding, compress_file
+from bad_framework.bad_utils.files import get_cached_file_hash
+from bad_framework.bad_utils.magic import CONTENT_DIGEST_HEADER
+
+log = logging.getLogger("bad.transfer")
+
+_pending_compressions = {}  # compressed dataset path -> asyncio.Future
+
+
+def get_byte_range(range_header, file_size):
+    """Parses a single byte range of an HTTP Range header.
+
+    :param range_header: (string) Range header value, e.g. "bytes=100-".
+    :param file_size: (int) size of the requested file, in bytes.
+    :return: (tuple) (start, end) offsets, end excluded, or None if the
+    range cannot be satisfied.
+
+    >>> get_byte_range("bytes=100-", 1000)
+    (100, 1000)
+    >>> get_byte_range("bytes=100-199", 1000)
+    (100, 200)
+    >>> get_byte_range("bytes=-100", 1000)
+    (900, 1000)
+    >>> get_byte_range("bytes=1000-", 1000) is None
+    True
+    """
+    unit, _, byte_range = range_header.partition("=")
+    start, _, end = byte_range.strip().partition("-")
+    if unit.strip() != "bytes" or "," in byte_range:
+        return None
+    try:
+        if not start:
+            start, end = max(file_size - int(end), 0), file_size
+        else:
+            start = int(start)
+            end = min(int(end) + 1, file_size) if end else file_size
+    except ValueError:
+        return None
+    if start >= end:
+        return None
+    return start, end
+
+
+def get_compressed_dataset_path(home_dir, data_digest, encoding):
+    return os.path.join(home_dir, "dataset_cache", "{}.{}".format(data_digest, encoding))
+
+
+async def get_compressed_dataset(home_dir, dataset_path, encoding):
+    """Returns the path to the compressed copy of a dataset.
+
+    Compressed copies are cached by dataset digest, so each dataset version is
+    compressed once, in a background thread, and concurrent requests for the
+    same copy wait for the same compression.
+
+    :param home_dir: (string) path to the home directory of the process.
+    :param dataset_path: (string) path to the dataset file.
+    :param encoding: (string) content encoding name.
+    :return: (string) path to the compressed dataset file.
+    """
+    io_loop = IOLoop.current()
+    data_digest = await io_loop.run_in_executor(None, get_cached_file_hash, dataset_path)
+    compressed_path = get_compressed_dataset_path(home_dir, data_digest, encoding)
+    if os.path.exists(compressed_path):
+        return compressed_path
+    pending_compression = _pending_compressions.get(compressed_path)
+    if pending_compression is not None:
+        await pending_compression
+        return compressed_path
+
+    log.info("Compressing dataset %s with %s...", dataset_path, encoding)
+    pending_compression = io_loop.run_in_executor(
+        None, compress_file, dataset_path, compressed_path, encoding
+    )
+    _pending_compressions[compressed_path] = pending_compression
+    try:
+        await pending_compression
+    finally:
+        del _pending_compressions[compressed_path]
+    return compressed_path
+
+
+class DatasetTransferMixin:
+    """Streams datasets from a tornado.web.RequestHandler.
+
+    Datasets are streamed in chunks, so they are never loaded in memory as a
+    whole. Datasets are sent compressed when the client accepts a supported
+    content encoding and compression pays off, see get_compressed_dataset().
+    The SHA-256 digest of the sent representation is sent in a response header,
+    and single byte ranges of it are supported, so that interrupted downloads
+    can resume.
+    """
+
+    CHUNK_SIZE = 1048576
+
+    async def _get_dataset_representation(self, dataset_path, home_dir):
+        """Returns the path to the dataset file to send and its content encoding.
+
+        :param dataset_path: (string) path to the dataset file.
+        :param home_dir: (string) path to the home directory of the process.
+        :return: (tuple) (file path, content encoding or None).
+        """
+        encoding = choose_encoding(self.request.headers.get("Accept-Encoding"))
+        if encoding:
+            compressed_path = await get_compressed_dataset(
+                home_dir, dataset_path, encoding
+            )
+            if os.path.getsize(compressed_path) < os.path.getsize(dataset_path):
+                return compressed_path, encoding
+        return dataset_path, None
+
+    async def write_dataset(self, dataset_path, home_dir):
+        """Writes a dataset, or the requested byte range of it, to the output
+        stream and finishes the request.
+
+        :param dataset_path: (string) path to the dataset file.
+        :param home_dir: (string) path to the home directory of the process,
+        where compressed copies of the dataset are cached.
+        """
+        dataset_path, encoding = await self._get_dataset_representation(
+            dataset_path, home_dir
+        )
+        file_size = os.path.getsize(dataset_path)
+        digest = await IOLoop.current().run_in_executor(
+            None, get_cached_file_hash, dataset_path
+        )
+        self.set_header("Accept-Ranges", "bytes")
+        self.set_header("Content-Type", "application/octet-stream")
+        self.set_header("Vary", "Accept-Encoding")
+        self.set_header(CONTENT_DIGEST_HEADER, digest)
+        if encoding:
+            self.set_header("Content-Encoding", encoding)
+
+        range_header = self.request.headers.get("Range")
+        if range_header:
+            byte_range = get_byte_range(range_header, file_size)
+            if byte_range is None:
+                self.set_status(416)
+                self.set_header("Content-Range", "bytes */{}".format(file_size))
+                await self.finish()
+                return
+            start, end = byte_range
+            self.set_status(206)
+            self.set_header(
+                "Content-Range", "bytes {}-{}/{}".format(start, end - 1, file_size)
+            )
+        else:
+            start, end = 0, file_size
+            self.set_status(200)
+        self.set_header("Content-Length", end - start)
+
+        with open(dataset_path, "rb") as data_file:
+            data_file.seek(start)
+            remaining = end - start
+            while remaining > 0:
+                chunk = data_file.read(min(self.CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                self.write(chunk)
+                await self.flush()
+        await self.finish()
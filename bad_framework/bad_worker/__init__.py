@@ -17,7 +17,7 @@ logging.basicConfig(
 log = logging.getLogger(__name__)
 
 
-def start_bad_worker(hostname, port, debug=False):
+def start_bad_worker(hostname, port, debug=False, slots=None):
 
     package_bin_dir = "{include_dir}/bin".format(include_dir=get_include_dir())
 
@@ -33,9 +33,10 @@ def start_bad_worker(hostname, port, debug=False):
         "script": os.path.join(package_bin_dir, "start_worker.sh"),
         "hostname": hostname,
         "port": port,
+        "slots": slots if slots else "",
     }
     subprocess.call(
-        ["{flag} . {script} {hostname} {port} > /dev/null".format(**params)],
+        ["{flag} . {script} {hostname} {port} {slots} > /dev/null".format(**params)],
         shell=True,
     )
 
@@ -0,0 +1,85 @@
+"""Copyright (C) 2020 Sivam Pasupathipillai <sivam.pasupathipillai@gmail.com>.
+
+All rights reserved.
+
+Long-lived experiment runner process for the BAD worker.
+
+The worker starts this module with the interpreter of a candidate environment,
+see bad_worker.envs. The process reads one JSON-encoded call per line from
+stdin and writes one JSON-encoded reply per line to stdout:
+
+- call: {"function": "module:function", "args": [...], "cpu_limit": seconds}
+- reply: {"result": ...} or {"error": "error message"}
+
+Only functions of the bad_framework package can be called. Anything the
+candidate writes to stdout is redirected to stderr, i.e. to the worker log.
+The optional CPU limit of a call and the memory limit of the process are
+enforced by the kernel, see bad_worker.sandbox.
+"""
+import importlib
+import json
+import logging
+import os
+import sys
+import traceback
+
+from bad_framework.bad_utils.magic import LOG_FORMAT
+from bad_framework.bad_worker.sandbox import set_cpu_limit, set_memory_limit
+
+log = logging.getLogger("bad.server.worker")
+
+
+def get_function(function_name):
+    """Returns a function of the bad_framework package by its name.
+
+    :param function_name: (string) function name, as "module:function".
+    :return: (callable) the function.
+    """
+    module_name, _, name = function_name.partition(":")
+    if not module_name.startswith("bad_framework."):
+        raise ValueError("invalid function: {}".format(function_name))
+    return getattr(importlib.import_module(module_name), name)
+
+
+def ping():
+    """Returns the id of the runner process."""
+    return os.getpid()
+
+
+def serve(call_stream, reply_stream):
+    """Serves calls until the call stream is closed.
+
+    :param call_stream: (file) text stream the calls are read from.
+    :param reply_stream: (file) text stream the replies are written to.
+    """
+    for line in call_stream:
+        try:
+            call = json.loads(line)
+            function = get_function(call["function"])
+            set_cpu_limit(call.get("cpu_limit"))
+            try:
+                reply = {"result": function(*call["args"])}
+            finally:
+                set_cpu_limit(None)
+        except Exception as e:
+            log.error(traceback.format_exc())
+            reply = {"error": str(e) or type(e).__name__}
+        reply_stream.write(json.dumps(reply) + "\n")
+        reply_stream.flush()
+
+
+def main(memory_limit=None):
+    """Serves calls on the standard streams.
+
+    :param memory_limit: (int) address space limit of the process, in bytes,
+    None for no limit.
+    """
+    logging.basicConfig(format=LOG_FORMAT, level="INFO")
+    set_memory_limit(memory_limit)
+    reply_stream = os.fdopen(os.dup(sys.stdout.fileno()), "w")
+    os.dup2(sys.stderr.fileno(), sys.stdout.fileno())
+    serve(sys.stdin, reply_stream)
+
+
+if __name__ == "__main__":
+    main()
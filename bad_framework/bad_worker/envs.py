@@ -0,0 +1,290 @@
+"""Copyright (C) 2020 Sivam Pasupathipillai <sivam.pasupathipillai@gmail.com>.
+
+All rights reserved.
+
+Candidate environments for the BAD worker.
+
+Each distinct requirement set is installed once in its own virtual environment,
+so that the requirements of different candidates do not clash with each other
+or with the worker packages. Experiments run in long-lived runner processes
+inside the environment, see bad_worker.env_runner, so the interpreter startup
+and the imports are paid once per process and not once per experiment.
+"""
+import asyncio
+import glob
+import json
+import logging
+import os
+import shutil
+import signal
+import subprocess
+import sys
+import time
+
+import bad_framework
+from bad_framework.bad_utils import install_requirements
+
+log = logging.getLogger("bad.server.worker")
+
+# Packages imported by the runner processes, installed in each environment
+# before the candidate requirements
+RUNNER_REQUIREMENTS = ["numpy", "scikit-learn"]
+
+
+def get_environment_dir(home_dir, requirements_hash):
+    return "{home_dir}/envs/{requirements_hash}".format(
+        home_dir=home_dir, requirements_hash=requirements_hash
+    )
+
+
+def get_environment_python(env_dir):
+    return os.path.join(env_dir, "bin", "python")
+
+
+def get_runner_bootstrap(memory_limit=None):
+    """Returns the code starting a runner process, see bad_worker.env_runner.
+
+    The bad_framework package is imported from its directory, so that no other
+    package of the worker is importable from the environment.
+
+    :param memory_limit: (int) address space limit of the process, in bytes,
+    None for no limit.
+    :return: (string) Python code, for the -c option of the interpreter.
+    """
+    package_dir = os.path.dirname(bad_framework.__file__)
+    return (
+        "import importlib.util, sys; "
+        "spec = importlib.util.spec_from_file_location("
+        "'bad_framework', {init_path!r}, submodule_search_locations=[{package_dir!r}]); "
+        "sys.modules['bad_framework'] = importlib.util.module_from_spec(spec); "
+        "spec.loader.exec_module(sys.modules['bad_framework']); "
+        "from bad_framework.bad_worker.env_runner import main; main({memory_limit!r})"
+    ).format(
+        init_path=os.path.join(package_dir, "__init__.py"),
+        package_dir=package_dir,
+        memory_limit=memory_limit,
+    )
+
+
+def create_environment(env_dir, requirements, wheelhouse_dir=None):
+    """Creates a virtual environment and installs the requirements in it.
+
+    The environment is isolated from the worker packages: the runner
+    dependencies are installed first, see RUNNER_REQUIREMENTS, then the
+    candidate requirements, which may replace them. Only the bad_framework
+    package is shared with the worker, see get_runner_bootstrap().
+    The environment is marked as ready only when the installation succeeds,
+    so a failed installation is retried from scratch.
+
+    :param env_dir: (string) path to the environment directory.
+    :param requirements: (list[string]) list of pip requirement specifiers.
+    :param wheelhouse_dir: (string) path to the wheelhouse directory, optional.
+    :return: None
+    """
+    ready_path = os.path.join(env_dir, "bad_ready")
+    if os.path.exists(ready_path):
+        os.utime(ready_path)  # Marks the environment as recently used
+        return
+    shutil.rmtree(env_dir, ignore_errors=True)
+    subprocess.check_call([sys.executable, "-m", "venv", env_dir])
+    env_python = get_environment_python(env_dir)
+    install_requirements(RUNNER_REQUIREMENTS, wheelhouse_dir, interpreter=env_python)
+    install_requirements(requirements, wheelhouse_dir, interpreter=env_python)
+    with open(ready_path, "w") as ready_file:
+        ready_file.write("\n".join(sorted(requirements)))
+
+
+def evict_environments(home_dir, max_environments, keep=()):
+    """Removes the least recently used environments, so that at most
+    max_environments environments are left.
+
+    :param home_dir: (string) path to the worker home directory.
+    :param max_environments: (int) maximum number of environments to keep.
+    :param keep: (list[string]) environment directories that must not be removed.
+    :return: (list[string]) removed environment directories.
+    """
+    env_dirs = sorted(
+        glob.glob(get_environment_dir(home_dir, "*")),
+        key=lambda env_dir: get_environment_last_use(env_dir),
+        reverse=True,
+    )
+    evicted_dirs = [
+        env_dir for env_dir in env_dirs[max_environments:] if env_dir not in keep
+    ]
+    for env_dir in evicted_dirs:
+        log.info("Removing unused environment %s", env_dir)
+        shutil.rmtree(env_dir, ignore_errors=True)
+    return evicted_dirs
+
+
+def get_environment_last_use(env_dir):
+    try:
+        return os.path.getmtime(os.path.join(env_dir, "bad_ready"))
+    except OSError:
+        return 0.0
+
+
+class EnvironmentProcess:
+    """Runner process inside a candidate environment.
+
+    The process runs one call at a time, see bad_worker.env_runner.
+    Its address space is limited to memory_limit bytes, if set.
+    """
+
+    def __init__(self, python, memory_limit=None):
+        self.python = python
+        self.memory_limit = memory_limit or None
+        self.last_use = time.monotonic()
+        self._process = None
+        self._broken = False
+
+    async def start(self):
+        self._process = await asyncio.create_subprocess_exec(
+            self.python,
+            "-c",
+            get_runner_bootstrap(self.memory_limit),
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+        )
+
+    def is_alive(self):
+        return (
+            self._process is not None
+            and self._process.returncode is None
+            and not self._broken
+        )
+
+    async def call(self, function_name, *args, cpu_limit=None):
+        """Calls a function in the runner process.
+
+        :param function_name: (string) function name, as "module:function".
+        :param args: JSON-serializable function arguments.
+        :param cpu_limit: (float) CPU time limit of the call, in seconds, optional.
+        Exceeding it kills the runner process.
+        :return: the JSON-decoded function result.
+        """
+        call = {"function": function_name, "args": args, "cpu_limit": cpu_limit}
+        try:
+            self._process.stdin.write((json.dumps(call) + "\n").encode())
+            await self._process.stdin.drain()
+            reply_line = await self._process.stdout.readline()
+        except BaseException:
+            # The reply may still come, the process cannot be reused
+            self._broken = True
+            self.kill()
+            raise
+        finally:
+            self.last_use = time.monotonic()
+        if not reply_line:
+            self._broken = True
+            returncode = await self._process.wait()
+            if returncode == -signal.SIGXCPU:
+                raise RuntimeError("runner process exceeded the CPU time limit")
+            raise RuntimeError("runner process exited with code {}".format(returncode))
+        reply = json.loads(reply_line)
+        if "error" in reply:
+            raise RuntimeError(reply["error"])
+        return reply["result"]
+
+    def kill(self):
+        try:
+            self._process.kill()
+        except ProcessLookupError:
+            pass
+
+    async def stop(self):
+        if self.is_alive():
+            self._process.stdin.close()
+        await self._process.wait()
+
+
+class EnvironmentPool:
+    """Pool of runner processes, shared by all candidate environments.
+
+    At most max_processes runner processes are alive at any time, whatever
+    their environment, so max_processes caps the number of experiments the
+    worker runs concurrently. Processes are started on demand and reused by
+    later calls in the same environment. When the pool is full, an idle process
+    of another environment is stopped to make room. Processes idle for longer
+    than idle_timeout seconds are stopped by evict_idle(). The address space
+    of each process is limited to memory_limit bytes, if set.
+    """
+
+    def __init__(self, max_processes, idle_timeout=600, memory_limit=None):
+        self._max_processes = max_processes
+        self._idle_timeout = idle_timeout
+        self._memory_limit = memory_limit
+        self._idle = []  # idle processes, least recently used first
+        self._busy = set()
+        self._released = None  # asyncio.Condition, created on the IOLoop
+
+    def get_environments(self):
+        """Returns the interpreters of the environments with live processes."""
+        return {process.python for process in [*self._idle, *self._busy]}
+
+    def _pop_idle(self, python=None):
+        for process in self._idle:
+            if python is None or process.python == python:
+                self._idle.remove(process)
+                return process
+        return None
+
+    async def _acquire(self, python):
+        if self._released is None:
+            self._released = asyncio.Condition()
+        async with self._released:
+            while True:
+                process = self._pop_idle(python)
+                if process:
+                    break
+                if len(self._idle) + len(self._busy) >= self._max_processes:
+                    evicted_process = self._pop_idle()
+                    if evicted_process is None:
+                        await self._released.wait()
+                        continue
+                    log.info("Stopping idle runner process in %s", python)
+                    await evicted_process.stop()
+                process = EnvironmentProcess(python, self._memory_limit)
+                await process.start()
+                log.info("Started runner process in %s", python)
+                break
+            self._busy.add(process)
+            return process
+
+    async def _release(self, process):
+        async with self._released:
+            self._busy.discard(process)
+            if process.is_alive():
+                self._idle.append(process)
+            self._released.notify()
+
+    async def call(self, python, function_name, *args, cpu_limit=None):
+        """Calls a function in a runner process of an environment.
+
+        :param python: (string) path to the environment interpreter.
+        :param function_name: (string) function name, as "module:function".
+        :param args: JSON-serializable function arguments.
+        :param cpu_limit: (float) CPU time limit of the call, in seconds, optional.
+        :return: the JSON-decoded function result.
+        """
+        process = await self._acquire(python)
+        try:
+            return await process.call(function_name, *args, cpu_limit=cpu_limit)
+        finally:
+            await self._release(process)
+
+    async def evict_idle(self):
+        """Stops the processes that have been idle for longer than idle_timeout."""
+        expired_ts = time.monotonic() - self._idle_timeout
+        expired_processes = [p for p in self._idle if p.last_use < expired_ts]
+        for process in expired_processes:
+            self._idle.remove(process)
+            log.info("Stopping idle runner process in %s", process.python)
+            await process.stop()
+
+    async def close(self):
+        idle_processes, self._idle = self._idle, []
+        for process in idle_processes:
+            await process.stop()
+        for process in self._busy:
+            process.kill()
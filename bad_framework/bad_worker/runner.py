@@ -0,0 +1,414 @@
+"""Copyright (C) 2020 Sivam Pasupathipillai <sivam.pasupathipillai@gmail.com>.
+
+All rights reserved.
+
+Experiment execution for the BAD worker.
+
+The functions in this module run inside the worker runner processes, see
+bad_worker.envs, hence they must only receive and return JSON-serializable
+objects.
+"""
+import contextlib
+import importlib.util
+import json
+import logging
+import os
+import time
+
+from bad_framework.bad_utils import load_cached_data_matrix
+from bad_framework.bad_utils.adt import conditional_casting
+from bad_framework.bad_utils.files import get_candidate_name, get_file_hash
+from bad_framework.bad_utils.lazy import lazy_import
+from bad_framework.bad_worker.sandbox import get_peak_rss, measure_usage, reset_peak_rss
+
+log = logging.getLogger("bad.server.worker")
+
+# Only the runner processes need them, the worker process imports this module
+# for the path helpers
+np = lazy_import("numpy")
+sklearn_metrics = lazy_import("sklearn.metrics")
+
+# Candidate classes loaded by this process, (suite id, file digest) -> class
+_candidate_classes = {}
+
+ROC_POINTS = 200  # maximum number of ROC curve points in the metrics file
+
+
+def get_experiment_dir(home_dir, suite_id, experiment_id):
+    return "{home_dir}/{suite_id}/{experiment_id}".format(
+        home_dir=home_dir,
+        suite_id=suite_id,
+        experiment_id=experiment_id,
+    )
+
+
+def get_data_path(home_dir, data_name):
+    return "{home_dir}/datasets/{data_name}.arff".format(
+        home_dir=home_dir,
+        data_name=data_name,
+    )
+
+
+def get_data_cache_dir(home_dir):
+    return "{home_dir}/datasets/cache".format(home_dir=home_dir)
+
+
+def get_candidate_path(home_dir, suite_id):
+    return "{home_dir}/{suite_id}/candidate.py".format(
+        home_dir=home_dir, suite_id=suite_id
+    )
+
+
+def import_candidate_module(candidate_path):
+    spec = importlib.util.spec_from_file_location("bad_candidate", candidate_path)
+    bad_candidate = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(bad_candidate)
+    return bad_candidate
+
+
+def load_candidate_class(candidate_path, suite_id, candidate_digest=None):
+    """Returns the candidate class defined in the candidate module.
+
+    Candidate classes are cached in the current process by suite id and content
+    digest of the candidate module, so the module is only executed once.
+    When the candidate module of a suite changes, the stale class is evicted.
+
+    :param candidate_path: (string) path to the candidate module.
+    :param suite_id: (string) suite id.
+    :param candidate_digest: (string) content digest of the candidate module,
+    computed from the file when None.
+    :return: (type) the candidate class.
+    """
+    candidate_digest = candidate_digest or get_file_hash(candidate_path)
+    cache_key = (suite_id, candidate_digest)
+    candidate_class = _candidate_classes.get(cache_key)
+    if candidate_class is None:
+        for stale_key in [key for key in _candidate_classes if key[0] == suite_id]:
+            del _candidate_classes[stale_key]
+        candidate_name = get_candidate_name(candidate_path)
+        log.info("Loading candidate %s from candidate module...", candidate_name)
+        bad_candidate = import_candidate_module(candidate_path)
+        candidate_class = getattr(bad_candidate, candidate_name)
+        _candidate_classes[cache_key] = candidate_class
+    return candidate_class
+
+
+@contextlib.contextmanager
+def measure_time(timings, phase):
+    """Stores the time spent in a block in timings, as <phase>_time_ns,
+    in nanoseconds. Nothing is stored if the block raises.
+
+    :param timings: (dict) phase timings of the experiment.
+    :param phase: (string) experiment phase name, e.g. "fit".
+    """
+    start_time = time.perf_counter_ns()
+    yield
+    timings[phase + "_time_ns"] = time.perf_counter_ns() - start_time
+
+
+def get_metrics(labels, scores):
+    return {
+        "roc_auc": sklearn_metrics.roc_auc_score(y_score=scores, y_true=labels),
+        "average_precision": sklearn_metrics.average_precision_score(
+            y_score=scores, y_true=labels
+        ),
+    }
+
+
+def get_roc_curve(labels, scores, max_points=ROC_POINTS):
+    """Returns the ROC curve of the scores, downsampled to at most max_points
+    points evenly spaced along the curve. The master plots the curve on demand,
+    see bad_master.plots.
+
+    :param labels: (numpy.ndarray) ground truth labels.
+    :param scores: (numpy.ndarray) outlier scores.
+    :param max_points: (int) maximum number of points, at least 2.
+    :return: (dict) "fpr" and "tpr" lists, from (0, 0) to (1, 1).
+    """
+    fpr, tpr, _ = sklearn_metrics.roc_curve(y_score=scores, y_true=labels)
+    if len(fpr) > max_points:
+        # fpr + tpr strictly increases along the curve
+        curve_position = fpr + tpr
+        indexes = np.searchsorted(
+            curve_position, np.linspace(0, curve_position[-1], max_points - 1)
+        )
+        indexes = np.unique(np.append(indexes, len(fpr) - 1))
+        fpr, tpr = fpr[indexes], tpr[indexes]
+    return {"fpr": fpr.tolist(), "tpr": tpr.tolist()}
+
+
+def generate_metrics_file(
+    experiment_dir, experiment_id, metrics, usage=None, timings=None
+):
+    metrics_path = os.path.join(experiment_dir, "metrics.json")
+    if not os.path.exists(experiment_dir):
+        os.makedirs(experiment_dir)
+
+    metrics = {
+        "experiment_id": experiment_id,
+        **metrics,
+        "resources": usage or {},
+        "timings": timings or {},
+    }
+    pretty_json = json.dumps(metrics, indent=2)
+    with open(metrics_path, "w") as metrics_file:
+        metrics_file.write(pretty_json)
+    return metrics_path
+
+
+def get_training_matrix(feature_matrix, parameters):
+    """Subsamples the feature matrix to obtain the training set.
+
+    :param feature_matrix: (numpy.ndarray) N x D feature matrix.
+    :param parameters: (dict) experiment parameters, including seed and trainset_size.
+    :return: (numpy.ndarray) training matrix.
+    """
+    np.random.seed(int(parameters["seed"]))
+    num_rows = feature_matrix.shape[0]
+    trainset_size = int(num_rows * float(parameters["trainset_size"]))
+    training_indexes = np.random.choice(num_rows, size=trainset_size, replace=False)
+    return feature_matrix[training_indexes, :]
+
+
+def generate_scores(candidate, data_matrix, parameters, usage, timings):
+    feature_matrix = data_matrix[:, 2:]
+    training_matrix = get_training_matrix(feature_matrix, parameters)
+
+    with measure_time(timings, "fit"), measure_usage(usage, "fit"):
+        candidate = candidate.fit(training_matrix)
+    with measure_time(timings, "score"), measure_usage(usage, "score"):
+        if hasattr(candidate, "score_batch"):
+            scores = candidate.score_batch(feature_matrix)
+        else:
+            # Fall back to row-wise scoring for candidates without batch support
+            scores = np.apply_along_axis(candidate.score, axis=1, arr=feature_matrix)
+    return scores
+
+
+def generate_sweep_scores(candidate, data_matrix, parameters, values, usage, timings):
+    """Fits the candidate once and generates the scores for each value
+    of the candidate sweep parameter.
+
+    :param candidate: (object) candidate initialized with the largest value.
+    :param data_matrix: (numpy.ndarray) data matrix.
+    :param parameters: (dict) experiment parameters, including seed and trainset_size.
+    :param values: (list) values of the sweep parameter.
+    :param usage: (dict) resource usage of the fit and score phases, filled in
+    by this function, see bad_worker.sandbox.measure_usage().
+    :param timings: (dict) timings of the fit and score phases, filled in
+    by this function, see measure_time().
+    :return: (list[numpy.ndarray]) scores for each value.
+    """
+    feature_matrix = data_matrix[:, 2:]
+    training_matrix = get_training_matrix(feature_matrix, parameters)
+
+    with measure_time(timings, "fit"), measure_usage(usage, "fit"):
+        candidate = candidate.fit(training_matrix)
+    with measure_time(timings, "score"), measure_usage(usage, "score"):
+        return candidate.score_sweep(feature_matrix, values)
+
+
+def get_sweep_values(candidate_class, experiments):
+    """Returns the values of the candidate sweep parameter for a group of
+    experiments, or None if the experiments cannot run as a sweep.
+
+    Experiments run as a sweep when the candidate supports it and their
+    parameters only differ in the sweep parameter.
+
+    :param candidate_class: (type) the candidate class.
+    :param experiments: (list[tuple]) list of (experiment id, parameters) tuples.
+    :return: (list) sweep parameter values, one for each experiment, or None.
+    """
+    sweep_parameter = getattr(candidate_class, "sweep_parameter", None)
+    if len(experiments) < 2 or not sweep_parameter:
+        return None
+    if not hasattr(candidate_class, "score_sweep"):
+        return None
+
+    def fixed_parameters(parameters):
+        return {k: v for k, v in parameters.items() if k != sweep_parameter}
+
+    _, first_parameters = experiments[0]
+    for _, parameters in experiments:
+        if sweep_parameter not in parameters:
+            return None
+        if fixed_parameters(parameters) != fixed_parameters(first_parameters):
+            return None
+    return [
+        conditional_casting(parameters[sweep_parameter]) for _, parameters in experiments
+    ]
+
+
+def generate_result_files(
+    experiment_dir, experiment_id, labels, scores, usage=None, timings=None, sweep_size=1
+):
+    timings = dict(timings or {})
+    log.info("Computing metrics...")
+    with measure_time(timings, "metrics"):
+        metrics = get_metrics(labels, scores)
+    # Number of experiments sharing the fit and score timings and resources
+    metrics["sweep_size"] = sweep_size
+    log.info("Computing ROC curve...")
+    with measure_time(timings, "roc"):
+        metrics["roc_curve"] = get_roc_curve(labels, scores)
+    log.info("Generating metrics file...")
+    metrics_path = generate_metrics_file(
+        experiment_dir=experiment_dir,
+        experiment_id=experiment_id,
+        metrics=metrics,
+        usage=usage,
+        timings=timings,
+    )
+    return {
+        "experiment_id": experiment_id,
+        "metrics_path": metrics_path,
+    }
+
+
+def get_elapsed_microseconds(start_time):
+    return int((time.perf_counter() - start_time) * 1e6)
+
+
+def run_sweep(
+    home_dir, suite_id, candidate_class, data_matrix, experiments, values, timings
+):
+    """Runs a group of experiments as a parameter sweep, with a single fit.
+
+    The execution time of each experiment is its share of the time spent fitting
+    and scoring, split evenly across the group, plus the time spent generating
+    its own result files. The resource usage and timings of the single fit and
+    scoring are reported for each experiment, together with the sweep size,
+    i.e. the number of experiments sharing them.
+
+    :param home_dir: (string) path to worker home directory.
+    :param suite_id: (string) suite id.
+    :param candidate_class: (type) the candidate class.
+    :param data_matrix: (numpy.ndarray) data matrix.
+    :param experiments: (list[tuple]) list of (experiment id, parameters) tuples.
+    :param values: (list) sweep parameter values, see get_sweep_values().
+    :param timings: (dict) timings of the phases shared by the group,
+    see measure_time().
+    :return: (list[dict]) one result for each experiment, see run_experiments().
+    """
+    log.info(">>> Running sweep of %d experiments", len(experiments))
+    start_time = time.perf_counter()
+    reset_peak_rss()
+    usage = {}
+    timings = dict(timings)
+    _, parameters = experiments[values.index(max(values))]
+    candidate = candidate_class(**parameters)
+    sweep_scores = generate_sweep_scores(
+        candidate, data_matrix, parameters, values, usage, timings
+    )
+    usage["peak_rss"] = get_peak_rss()
+    shared_time = get_elapsed_microseconds(start_time) // len(experiments)
+    log.info("Sweep completed.")
+
+    labels = data_matrix[:, 1]
+    results = []
+    for (experiment_id, _), scores in zip(experiments, sweep_scores):
+        try:
+            start_time = time.perf_counter()
+            experiment_dir = get_experiment_dir(home_dir, suite_id, experiment_id)
+            result = generate_result_files(
+                experiment_dir,
+                experiment_id,
+                labels,
+                scores,
+                usage,
+                timings,
+                sweep_size=len(experiments),
+            )
+            result["execution_time"] = shared_time + get_elapsed_microseconds(start_time)
+            results.append(result)
+        except Exception as e:
+            log.error("Experiment runtime error: %s", e)
+            results.append(
+                {"experiment_id": experiment_id, "error": str(e) or type(e).__name__}
+            )
+    return results
+
+
+def run_experiments(
+    home_dir,
+    suite_id,
+    candidate_digest,
+    data_name,
+    data_digest,
+    experiments,
+):
+    """Runs a group of experiments on the same data set and writes the result files
+    in each experiment directory.
+
+    When the candidate supports parameter sweeps, experiments that only differ
+    in the sweep parameter share a single fit, see run_sweep().
+    Otherwise, or if the sweep fails, experiments run one after the other.
+
+    :param home_dir: (string) path to worker home directory.
+    :param suite_id: (string) suite id.
+    :param candidate_digest: (string) content digest of the candidate module,
+    None if unknown.
+    :param data_name: (string) name of the data set.
+    :param data_digest: (string) content digest of the data set, None if unknown.
+    :param experiments: (list[tuple]) list of (experiment id, parameters) tuples.
+    :return: (list[dict]) one result for each experiment, with the path to the
+    metrics file and the execution time in microseconds, or the error message
+    if the experiment failed. The metrics file includes the ROC curve,
+    resource usage and phase timings of the experiment, see
+    bad_utils.magic.RESOURCE_USAGE_FIELDS and bad_utils.magic.TIMING_FIELDS,
+    and the sweep size, see run_sweep().
+    """
+    candidate_path = get_candidate_path(home_dir, suite_id)
+    data_path = get_data_path(home_dir, data_name)
+    candidate_class = load_candidate_class(candidate_path, suite_id, candidate_digest)
+
+    log.info("Loading data matrix from %s", data_path)
+    timings = {}  # timings of the phases shared by the group
+    with measure_time(timings, "load"):
+        data_matrix = load_cached_data_matrix(
+            data_path, get_data_cache_dir(home_dir), data_digest
+        )
+    labels = data_matrix[:, 1]
+
+    sweep_values = get_sweep_values(candidate_class, experiments)
+    if sweep_values:
+        try:
+            return run_sweep(
+                home_dir,
+                suite_id,
+                candidate_class,
+                data_matrix,
+                experiments,
+                sweep_values,
+                timings,
+            )
+        except Exception as e:
+            # Run experiments one by one, so that only the invalid ones fail
+            log.error("Sweep runtime error: %s", e)
+
+    results = []
+    for experiment_id, parameters in experiments:
+        try:
+            log.info(">>> Running experiment %s", experiment_id)
+            start_time = time.perf_counter()
+            reset_peak_rss()
+            usage = {}
+            experiment_timings = dict(timings)
+            candidate = candidate_class(**parameters)
+            scores = generate_scores(
+                candidate, data_matrix, parameters, usage, experiment_timings
+            )
+            usage["peak_rss"] = get_peak_rss()
+            log.info("Experiment completed.")
+            experiment_dir = get_experiment_dir(home_dir, suite_id, experiment_id)
+            result = generate_result_files(
+                experiment_dir, experiment_id, labels, scores, usage, experiment_timings
+            )
+            result["execution_time"] = get_elapsed_microseconds(start_time)
+            results.append(result)
+        except Exception as e:
+            log.error("Experiment runtime error: %s", e)
+            results.append(
+                {"experiment_id": experiment_id, "error": str(e) or type(e).__name__}
+            )
+    return results
@@ -0,0 +1,107 @@
+"""Copyright (C) 2020 Sivam Pasupathipillai <sivam.pasupathipillai@gmail.com>.
+
+All rights reserved.
+
+Resource limits and accounting for the BAD worker runner processes.
+
+Limits are enforced by the kernel on the runner process, see bad_worker.env_runner,
+so an experiment exceeding them can only take down its own runner process:
+- memory limit: allocations beyond the limit fail, i.e. raise MemoryError;
+- CPU limit: the process is killed with SIGXCPU once the limit is exceeded.
+"""
+import contextlib
+import math
+import resource
+import sys
+import time
+
+
+def set_memory_limit(memory_limit):
+    """Limits the address space of the current process.
+
+    :param memory_limit: (int) limit, in bytes, None or 0 for no limit.
+    :return: None
+    """
+    _, hard_limit = resource.getrlimit(resource.RLIMIT_AS)
+    soft_limit = memory_limit or hard_limit
+    if hard_limit != resource.RLIM_INFINITY:
+        soft_limit = min(soft_limit, hard_limit)
+    resource.setrlimit(resource.RLIMIT_AS, (soft_limit, hard_limit))
+
+
+def get_cpu_time():
+    """Returns the CPU time used by the current process, in seconds."""
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+
+def set_cpu_limit(cpu_limit):
+    """Limits the CPU time the current process can use from now on.
+
+    The kernel limit is on the total CPU time of the process, so the limit is
+    added to the CPU time used so far, and long-lived processes can set it
+    again before each call.
+
+    :param cpu_limit: (float) limit, in seconds, None or 0 for no limit.
+    :return: None
+    """
+    _, hard_limit = resource.getrlimit(resource.RLIMIT_CPU)
+    soft_limit = hard_limit
+    if cpu_limit:
+        soft_limit = int(math.ceil(get_cpu_time() + cpu_limit))
+        if hard_limit != resource.RLIM_INFINITY:
+            soft_limit = min(soft_limit, hard_limit)
+    resource.setrlimit(resource.RLIMIT_CPU, (soft_limit, hard_limit))
+
+
+def reset_peak_rss():
+    """Resets the peak resident set size of the current process to its current
+    resident set size, where supported, i.e. on Linux."""
+    try:
+        with open("/proc/self/clear_refs", "w") as clear_refs_file:
+            clear_refs_file.write("5")
+    except OSError:
+        pass
+
+
+def get_peak_rss():
+    """Returns the peak resident set size of the current process, since the
+    last reset_peak_rss() where supported, since the process start otherwise.
+
+    :return: (int) peak resident set size, in bytes.
+    """
+    try:
+        with open("/proc/self/status") as status_file:
+            for line in status_file:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak_rss if sys.platform == "darwin" else peak_rss * 1024
+
+
+@contextlib.contextmanager
+def measure_usage(usage, phase):
+    """Measures the resources used by the current process in a block.
+
+    The wall, user CPU and system CPU time spent in the block are stored in
+    usage as <phase>_wall_time, <phase>_user_time and <phase>_sys_time, in seconds.
+    Nothing is stored if the block raises.
+
+    :param usage: (dict) resource usage of the experiment.
+    :param phase: (string) experiment phase name, e.g. "fit".
+
+    >>> usage = {}
+    >>> with measure_usage(usage, "fit"):
+    ...     pass
+    >>> sorted(usage)
+    ['fit_sys_time', 'fit_user_time', 'fit_wall_time']
+    """
+    start_wall_time = time.perf_counter()
+    start_usage = resource.getrusage(resource.RUSAGE_SELF)
+    yield
+    end_usage = resource.getrusage(resource.RUSAGE_SELF)
+    usage[phase + "_wall_time"] = time.perf_counter() - start_wall_time
+    usage[phase + "_user_time"] = end_usage.ru_utime - start_usage.ru_utime
+    usage[phase + "_sys_time"] = end_usage.ru_stime - start_usage.ru_stime
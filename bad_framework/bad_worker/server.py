@@ -3,13 +3,22 @@
 All rights reserved.
 """
 import logging
+import os
 
 from tornado.options import define, options
 import tornado.httpserver
 import tornado.ioloop
 import tornado.web
 
-from .views import IndexHandler, SetupHandler, RunHandler
+from .envs import EnvironmentPool
+from .views import (
+    DatasetHandler,
+    IndexHandler,
+    RunHandler,
+    SetupHandler,
+    StopHandler,
+    send_heartbeats,
+)
 
 # Define tornado options
 define(
@@ -19,6 +28,41 @@ define(
 )
 define("worker_port", default=3291, help="Port for the worker process.")
 define("worker_debug", default=False, help="Activate development mode.")
+define(
+    "worker_slots",
+    default=os.cpu_count() or 1,
+    help="Number of experiments the worker runs concurrently.",
+)
+define(
+    "worker_wheelhouse",
+    default="",
+    help="Directory of wheels for installing candidate requirements offline.",
+)
+define(
+    "worker_max_environments",
+    default=8,
+    help="Number of candidate environments kept on the worker.",
+)
+define(
+    "worker_idle_timeout",
+    default=600,
+    help="Seconds after which an idle runner process is stopped.",
+)
+define(
+    "worker_heartbeat_interval",
+    default=5,
+    help="Seconds between the heartbeats sent to the master.",
+)
+define(
+    "worker_memory_limit",
+    default=0,
+    help="Address space limit of each runner process, in MB. 0 for no limit.",
+)
+define(
+    "worker_cpu_limit",
+    default=0,
+    help="CPU time limit of each experiment, in seconds. 0 for no limit.",
+)
 
 # Define our own logging configuration
 logging.basicConfig(
@@ -30,25 +74,67 @@ log = logging.getLogger("bad.server.worker")
 
 
 class BADWorkerServer:
-    def __init__(self, port, home_dir, debug):
+    def __init__(
+        self,
+        port,
+        home_dir,
+        debug,
+        slots,
+        wheelhouse_dir=None,
+        max_environments=8,
+        idle_timeout=600,
+        heartbeat_interval=5,
+        memory_limit=0,
+        cpu_limit=0,
+    ):
         self._port = int(port)
+        self._slots = int(slots)
+        self._heartbeat_interval = float(heartbeat_interval)
+        # Runner processes of all environments count against the worker slots
+        self._environment_pool = EnvironmentPool(
+            max_processes=self._slots,
+            idle_timeout=idle_timeout,
+            memory_limit=int(float(memory_limit) * 1048576),
+        )
         self._app = tornado.web.Application(
             [
                 (r"/", IndexHandler),
                 (r"/index.html", IndexHandler),
+                (r"/dataset/(?P<dataset_name>[a-z0-9-]+)/", DatasetHandler),
                 (r"/setup/", SetupHandler),
                 (r"/run/", RunHandler),
+                (r"/stop/", StopHandler),
             ],
+            candidate_digests={},
+            cpu_limit=float(cpu_limit),
+            dataset_digests={},
+            dataset_downloads={},
             debug=debug,
+            environment_pool=self._environment_pool,
+            masters={},
+            max_environments=int(max_environments),
+            runs={},
+            suite_environments={},
+            wheelhouse_dir=wheelhouse_dir or None,
             worker_port=port,
             worker_home=home_dir,
+            worker_slots=self._slots,
         )
         self._server = tornado.httpserver.HTTPServer(self._app, max_buffer_size=524288000)
 
     def start(self):
-        log.info(">>> Starting BAD worker on port %d", self._port)
+        log.info(
+            ">>> Starting BAD worker on port %d with %d slots", self._port, self._slots
+        )
         self._server.bind(self._port)
         self._server.start(1)
+        tornado.ioloop.PeriodicCallback(
+            self._environment_pool.evict_idle, 60 * 1000
+        ).start()
+        tornado.ioloop.PeriodicCallback(
+            lambda: send_heartbeats(self._app.settings["masters"]),
+            self._heartbeat_interval * 1000,
+        ).start()
         tornado.ioloop.IOLoop.current().start()
 
 
@@ -56,7 +142,16 @@ def main():
     tornado.options.parse_command_line()
 
     bad_worker = BADWorkerServer(
-        options.worker_port, options.worker_home, options.worker_debug
+        options.worker_port,
+        options.worker_home,
+        options.worker_debug,
+        options.worker_slots,
+        options.worker_wheelhouse,
+        options.worker_max_environments,
+        options.worker_idle_timeout,
+        options.worker_heartbeat_interval,
+        options.worker_memory_limit,
+        options.worker_cpu_limit,
     )
     bad_worker.start()
 
@@ -2,35 +2,68 @@
 
 All rights reserved.
 """
+import asyncio
+import glob
 import json
-import importlib.util
 import logging
 import os
+import sys
 import traceback
 
-from sklearn.metrics import (
-    average_precision_score,
-    roc_auc_score,
-    roc_curve,
-)
-import jinja2 as j2
-import matplotlib.pyplot as plt
-import numpy as np
+from tornado.ioloop import IOLoop
+from tornado.iostream import StreamClosedError
 import tornado.web
 
-from bad_framework.bad_utils import (
-    install_requirements,
-    load_parameter_string,
-    load_data_matrix,
-)
+from bad_framework.bad_utils import get_requirements_hash, load_parameter_string
 from bad_framework.bad_utils.adt import ExperimentStatus
-from bad_framework.bad_utils.files import get_candidate_name
+from bad_framework.bad_utils.files import get_file_hash
+from bad_framework.bad_utils.lazy import lazy_import
 from bad_framework.bad_utils.magic import LOG_FORMAT
 from bad_framework.bad_utils.network import AsyncHTTPSessionManager
+from bad_framework.bad_utils.transfer import DatasetTransferMixin
+from bad_framework.bad_worker.envs import (
+    create_environment,
+    evict_environments,
+    get_environment_dir,
+    get_environment_python,
+)
+from bad_framework.bad_worker.runner import (
+    get_candidate_path,
+    get_data_cache_dir,
+    get_data_path,
+)
 
 logging.basicConfig(format=LOG_FORMAT, level="INFO")
 log = logging.getLogger("bad.server.worker")
 
+j2 = lazy_import("jinja2")
+
+
+def get_held_datasets(base_path):
+    """Returns the names of the data sets downloaded to the worker.
+
+    :param base_path: (str) path to worker home directory
+    :return: (list[string]) list of data set names.
+    """
+    return sorted(
+        os.path.splitext(os.path.basename(data_path))[0]
+        for data_path in glob.glob(get_data_path(base_path, "*"))
+    )
+
+
+async def send_heartbeats(masters):
+    """Tells the masters the worker was set up by that it is alive.
+
+    :param masters: (dict) master address -> id of the worker on the master.
+    """
+    for master_address, worker_id in list(masters.items()):
+        heartbeat_url = "worker/{worker_id}/heartbeat/".format(worker_id=worker_id)
+        try:
+            master_session = AsyncHTTPSessionManager.get_session(master_address)
+            await master_session.post_json(url=heartbeat_url, data={})
+        except Exception as e:
+            log.warning("Heartbeat to master %s failed: %s", master_address, e)
+
 
 class BaseWorkerHandler(tornado.web.RequestHandler):
     def write_error(self, status_code, **kwargs):
@@ -44,6 +77,105 @@ class BaseWorkerHandler(tornado.web.RequestHandler):
         self.flush()
         self.finish()
 
+    def _reserve_downloads(self, base_path, datasets):
+        """Registers the downloads of the missing data sets, so that peers
+        requesting them wait for the download, see DatasetHandler, instead of
+        falling back to the master. Setups register them as soon as they start.
+
+        :param base_path: (str) path to worker home directory
+        :param datasets: (list[string]) list of data set names.
+        :return: (list[string]) data sets the caller must download.
+        """
+        dataset_downloads = self.application.settings["dataset_downloads"]
+        reserved_datasets = []
+        for dataset in datasets:
+            if dataset in dataset_downloads:
+                continue  # Downloaded by another request
+            if not os.path.isfile(get_data_path(base_path, dataset)):
+                dataset_downloads[dataset] = asyncio.get_event_loop().create_future()
+                reserved_datasets.append(dataset)
+        return reserved_datasets
+
+    def _release_downloads(self, datasets):
+        """Wakes up the peers waiting for data set downloads, whether the
+        downloads succeeded or not."""
+        dataset_downloads = self.application.settings["dataset_downloads"]
+        for dataset in datasets:
+            download = dataset_downloads.pop(dataset, None)
+            if download is not None and not download.done():
+                download.set_result(None)
+
+    async def _download_dataset(self, master_session, peer_address, dataset, path):
+        """Downloads a data set from the peer worker, if any, or from the master.
+
+        Falls back to the master when the download from the peer fails.
+        """
+        data_url = "dataset/{dataset_name}/".format(dataset_name=dataset)
+        if peer_address:
+            log.info("Downloading dataset %s from peer %s", dataset, peer_address)
+            try:
+                peer_session = AsyncHTTPSessionManager.get_session(peer_address)
+                await peer_session.download_file(data_url, path)
+                return
+            except Exception as e:
+                log.warning("Cannot download dataset %s from peer: %s", dataset, e)
+        await master_session.download_file(data_url, path)
+
+    async def _download_datasets(
+        self, master_session, base_path, datasets, reserved_datasets, peer_addresses
+    ):
+        """Downloads the data sets required for suite execution.
+
+        Only downloads the data sets reserved by the caller, see
+        _reserve_downloads(), and waits for the other downloads in progress.
+        Each data set is downloaded from the peer worker assigned by the master,
+        if any, so that the master does not send each data set to every worker.
+
+        :param master_session: (bad_utils.network.SessionManager) master session manager
+        :param base_path: (str) path to worker home directory
+        :param datasets: (list[string]) list of data set names.
+        :param reserved_datasets: (list[string]) list of data set names to download.
+        :param peer_addresses: (dict) data set name -> address of the peer
+        worker to download it from, missing to download it from the master.
+        :return: None
+        """
+        log.info("Downloading datasets: %r", reserved_datasets)
+        dataset_downloads = self.application.settings["dataset_downloads"]
+        for dataset in datasets:
+            if dataset in reserved_datasets:
+                await self._download_dataset(
+                    master_session,
+                    peer_addresses.get(dataset),
+                    dataset,
+                    get_data_path(base_path, dataset),
+                )
+                self._release_downloads([dataset])
+            elif dataset in dataset_downloads:
+                await dataset_downloads[dataset]
+
+    async def _cache_datasets(self, base_path, datasets):
+        """Converts the data sets to their binary cache format.
+
+        Conversion runs in a worker runner process, and only once per data set
+        content. Records the content digest of each data set for later runs.
+
+        :param base_path: (str) path to worker home directory
+        :param datasets: (list[string]) list of data set names to convert.
+        :return: None
+        """
+        dataset_digests = self.application.settings["dataset_digests"]
+        for dataset in datasets:
+            if dataset not in dataset_digests:
+                log.info("Caching dataset %s...", dataset)
+                dataset_digests[dataset] = await self.application.settings[
+                    "environment_pool"
+                ].call(
+                    sys.executable,
+                    "bad_framework.bad_utils:cache_data_matrix",
+                    get_data_path(base_path, dataset),
+                    get_data_cache_dir(base_path),
+                )
+
 
 class IndexHandler(BaseWorkerHandler):
     def get(self):
@@ -71,14 +203,36 @@ class SetupHandler(BaseWorkerHandler):
         master_address = message["master_address"]
         requirements = message["requirements"]
         suite_id = message["suite_id"]
+        if "worker_id" in message:
+            self.application.settings["masters"][master_address] = message["worker_id"]
 
         base_path = self.get_wd()
-        master_session = AsyncHTTPSessionManager(master_address)
-        await self._download_candidate_files(
-            master_session, candidate_id, suite_id, base_path
-        )
-        install_requirements(requirements)
-        await self._download_datasets(master_session, base_path, datasets)
+        reserved_datasets = self._reserve_downloads(base_path, datasets)
+        try:
+            master_session = AsyncHTTPSessionManager.get_session(master_address)
+            await master_session.check_health()
+            await self._download_candidate_files(
+                master_session, candidate_id, suite_id, base_path
+            )
+            # Changes the candidate cache key if the candidate file has changed
+            self.application.settings["candidate_digests"][suite_id] = get_file_hash(
+                get_candidate_path(base_path, suite_id)
+            )
+            # Downloads datasets while the requirements are installed, so that
+            # peers waiting for them are served as soon as possible
+            await asyncio.gather(
+                self._install_requirements(base_path, suite_id, requirements),
+                self._download_datasets(
+                    master_session,
+                    base_path,
+                    datasets,
+                    reserved_datasets,
+                    message.get("dataset_sources", {}),
+                ),
+            )
+        finally:
+            self._release_downloads(reserved_datasets)
+        await self._cache_datasets(base_path, datasets)
         log.info("<<< Done.")
 
     @classmethod
@@ -96,224 +250,260 @@ class SetupHandler(BaseWorkerHandler):
         log.info("Downloading candidate file...")
         await master_session.download_file(
             url="candidate/{candidate_id}/".format(candidate_id=candidate_id),
-            path="{home_dir}/{suite_id}/candidate.py".format(
-                home_dir=base_path, suite_id=suite_id
-            ),
+            path=get_candidate_path(base_path, suite_id),
         )
 
-    @classmethod
-    async def _download_datasets(cls, master_session, base_path, datasets):
-        """Downloads the data sets required for suite execution.
+    async def _install_requirements(self, base_path, suite_id, requirements):
+        """Installs the candidate requirements in the environment of their
+        requirement set, unless the environment already exists.
 
-        Only downloads data sets that have not been previously downloaded.
+        Environments are created under the worker home directory, keyed by the
+        hash of the requirement set, see get_requirements_hash(). Creation runs
+        in a separate thread, so it does not block the IOLoop, and only one
+        environment is created at a time. Only the max_environments most recently
+        used environments are kept. Suites without requirements run in the
+        worker interpreter.
 
-        :param master_session: (bad_utils.network.SessionManager) master session manager
-        :param datasets: (list[string]) list of data set names to download.
+        :param base_path: (str) path to worker home directory
+        :param suite_id: (str) suite id
+        :param requirements: (list[string]) list of pip requirement specifiers.
         :return: None
         """
-        log.info("Downloading datasets: %r", datasets)
-        data_urls = [
-            "dataset/{dataset_name}/".format(dataset_name=dataset) for dataset in datasets
-        ]
-        data_paths = [
-            "{base_path}/datasets/{dataset_name}.arff".format(
-                base_path=base_path, dataset_name=dataset
+        settings = self.application.settings
+        if not requirements:
+            settings["suite_environments"][suite_id] = None
+            return
+        env_dir = get_environment_dir(base_path, get_requirements_hash(requirements))
+        requirements_lock = settings.setdefault("requirements_lock", asyncio.Lock())
+        async with requirements_lock:
+            log.info("Preparing environment %s for: %r", env_dir, requirements)
+            await IOLoop.current().run_in_executor(
+                None,
+                create_environment,
+                env_dir,
+                requirements,
+                settings["wheelhouse_dir"],
             )
-            for dataset in datasets
-        ]
-        for data_url, data_path in zip(data_urls, data_paths):
-            if not os.path.isfile(data_path):
-                await master_session.download_file(data_url, data_path)
+            used_env_dirs = [
+                os.path.dirname(os.path.dirname(python))
+                for python in settings["environment_pool"].get_environments()
+            ]
+            evict_environments(
+                base_path, settings["max_environments"], keep=[env_dir, *used_env_dirs]
+            )
+        settings["suite_environments"][suite_id] = get_environment_python(env_dir)
 
     async def post(self):
         try:
             await self._setup_worker()
             self.set_status(status_code=200)
-        except Exception:
+            self.write(
+                {
+                    "slots": self.application.settings["worker_slots"],
+                    "datasets": get_held_datasets(self.get_wd()),
+                }
+            )
+        except Exception as e:
             log.error(traceback.format_exc())  # Write on worker log
+            self.set_status(status_code=500, reason=str(e))
         finally:
             await self.finish()
 
 
+class DatasetHandler(DatasetTransferMixin, BaseWorkerHandler):
+    """Serves the data sets held by the worker to its peers,
+    see DatasetTransferMixin.
+
+    Requests for a data set being downloaded wait for the download.
+    """
+
+    async def get(self, dataset_name):
+        try:
+            download = self.application.settings["dataset_downloads"].get(dataset_name)
+            if download is not None:
+                await download
+            data_path = get_data_path(self.get_wd(), dataset_name)
+            if not os.path.isfile(data_path):
+                raise tornado.web.HTTPError(404)
+            await self.write_dataset(data_path, self.get_wd())
+        except StreamClosedError:
+            log.warning("Transfer of dataset %s interrupted.", dataset_name)
+        except tornado.web.HTTPError as e:
+            self.set_status(e.status_code)
+            await self.finish()
+        except Exception as e:
+            log.error(traceback.format_exc())  # Write on worker log
+            self.set_status(status_code=500, reason=str(e))
+            await self.finish()
+
+
 class RunHandler(BaseWorkerHandler):
     """Handles POST requests to the "/run/" path.
 
-    This executes BAD experiment.
+    This executes a group of BAD experiments on the same data set.
+    Experiments run in the worker runner processes, so that the worker can run
+    as many experiment groups concurrently as its slots. The master can stop
+    a run by its id, see StopHandler.
     """
 
     def prepare(self):
         message = json.loads(self.request.body)
+        self._run_id = message.get("run_id")
         self._data_name = message["data_name"]
-        self._experiment_id = message["experiment_id"]
+        self._dataset_source = message.get("dataset_source")
+        self._data_digest = self.application.settings["dataset_digests"].get(
+            self._data_name
+        )
+        self._experiments = [
+            (experiment["experiment_id"], load_parameter_string(experiment["parameters"]))
+            for experiment in message["experiments"]
+        ]
         self._home_dir = self.get_wd()
         self._master_address = message["master_address"]
-        self._master_session = AsyncHTTPSessionManager(self._master_address)
+        self._master_session = AsyncHTTPSessionManager.get_session(self._master_address)
         self._suite_id = message["suite_id"]
-        self._parameters = load_parameter_string(message["parameters"])
-        self._trainset_size = self._parameters["trainset_size"]
-
-    async def _update_experiment_status(self, status):
-        experiment_url = "experiment/{experiment_id}/".format(
-            experiment_id=self._experiment_id
+        self._candidate_digest = self.application.settings["candidate_digests"].get(
+            self._suite_id
         )
-        message = {"status": status}
-        await self._master_session.post_json(url=experiment_url, data=message)
 
-    @classmethod
-    def _import_candidate_module(cls, candidate_path):
-        spec = importlib.util.spec_from_file_location("bad_candidate", candidate_path)
-        bad_candidate = importlib.util.module_from_spec(spec)
-        spec.loader.exec_module(bad_candidate)
-        return bad_candidate
-
-    def _generate_metrics_file(self, labels, scores):
-        metrics_path = "{home_dir}/{suite_id}/{experiment_id}/metrics.json".format(
-            home_dir=self._home_dir,
-            suite_id=self._suite_id,
-            experiment_id=self._experiment_id,
-        )
-        if not os.path.exists(os.path.dirname(metrics_path)):
-            os.makedirs(os.path.dirname(metrics_path))
-
-        roc_auc = roc_auc_score(y_score=scores, y_true=labels)
-        average_precision = average_precision_score(y_score=scores, y_true=labels)
-
-        metrics = {
-            "experiment_id": self._experiment_id,
-            "roc_auc": roc_auc,
-            "average_precision": average_precision,
-        }
-        pretty_json = json.dumps(metrics, indent=2)
-        with open(metrics_path, "w") as metrics_file:
-            metrics_file.write(pretty_json)
-        return metrics_path
-
-    def _generate_scores(
-        self,
-        candidate,
-        data_matrix,
-    ):
-        feature_matrix = data_matrix[:, 2:]
-
-        # Subsample feature matrix to obtain training set
-        np.random.seed(int(self._parameters["seed"]))
-        num_rows = feature_matrix.shape[0]
-        trainset_size = int(num_rows * float(self._parameters["trainset_size"]))
-        training_indexes = np.random.choice(num_rows, size=trainset_size, replace=False)
-        training_matrix = feature_matrix[training_indexes, :]
-
-        candidate = candidate.fit(training_matrix)
-        scores = np.apply_along_axis(candidate.score, axis=1, arr=feature_matrix)
-        return scores
-
-    def _generate_roc_file(self, labels, scores):
-        roc_path = "{home_dir}/{suite_id}/{experiment_id}/roc.png".format(
-            home_dir=self._home_dir,
-            suite_id=self._suite_id,
-            experiment_id=self._experiment_id,
-        )
-        if not os.path.exists(os.path.dirname(roc_path)):
-            os.makedirs(os.path.dirname(roc_path))
-        fpr, tpr, _ = roc_curve(y_score=scores, y_true=labels)
-        plt.figure()
-        plt.xlabel("False Positive Rate")
-        plt.ylabel("True Positive Rate")
-        plt.plot([0, 1], [0, 1], color="navy", linestyle="--")
-        plt.xlim([0.0, 1.0])
-        plt.ylim([0.0, 1.05])
-        plt.title("ROC")
-        plt.plot(fpr, tpr, color="blue", lw=2)
-        plt.savefig(roc_path, format="png")
-        plt.close()
-        return roc_path
+    async def _update_experiment_status(self, experiment_id, status):
+        experiment_url = "experiment/{experiment_id}/".format(experiment_id=experiment_id)
+        message = {"status": status, "run_id": self._run_id}
+        await self._master_session.post_json(url=experiment_url, data=message)
 
     async def _send_results(
         self,
-        # scores_path,
+        experiment_id,
         metrics_path,
-        roc_path,
+        execution_time,
     ):
-        results_url = "experiment/{experiment_id}/results/".format(
-            experiment_id=self._experiment_id,
-        )
+        results_url = (
+            "experiment/{experiment_id}/results/?execution_time={execution_time}"
+        ).format(experiment_id=experiment_id, execution_time=execution_time)
+        if self._run_id:
+            results_url += "&run_id={}".format(self._run_id)
 
         with open(metrics_path, "rb") as metrics_file:
             metrics_content = metrics_file.read()
 
-        with open(roc_path, "rb") as roc_file:
-            roc_content = roc_file.read()
+        files = {"metrics.json": metrics_content}
+        await self._master_session.post_files(url=results_url, files=files, compress=True)
+
+    async def _fetch_dataset(self):
+        """Downloads and caches the data set of the experiments, unless the worker
+        already holds it. The scheduler only sends experiments on data sets the
+        worker does not hold when no other experiments are pending.
 
-        files = {
-            # "scores": open(scores_path, "rb"),
-            "metrics.json": metrics_content,
-            "roc.png": roc_content,
-        }
-        await self._master_session.post_files(url=results_url, files=files)
+        The data set is downloaded from the peer worker holding it, as sent by
+        the master, if any, and from the master otherwise.
+        """
+        data_path = get_data_path(self._home_dir, self._data_name)
+        if self._data_digest and os.path.isfile(data_path):
+            return
+        log.info("Fetching dataset %s on demand", self._data_name)
+        datasets = [self._data_name]
+        reserved_datasets = self._reserve_downloads(self._home_dir, datasets)
+        try:
+            await self._download_datasets(
+                self._master_session,
+                self._home_dir,
+                datasets,
+                reserved_datasets,
+                {self._data_name: self._dataset_source},
+            )
+        finally:
+            self._release_downloads(reserved_datasets)
+        await self._cache_datasets(self._home_dir, datasets)
+        self._data_digest = self.application.settings["dataset_digests"][self._data_name]
 
-    async def _run_experiment(self):
+    async def _run_experiments(self):
+        experiment_ids = [experiment_id for experiment_id, _ in self._experiments]
         log.info(
-            ">>> Loading experiment %s received from %s",
-            self._experiment_id,
+            ">>> Loading experiments %s received from %s",
+            ", ".join(experiment_ids),
             self._master_address,
         )
-        home_dir = self.get_wd()
-        candidate_path = "{home_dir}/{suite_id}/candidate.py".format(
-            home_dir=home_dir, suite_id=self._suite_id
-        )
-        data_path = "{home_dir}/datasets/{data_name}.arff".format(
-            home_dir=home_dir,
-            data_name=self._data_name,
-        )
-        candidate_name = get_candidate_name(candidate_path)
-
-        log.info("Loading candidate %s from candidate module...", candidate_name)
-        bad_candidate = self._import_candidate_module(candidate_path)
-        candidate_class = getattr(bad_candidate, candidate_name)
-        candidate = candidate_class(**self._parameters)
-
+        settings = self.application.settings
+        environment_python = settings["suite_environments"].get(self._suite_id)
+        # The CPU limit is per experiment, the group runs in a single call
+        cpu_limit = settings["cpu_limit"] * len(self._experiments)
         try:
-            log.info(">>> Running experiment %s", self._experiment_id)
-            log.info("Loading data matrix from %s", data_path)
-            data_matrix = load_data_matrix(data_path)
-            labels = data_matrix[:, 1]
-            log.info("Running experiment...")
-            scores = self._generate_scores(candidate, data_matrix)
-            log.info("Experiment completed.")
-            # log.info("Saving scores file...")
-            # scores_path = _save_scores_to_file(
-            #     suite_id=suite_id,
-            #     experiment_id=experiment_id,
-            #     result_matrix=result_matrix,
-            # )
-            log.info("Generating metrics file...")
-            metrics_path = self._generate_metrics_file(
-                labels=labels,
-                scores=scores,
-            )
-            log.info("Generating ROC plot...")
-            roc_path = self._generate_roc_file(
-                labels=labels,
-                scores=scores,
-            )
-            log.info("Sending results to master...")
-            await self._send_results(
-                # scores_path=scores_path,
-                metrics_path=metrics_path,
-                roc_path=roc_path,
+            await self._fetch_dataset()
+            results = await settings["environment_pool"].call(
+                environment_python or sys.executable,
+                "bad_framework.bad_worker.runner:run_experiments",
+                self._home_dir,
+                self._suite_id,
+                self._candidate_digest,
+                self._data_name,
+                self._data_digest,
+                self._experiments,
+                cpu_limit=cpu_limit or None,
             )
-            log.info("<<< Experiment %s completed successfully.", self._experiment_id)
         except Exception as e:
-            await self._update_experiment_status(status=ExperimentStatus.FAILED)
+            for experiment_id in experiment_ids:
+                await self._update_experiment_status(
+                    experiment_id, status=ExperimentStatus.FAILED
+                )
             log.error("Experiment runtime error: %s", e)
-            log.error("<<< Experiment %s failed.", self._experiment_id)
+            log.error("<<< Experiments %s failed.", ", ".join(experiment_ids))
             raise e  # Handled in self post()
 
+        for result in results:
+            experiment_id = result["experiment_id"]
+            if "error" in result:
+                await self._update_experiment_status(
+                    experiment_id, status=ExperimentStatus.FAILED
+                )
+                log.error("<<< Experiment %s failed.", experiment_id)
+            else:
+                log.info("Sending results to master...")
+                await self._send_results(
+                    experiment_id=experiment_id,
+                    metrics_path=result["metrics_path"],
+                    execution_time=result["execution_time"],
+                )
+                log.info("<<< Experiment %s completed successfully.", experiment_id)
+
     async def post(self):
+        runs = self.application.settings["runs"]
         try:
-            await self._update_experiment_status(status=ExperimentStatus.RUNNING)
-            await self._run_experiment()
+            for experiment_id, _ in self._experiments:
+                await self._update_experiment_status(
+                    experiment_id, status=ExperimentStatus.RUNNING
+                )
+            run = asyncio.ensure_future(self._run_experiments())
+            if self._run_id:
+                runs[self._run_id] = run
+            await run
             self.set_status(status_code=200)
+        except asyncio.CancelledError:
+            log.info("<<< Run %s stopped by the master.", self._run_id)
         except Exception:
             log.error(traceback.format_exc())  # Write on worker log
         finally:
+            runs.pop(self._run_id, None)
             await self.finish()
+
+
+class StopHandler(BaseWorkerHandler):
+    """Handles POST requests to the "/stop/" path.
+
+    Stops a run of experiments, e.g. because another worker already sent
+    the results, and kills its runner process. Unknown runs are ignored,
+    since they may just have completed.
+    """
+
+    def post(self):
+        try:
+            run_id = json.loads(self.request.body)["run_id"]
+            run = self.application.settings["runs"].get(run_id)
+            if run:
+                log.info("Stopping run %s", run_id)
+                run.cancel()
+            self.set_status(200)
+        except Exception as e:
+            log.error(traceback.format_exc())
+            self.set_status(500, reason=str(e))
+        finally:
+            self.finish()
@@ -30,6 +30,34 @@ else
   DEBUG_FLAG='debug=False'
 fi
 
+if [ "$BAD_MASTER_DB" ]; then
+  # Save the master state, so that suites are resumed after a restart
+  DB_FLAG="master_db=$BAD_MASTER_DB"
+else
+  DB_FLAG=''
+fi
+
+if [ "$BAD_MASTER_SPECULATION" ]; then
+  # Run straggler experiments again on free workers
+  SPECULATION_FLAG="master_speculation_factor=$BAD_MASTER_SPECULATION"
+else
+  SPECULATION_FLAG=''
+fi
+
+if [ "$BAD_MASTER_WORKER_TIMEOUT" ]; then
+  # Seconds without heartbeats after which a worker is considered dead
+  WORKER_TIMEOUT_FLAG="master_worker_timeout=$BAD_MASTER_WORKER_TIMEOUT"
+else
+  WORKER_TIMEOUT_FLAG=''
+fi
+
+if [ "$BAD_MASTER_EXPERIMENT_TIMEOUT" ]; then
+  # Seconds an experiment can run before it is dispatched again
+  EXPERIMENT_TIMEOUT_FLAG="master_experiment_timeout=$BAD_MASTER_EXPERIMENT_TIMEOUT"
+else
+  EXPERIMENT_TIMEOUT_FLAG=''
+fi
+
 if [ ! -d "$BAD_MASTER_HOME" ]; then
   mkdir -p "$BAD_MASTER_HOME"
 fi
@@ -42,6 +70,10 @@ echo "Logging to $BAD_MASTER_LOG"
 nohup python3 -m bad_framework.bad_master.server \
   master_port="$BAD_MASTER_PORT" \
   master_home="$BAD_MASTER_HOME" \
+  $DB_FLAG \
+  $SPECULATION_FLAG \
+  $WORKER_TIMEOUT_FLAG \
+  $EXPERIMENT_TIMEOUT_FLAG \
   "$DEBUG_FLAG" > "$BAD_MASTER_LOG" 2>&1 < /dev/null &
 
 exit 0
@@ -2,11 +2,38 @@
 # Copyright (C) 2020 Sivam Pasupathipillai <sivam.pasupathipillai@gmail.com>.
 # All rights reserved.
 
-if [ "$#" -ne 2 ]; then
-  echo "Usage: start_worker.sh BAD_WORKER_HOST BAD_WORKER_PORT";
+if [ "$#" -ne 2 ] && [ "$#" -ne 3 ]; then
+  echo "Usage: start_worker.sh BAD_WORKER_HOST BAD_WORKER_PORT [BAD_WORKER_SLOTS]";
   exit 1
 fi
 
+if [ -n "$3" ]; then
+  SLOTS_FLAG="worker_slots=$3"
+else
+  SLOTS_FLAG=''
+fi
+
+if [ -n "$BAD_WORKER_WHEELHOUSE" ]; then
+  # Wheelhouse directory on the worker host, for offline requirement installs
+  WHEELHOUSE_FLAG="worker_wheelhouse=$BAD_WORKER_WHEELHOUSE"
+else
+  WHEELHOUSE_FLAG=''
+fi
+
+if [ -n "$BAD_WORKER_MEMORY_LIMIT" ]; then
+  # Address space limit of each runner process, in MB
+  MEMORY_LIMIT_FLAG="worker_memory_limit=$BAD_WORKER_MEMORY_LIMIT"
+else
+  MEMORY_LIMIT_FLAG=''
+fi
+
+if [ -n "$BAD_WORKER_CPU_LIMIT" ]; then
+  # CPU time limit of each experiment, in seconds
+  CPU_LIMIT_FLAG="worker_cpu_limit=$BAD_WORKER_CPU_LIMIT"
+else
+  CPU_LIMIT_FLAG=''
+fi
+
 if [ "$BAD_DEBUG" ]; then
   DEBUG_FLAG='debug=True'
 else
@@ -49,6 +76,10 @@ REMOTE_SCRIPT
   nohup python3 -m bad_framework.bad_worker.server \
     worker_port="$BAD_WORKER_PORT" \
     worker_home="$BAD_WORKER_HOME" \
+    $SLOTS_FLAG \
+    $WHEELHOUSE_FLAG \
+    $MEMORY_LIMIT_FLAG \
+    $CPU_LIMIT_FLAG \
     "$DEBUG_FLAG" > \$BAD_WORKER_LOG 2>&1 < /dev/null &
 REMOTE_SCRIPT
 
@@ -84,6 +115,10 @@ REMOTE_SCRIPT
   nohup python3 -m bad_framework.bad_worker.server \
     worker_home="$BAD_WORKER_HOME" \
     worker_port="$BAD_WORKER_PORT" \
+    $SLOTS_FLAG \
+    $WHEELHOUSE_FLAG \
+    $MEMORY_LIMIT_FLAG \
+    $CPU_LIMIT_FLAG \
     "$DEBUG_FLAG" > \$BAD_WORKER_LOG 2>&1 < /dev/null &
 REMOTE_SCRIPT
 
@@ -37,3 +37,17 @@ def test_dummy_score():
     test_element = np.array([1.0, 2.0, 3.0, 4.0])
     cnd = Dummy(p=1.0)
     assert cnd.score(test_element) == 1.0
+
+
+def test_dummy_score_batch():
+    test_matrix = np.array([[1.0, 2.0], [3.0, 4.0], [5.0, 6.0]])
+    cnd = Dummy(p=1.0)
+    assert [1.0, 1.0, 1.0] == cnd.score_batch(test_matrix).tolist()
+
+
+def test_dummy_score_batch_matches_score():
+    test_matrix = np.zeros((10, 2))
+    batch_scores = Dummy(p=0.5, seed=7).score_batch(test_matrix)
+    cnd = Dummy(p=0.5, seed=7)
+    element_scores = [cnd.score(element) for element in test_matrix]
+    assert element_scores == batch_scores.tolist()
@@ -1,5 +1,5 @@
-import pytest
 import numpy as np
+import pytest
 
 from bad_framework.bad_candidates.knn import KNN
 
@@ -54,3 +54,44 @@ def test_knn_score():
     test_element = np.array([2.0, 0.0])
     cnd = KNN(k=1).fit(train_data)
     assert cnd.score(test_element) == 1.0
+
+
+def test_knn_score_batch_without_fit():
+    test_matrix = np.array([[1.0, 2.0]])
+    cnd = KNN(k=1)
+    with pytest.raises(ValueError):
+        cnd.score_batch(test_matrix)
+
+
+def test_knn_score_batch():
+    train_data = np.array(
+        [
+            [1.0, 0.0],
+            [0.0, 1.0],
+        ]
+    )
+    test_matrix = np.array(
+        [
+            [2.0, 0.0],
+            [0.0, 3.0],
+        ]
+    )
+    cnd = KNN(k=1).fit(train_data)
+    assert [1.0, 2.0] == cnd.score_batch(test_matrix).tolist()
+
+
+def test_knn_score_sweep():
+    train_data = np.random.RandomState(0).rand(20, 3)
+    test_matrix = np.random.RandomState(1).rand(10, 3)
+    cnd = KNN(k=5).fit(train_data)
+    sweep_scores = cnd.score_sweep(test_matrix, [1, 3, 5])
+    for k, scores in zip([1, 3, 5], sweep_scores):
+        expected = KNN(k=k).fit(train_data).score_batch(test_matrix)
+        assert np.allclose(expected, scores)
+
+
+def test_knn_score_sweep_with_invalid_value():
+    train_data = np.random.RandomState(0).rand(20, 3)
+    cnd = KNN(k=5).fit(train_data)
+    with pytest.raises(ValueError):
+        cnd.score_sweep(train_data, [0, 5])
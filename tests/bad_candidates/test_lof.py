@@ -0,0 +1,21 @@
+import numpy as np
+import pytest
+
+from bad_framework.bad_candidates.lof import LOF
+
+
+def test_lof_score_sweep():
+    train_data = np.random.RandomState(0).rand(30, 3)
+    test_matrix = np.random.RandomState(1).rand(10, 3)
+    cnd = LOF(k=8).fit(train_data)
+    sweep_scores = cnd.score_sweep(test_matrix, [2, 5, 8])
+    for k, scores in zip([2, 5, 8], sweep_scores):
+        expected = LOF(k=k).fit(train_data).score_batch(test_matrix)
+        assert np.allclose(expected, scores)
+
+
+def test_lof_score_sweep_with_invalid_value():
+    train_data = np.random.RandomState(0).rand(20, 3)
+    cnd = LOF(k=8).fit(train_data)
+    with pytest.raises(ValueError):
+        cnd.score_sweep(train_data, [0, 8])
@@ -68,3 +68,21 @@ def test_partknn_score():
     test_element = np.array([2.0, 0.0])
     cnd = PartKNN(k=1, partitions_num=1).fit(train_data)
     assert cnd.score(test_element) == 1.0
+
+
+def test_partknn_score_batch():
+    train_data = np.array(
+        [
+            [1.0, 0.0],
+            [0.0, 1.0],
+            [2.0, 0.0],
+        ]
+    )
+    test_matrix = np.array(
+        [
+            [2.0, 0.0],
+            [5.0, 5.0],
+        ]
+    )
+    cnd = PartKNN(k=1, partitions_num=1).fit(train_data)
+    assert [1.0, 0.0] == cnd.score_batch(test_matrix).tolist()
@@ -36,7 +36,23 @@ def test_load_workers(tmp_path):
     workers_file = tmp_path / "workers"
     workers_file.write_text(workers_file_contents)
     expected_workers = [
-        ("localhost", "1234"),
-        ("example.host.com", "4321"),
+        ("localhost", "1234", None),
+        ("example.host.com", "4321", None),
+    ]
+    assert expected_workers == _load_workers(workers_file)
+
+
+def test_load_workers_with_slots(tmp_path):
+    workers_file_contents = "\n".join(
+        [
+            "localhost:1234:8",
+            "example.host.com:4321",
+        ]
+    )
+    workers_file = tmp_path / "workers"
+    workers_file.write_text(workers_file_contents)
+    expected_workers = [
+        ("localhost", "1234", "8"),
+        ("example.host.com", "4321", None),
     ]
     assert expected_workers == _load_workers(workers_file)
@@ -1,76 +1,37 @@
-import pytest
-
-from bad_framework.bad_client.monitor import (
-    get_count_by_status,
-    initialize_status_cache,
-    update_status_cache,
-)
-
-
-def test_get_count_by_status():
-    test_cache = {
-        "dummy_exp_1": "created",
-        "dummy_exp_2": "scheduled",
-        "dummy_exp_3": "scheduled",
-    }
-    assert 1 == get_count_by_status(test_cache, "created")
-    assert 2 == get_count_by_status(test_cache, "scheduled")
-
-
-def test_get_count_by_status_when_cache_is_none():
-    with pytest.raises(ValueError):
-        get_count_by_status(None, "created")
-
-
-def test_get_count_by_status_with_invalid_status():
-    with pytest.raises(ValueError):
-        test_cache = {
-            "dummy_exp_1": "created",
-            "dummy_exp_2": "scheduled",
-        }
-        get_count_by_status(test_cache, "invalid_status")
-
-
-def test_initialize_status_cache_with_none():
-    with pytest.raises(ValueError):
-        initialize_status_cache(None)
-
-
-def test_initialize_status_cache():
-    example_response = [
-        {"id": "dummy_exp_1", "status": "running"},
-        {"id": "dummy_exp_2", "status": "scheduled"},
-    ]
-    expected_cache = {
-        "dummy_exp_1": "running",
-        "dummy_exp_2": "scheduled",
-    }
-    assert expected_cache == initialize_status_cache(example_response)
-
-
-def test_update_status_cache():
-    test_cache = {
-        "dummy_exp_1": "created",
-        "dummy_exp_2": "scheduled",
-    }
-    test_experiments = [
-        {"id": "dummy_exp_1", "status": "created"},
-        {"id": "dummy_exp_2", "status": "running"},
+from bad_framework.bad_client.monitor import monitor_suite
+
+
+class DummyMasterSession:
+    def __init__(self, status_updates):
+        self.status_updates = status_updates
+        self.urls = []
+
+    def get_json(self, url):
+        self.urls.append(url)
+        return self.status_updates.pop(0)
+
+
+def test_monitor_suite(monkeypatch):
+    status_bars = []
+    monkeypatch.setattr(
+        "bad_framework.bad_client.monitor.print_status_bar",
+        lambda **kwargs: status_bars.append(kwargs),
+    )
+    status_updates = [
+        {"version": 0, "summary": {"created": 2}, "changes": []},
+        {
+            "version": 2,
+            "summary": {"created": 1, "completed": 1},
+            "changes": [{"id": "dummy_exp_1", "status": "completed"}],
+        },
+        {
+            "version": 4,
+            "summary": {"completed": 1, "failed": 1},
+            "changes": [{"id": "dummy_exp_2", "status": "failed"}],
+        },
     ]
-    expected_cache = {
-        "dummy_exp_1": "created",
-        "dummy_exp_2": "running",
-    }
-    update_status_cache(test_experiments, test_cache)
-    assert expected_cache == test_cache
-
-
-def test_get_suite_experiments():
-    # example_response = {
-    #     "suite_id": "dummy_suite",
-    #     "experiments": [
-    #         {"id": "dummy_exp_1", "status": "dummy_status_1"},
-    #         {"id": "dummy_exp_2", "status": "dummy_status_2"},
-    #     ],
-    # }
-    pass
+    session = DummyMasterSession(status_updates)
+    monitor_suite(session, "dummy_suite")
+    assert not status_updates
+    assert [1, 1] == [status_bar["completed_num"] for status_bar in status_bars]
+    assert session.urls[-1].endswith("?version=2&timeout=1")
@@ -0,0 +1,40 @@
+import json
+
+from bad_framework.bad_master.cache import ResultCache, get_result_key
+
+
+def test_get_result_key():
+    result_key = get_result_key("candidate", "data", "k=1;seed=2")
+    assert result_key == get_result_key("candidate", "data", "seed=2;k=1")
+    assert result_key != get_result_key("candidate", "data", "k=2;seed=2")
+    assert result_key != get_result_key("candidate", "other_data", "k=1;seed=2")
+
+
+def test_result_cache(tmp_path):
+    metrics_file = tmp_path / "metrics.json"
+    metrics_file.write_text('{"roc_auc": 0.5}')
+
+    result_cache = ResultCache(str(tmp_path / "cache"))
+    assert result_cache.get("dummy_key") is None
+
+    result_cache.put("dummy_key", str(metrics_file), 1000)
+    cached_result = result_cache.get("dummy_key")
+    assert 1000 == cached_result["execution_time"]
+    with open(cached_result["metrics_path"], "r") as cached_metrics:
+        assert '{"roc_auc": 0.5}' == cached_metrics.read()
+
+
+def test_result_cache_copy_result(tmp_path):
+    metrics_file = tmp_path / "metrics.json"
+    metrics_file.write_text('{"experiment_id": "exp_1", "roc_auc": 0.5}')
+
+    result_cache = ResultCache(str(tmp_path / "cache"))
+    experiment_dir = str(tmp_path / "suite" / "exp_2")
+    assert result_cache.copy_result("dummy_key", experiment_dir, "exp_2") is None
+
+    result_cache.put("dummy_key", str(metrics_file), 1000)
+    copied_result = result_cache.copy_result("dummy_key", experiment_dir, "exp_2")
+    assert 1000 == copied_result["execution_time"]
+    with open(copied_result["metrics_path"], "r") as copied_metrics:
+        metrics = json.load(copied_metrics)
+    assert {"experiment_id": "exp_2", "roc_auc": 0.5} == metrics
@@ -0,0 +1,28 @@
+import pytest
+
+from bad_framework.bad_master.costs import CostModel, get_experiment_work
+
+
+def test_experiment_work_depends_on_parameters():
+    assert get_experiment_work("IForest", (100, 2), "m=20") > get_experiment_work(
+        "IForest", (100, 2), "m=10"
+    )
+    assert get_experiment_work("PartKNN", (100, 2), "partitions_num=2") > (
+        get_experiment_work("PartKNN", (100, 2), "partitions_num=4")
+    )
+
+
+def test_cost_model_is_refined_with_observations():
+    cost_model = CostModel(default_rate=1.0, smoothing=0.5)
+    work = get_experiment_work("KNN", (10, 2), "k=5")
+    assert work == pytest.approx(cost_model.estimate("KNN", "data", (10, 2), "k=5"))
+
+    cost_model.observe("KNN", "data", (10, 2), "k=5", 4 * work)
+    assert 4 * work == pytest.approx(cost_model.estimate("KNN", "data", (10, 2), "k=5"))
+    # Other data sets use the candidate rate
+    assert 4 * work == pytest.approx(
+        cost_model.estimate("KNN", "other_data", (10, 2), "k=5")
+    )
+
+    cost_model.observe("KNN", "data", (10, 2), "k=5", work)
+    assert 2 * work == pytest.approx(cost_model.estimate("KNN", "data", (10, 2), "k=5"))
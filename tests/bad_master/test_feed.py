@@ -0,0 +1,34 @@
+import asyncio
+
+from bad_framework.bad_master.feed import StatusFeed
+
+
+def test_status_feed_get_changes():
+    feed = StatusFeed()
+    feed.publish("exp_1", "running")
+    feed.publish("exp_2", "running")
+    feed.publish("exp_1", "completed")
+    assert 3 == feed.version
+    assert {"exp_1": "completed", "exp_2": "running"} == feed.get_changes(0)
+    assert {"exp_1": "completed"} == feed.get_changes(2)
+    assert {} == feed.get_changes(3)
+
+
+def test_status_feed_wait_wakes_up_on_publish():
+    async def run_scenario():
+        feed = StatusFeed()
+        waiter = asyncio.ensure_future(feed.wait(0, timeout=10))
+        await asyncio.sleep(0.01)
+        assert not waiter.done()
+        feed.publish("exp_1", "running")
+        await asyncio.wait_for(waiter, timeout=1)
+
+    asyncio.run(run_scenario())
+
+
+def test_status_feed_wait_timeout():
+    async def run_scenario():
+        feed = StatusFeed()
+        await asyncio.wait_for(feed.wait(0, timeout=0.01), timeout=1)
+
+    asyncio.run(run_scenario())
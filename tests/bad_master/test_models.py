@@ -0,0 +1,41 @@
+from bad_framework.bad_master.models import Dataset, Experiment
+from bad_framework.bad_utils.adt import ExperimentStatus
+
+
+def test_experiment_get_by_suite():
+    first = Experiment.create("suite_index_1", "dummy_candidate", "dummy_data", "k=1")
+    second = Experiment.create("suite_index_1", "dummy_candidate", "dummy_data", "k=2")
+    Experiment.create("suite_index_2", "dummy_candidate", "dummy_data", "k=1")
+    assert [first, second] == Experiment.get_by_suite("suite_index_1")
+    assert [] == Experiment.get_by_suite("missing_suite")
+
+
+def test_experiment_status_counts():
+    experiments = [
+        Experiment.create("suite_counts", "dummy_candidate", "dummy_data", "k=1")
+        for _ in range(3)
+    ]
+    experiments[0].update_status(ExperimentStatus.RUNNING)
+    experiments[0].update_status(ExperimentStatus.COMPLETED)
+    experiments[1].update_status(ExperimentStatus.FAILED)
+
+    status_counts = Experiment.get_status_counts("suite_counts")
+    assert 1 == status_counts["created"]
+    assert 0 == status_counts["running"]
+    assert 1 == status_counts["completed"]
+    assert 1 == status_counts["failed"]
+    assert {} == Experiment.get_status_counts("missing_suite")
+
+
+def test_dataset_get_by_name():
+    dataset = Dataset.create("dummy_index_data", "dummy/path.arff")
+    assert dataset is Dataset.get_by_name("dummy_index_data")
+    assert Dataset.get_by_name("missing_data") is None
+
+
+def test_dataset_setup_is_idempotent():
+    Dataset.setup()
+    datasets_num = len(Dataset.get_all())
+    Dataset.setup()
+    assert datasets_num == len(Dataset.get_all())
+    assert Dataset.get_by_name("dummy") is not None
@@ -0,0 +1,27 @@
+import json
+
+import pytest
+
+from bad_framework.bad_master.plots import render_roc_file
+
+
+def test_render_roc_file(tmp_path):
+    metrics_file = tmp_path / "metrics.json"
+    metrics_file.write_text(
+        json.dumps({"roc_curve": {"fpr": [0.0, 0.5, 1.0], "tpr": [0.0, 0.8, 1.0]}})
+    )
+    roc_file = tmp_path / "roc.png"
+
+    render_roc_file(str(metrics_file), str(roc_file))
+    assert roc_file.read_bytes().startswith(b"\x89PNG")
+    assert ["metrics.json", "roc.png"] == sorted(p.name for p in tmp_path.iterdir())
+
+
+def test_render_roc_file_without_roc_curve(tmp_path):
+    metrics_file = tmp_path / "metrics.json"
+    metrics_file.write_text(json.dumps({"roc_auc": 0.5}))
+    roc_file = tmp_path / "roc.png"
+
+    with pytest.raises(ValueError):
+        render_roc_file(str(metrics_file), str(roc_file))
+    assert not roc_file.exists()
@@ -0,0 +1,470 @@
+import asyncio
+import time
+
+import pytest
+
+from bad_framework.bad_master.costs import CostModel
+from bad_framework.bad_master.scheduler import SuiteScheduler, group_experiments
+from bad_framework.bad_utils.adt import ExperimentStatus
+from bad_framework.bad_utils.errors import SchedulingError
+
+
+class DummySession:
+    def __init__(self):
+        self.messages = []
+        self.stopped_runs = []
+
+    async def post_json(self, url, data):
+        if url == "stop/":
+            self.stopped_runs.append(data["run_id"])
+        else:
+            self.messages.append(data)
+
+
+class DummyWorker:
+    def __init__(self, worker_id, slots=1, configured_slots=None):
+        self.id = worker_id
+        self.hostname = worker_id
+        self.port = 3291
+        self.master_address = "localhost:3290"
+        self.configured_slots = configured_slots
+        self.slots = slots
+        self.session = DummySession()
+        self.last_heartbeat = None
+
+
+class DummyExperiment:
+    def __init__(self, experiment_id, parameters="a=1", dataset="dummy_data"):
+        self.id = experiment_id
+        self.suite = "dummy_suite"
+        self.dataset = dataset
+        self.parameters = parameters
+        self.status = ExperimentStatus.CREATED
+        self.execution_time = None
+
+    def update_status(self, status):
+        self.status = status
+
+
+def get_experiment_ids(worker):
+    return [
+        experiment["experiment_id"]
+        for message in worker.session.messages
+        for experiment in message["experiments"]
+    ]
+
+
+def test_scheduler_without_workers():
+    with pytest.raises(SchedulingError):
+        SuiteScheduler("dummy_suite", [])
+
+
+def test_scheduler_waits_for_free_slot():
+    async def run_scenario():
+        worker = DummyWorker("dummy_worker")
+        experiments = [DummyExperiment("exp_1"), DummyExperiment("exp_2")]
+        scheduler = SuiteScheduler.create("dummy_suite", [worker], experiments)
+
+        scheduling_loop = asyncio.ensure_future(scheduler.run())
+        await asyncio.sleep(0.01)
+        # A single slot is available: only the first experiment is dispatched
+        assert ["exp_1"] == get_experiment_ids(worker)
+        assert ExperimentStatus.CREATED == experiments[1].status
+
+        experiments[0].update_status(ExperimentStatus.COMPLETED)
+        SuiteScheduler.notify_done(experiments[0])
+        await asyncio.wait_for(scheduling_loop, timeout=1)
+        await asyncio.sleep(0.01)
+        assert ["exp_1", "exp_2"] == get_experiment_ids(worker)
+        assert ExperimentStatus.SCHEDULED == experiments[1].status
+
+    asyncio.run(run_scenario())
+
+
+def test_scheduler_spreads_experiments_over_workers():
+    async def run_scenario():
+        workers = [DummyWorker("worker_1"), DummyWorker("worker_2")]
+        experiments = [DummyExperiment("exp_1"), DummyExperiment("exp_2")]
+        scheduler = SuiteScheduler.create("dummy_suite", workers, experiments)
+        await asyncio.wait_for(scheduler.run(), timeout=1)
+        await asyncio.sleep(0.01)
+        assert 1 == len(workers[0].session.messages)
+        assert 1 == len(workers[1].session.messages)
+
+    asyncio.run(run_scenario())
+
+
+def test_scheduler_fills_all_worker_slots():
+    async def run_scenario():
+        worker = DummyWorker("dummy_worker", slots=2)
+        experiments = [DummyExperiment("exp_{}".format(i)) for i in range(3)]
+        scheduler = SuiteScheduler.create("dummy_suite", [worker], experiments)
+
+        scheduling_loop = asyncio.ensure_future(scheduler.run())
+        await asyncio.sleep(0.01)
+        assert ["exp_0", "exp_1"] == get_experiment_ids(worker)
+
+        experiments[1].update_status(ExperimentStatus.FAILED)
+        SuiteScheduler.notify_done(experiments[1])
+        await asyncio.wait_for(scheduling_loop, timeout=1)
+        await asyncio.sleep(0.01)
+        assert 3 == len(worker.session.messages)
+
+    asyncio.run(run_scenario())
+
+
+def test_group_experiments():
+    experiments = [
+        DummyExperiment("exp_1", "k=5;seed=1"),
+        DummyExperiment("exp_2", "k=10;seed=1"),
+        DummyExperiment("exp_3", "k=5;seed=2"),
+        DummyExperiment("exp_4", "k=5;seed=1", dataset="other_data"),
+        DummyExperiment("exp_5", "seed=1"),
+    ]
+    groups = group_experiments(experiments, "k")
+    assert [["exp_1", "exp_2"], ["exp_3"], ["exp_4"], ["exp_5"]] == [
+        [experiment.id for experiment in group] for group in groups
+    ]
+    assert 5 == len(group_experiments(experiments))
+
+
+def test_scheduler_releases_slot_when_task_is_done():
+    async def run_scenario():
+        worker = DummyWorker("dummy_worker")
+        experiments = [
+            DummyExperiment("exp_1", "k=5"),
+            DummyExperiment("exp_2", "k=10"),
+            DummyExperiment("exp_3", "k=5", dataset="other_data"),
+        ]
+        scheduler = SuiteScheduler.create(
+            "dummy_suite", [worker], experiments, sweep_parameter="k"
+        )
+
+        scheduling_loop = asyncio.ensure_future(scheduler.run())
+        await asyncio.sleep(0.01)
+        assert ["exp_1", "exp_2"] == get_experiment_ids(worker)
+
+        experiments[0].update_status(ExperimentStatus.COMPLETED)
+        SuiteScheduler.notify_done(experiments[0])
+        await asyncio.sleep(0.01)
+        assert 1 == len(worker.session.messages)
+
+        experiments[1].update_status(ExperimentStatus.COMPLETED)
+        SuiteScheduler.notify_done(experiments[1])
+        await asyncio.wait_for(scheduling_loop, timeout=1)
+        await asyncio.sleep(0.01)
+        assert ["exp_1", "exp_2", "exp_3"] == get_experiment_ids(worker)
+
+    asyncio.run(run_scenario())
+
+
+def test_scheduler_is_dropped_when_done():
+    async def run_scenario():
+        worker = DummyWorker("dummy_worker")
+        experiments = [DummyExperiment("exp_1"), DummyExperiment("exp_2")]
+        scheduler = SuiteScheduler.create("dummy_suite", [worker], experiments)
+
+        scheduling_loop = asyncio.ensure_future(scheduler.run())
+        for experiment in experiments:
+            await asyncio.sleep(0.01)
+            assert scheduler is SuiteScheduler.get_by_suite("dummy_suite")
+            experiment.update_status(ExperimentStatus.COMPLETED)
+            SuiteScheduler.notify_done(experiment)
+        await asyncio.wait_for(scheduling_loop, timeout=1)
+        assert SuiteScheduler.get_by_suite("dummy_suite") is None
+
+    asyncio.run(run_scenario())
+
+
+def test_scheduler_waits_for_ready_workers():
+    async def run_scenario():
+        workers = [DummyWorker("worker_1"), DummyWorker("worker_2")]
+        experiments = [DummyExperiment("exp_1")]
+        scheduler = SuiteScheduler.create(
+            "dummy_suite", workers, experiments, ready=False
+        )
+
+        scheduling_loop = asyncio.ensure_future(scheduler.run())
+        await asyncio.sleep(0.01)
+        assert ExperimentStatus.CREATED == experiments[0].status
+
+        scheduler.set_worker_ready(workers[1])
+        await asyncio.wait_for(scheduling_loop, timeout=1)
+        await asyncio.sleep(0.01)
+        assert ["exp_1"] == get_experiment_ids(workers[1])
+
+    asyncio.run(run_scenario())
+
+
+def test_scheduler_fails_experiments_without_workers():
+    async def run_scenario():
+        worker = DummyWorker("dummy_worker")
+        experiments = [DummyExperiment("exp_1"), DummyExperiment("exp_2")]
+        scheduler = SuiteScheduler.create(
+            "dummy_suite", [worker], experiments, ready=False
+        )
+
+        scheduling_loop = asyncio.ensure_future(scheduler.run())
+        await asyncio.sleep(0.01)
+        scheduler.remove_worker(worker)
+        await asyncio.wait_for(scheduling_loop, timeout=1)
+        assert [ExperimentStatus.FAILED] * 2 == [e.status for e in experiments]
+
+    asyncio.run(run_scenario())
+
+
+def test_scheduler_prefers_workers_holding_the_dataset():
+    async def run_scenario():
+        workers = [DummyWorker("worker_1"), DummyWorker("worker_2")]
+        experiments = [
+            DummyExperiment("exp_1", dataset="data_a"),
+            DummyExperiment("exp_2", dataset="data_a"),
+            DummyExperiment("exp_3", dataset="data_b"),
+        ]
+        scheduler = SuiteScheduler.create(
+            "dummy_suite", workers, experiments, ready=False
+        )
+        scheduler.set_worker_ready(workers[0], ["data_b"])
+        scheduler.set_worker_ready(workers[1], ["data_a"])
+
+        scheduling_loop = asyncio.ensure_future(scheduler.run())
+        await asyncio.sleep(0.01)
+        assert ["exp_3"] == get_experiment_ids(workers[0])
+        assert ["exp_1"] == get_experiment_ids(workers[1])
+
+        experiments[2].update_status(ExperimentStatus.COMPLETED)
+        SuiteScheduler.notify_done(experiments[2])
+        await asyncio.wait_for(scheduling_loop, timeout=1)
+        await asyncio.sleep(0.01)
+        # No data set held by worker_1 is pending: it gets the first pending task
+        assert ["exp_3", "exp_2"] == get_experiment_ids(workers[0])
+
+    asyncio.run(run_scenario())
+
+
+def test_scheduler_dispatches_longest_tasks_first(monkeypatch):
+    async def run_scenario():
+        monkeypatch.setattr(SuiteScheduler, "cost_model", CostModel())
+        worker = DummyWorker("dummy_worker")
+        experiments = [
+            DummyExperiment("exp_1", "k=5", dataset="small_data"),
+            DummyExperiment("exp_2", "k=5", dataset="large_data"),
+            DummyExperiment("exp_3", "k=5", dataset="medium_data"),
+        ]
+        dataset_shapes = {
+            "small_data": (10, 2),
+            "medium_data": (100, 2),
+            "large_data": (1000, 2),
+        }
+        scheduler = SuiteScheduler.create(
+            "dummy_suite",
+            [worker],
+            experiments,
+            candidate_name="KNN",
+            dataset_shapes=dataset_shapes,
+        )
+
+        scheduling_loop = asyncio.ensure_future(scheduler.run())
+        await asyncio.sleep(0.01)
+        assert ["exp_2"] == get_experiment_ids(worker)
+
+        # The small data set turns out to be the slowest one
+        experiments[1].execution_time = 1000
+        experiments[1].update_status(ExperimentStatus.COMPLETED)
+        SuiteScheduler.notify_done(experiments[1])
+        SuiteScheduler.cost_model.observe("KNN", "small_data", (10, 2), "k=5", 1.0)
+        await asyncio.sleep(0.01)
+        assert ["exp_2", "exp_1"] == get_experiment_ids(worker)
+
+        experiments[0].update_status(ExperimentStatus.COMPLETED)
+        SuiteScheduler.notify_done(experiments[0])
+        await asyncio.wait_for(scheduling_loop, timeout=1)
+
+    asyncio.run(run_scenario())
+
+
+def test_scheduler_sends_dataset_source():
+    async def run_scenario():
+        workers = [DummyWorker("worker_1"), DummyWorker("worker_2")]
+        experiments = [DummyExperiment("exp_1"), DummyExperiment("exp_2", "a=2")]
+        scheduler = SuiteScheduler.create(
+            "dummy_suite", workers, experiments, ready=False
+        )
+        scheduling_loop = asyncio.ensure_future(scheduler.run())
+        scheduler.set_worker_ready(workers[0], ["dummy_data"])
+        await asyncio.sleep(0.01)
+        assert "dataset_source" not in workers[0].session.messages[0]
+
+        # worker_2 does not hold the data set: it fetches it from worker_1
+        scheduler.set_worker_ready(workers[1])
+        await asyncio.wait_for(scheduling_loop, timeout=1)
+        await asyncio.sleep(0.01)
+        assert ["exp_2"] == get_experiment_ids(workers[1])
+        assert "worker_1:3291" == workers[1].session.messages[0]["dataset_source"]
+
+    asyncio.run(run_scenario())
+
+
+def test_scheduler_predicts_makespan_on_known_slots(monkeypatch):
+    monkeypatch.setattr(SuiteScheduler, "cost_model", CostModel(default_rate=1.0))
+    workers = [
+        DummyWorker("ready_worker", slots=2),
+        DummyWorker("configured_worker", configured_slots=1),
+        DummyWorker("unknown_worker"),
+    ]
+    experiments = [
+        DummyExperiment("exp_{}".format(index), dataset="data_{}".format(index))
+        for index in range(4)
+    ]
+    scheduler = SuiteScheduler.create("dummy_suite", workers, experiments, ready=False)
+    scheduler.set_worker_ready(workers[0])
+    costs = [task.cost for tasks in scheduler._pending.values() for task in tasks]
+
+    # Four tasks of equal cost on three known slots
+    assert 2 * max(costs) == scheduler._predict_makespan()
+
+
+def test_scheduler_runs_copies_of_stragglers(monkeypatch):
+    async def run_scenario():
+        monkeypatch.setattr(SuiteScheduler, "speculation_factor", 2.0)
+        monkeypatch.setattr(SuiteScheduler, "MIN_SPECULATION_TIME", 0.0)
+        monkeypatch.setattr(SuiteScheduler, "cost_model", CostModel(default_rate=1e-3))
+        workers = [DummyWorker("worker_1"), DummyWorker("worker_2")]
+        experiments = [DummyExperiment("exp_1")]
+        scheduler = SuiteScheduler.create("dummy_suite", workers, experiments)
+
+        scheduling_loop = asyncio.ensure_future(scheduler.run())
+        await asyncio.sleep(0.01)
+        assert ["exp_1"] == get_experiment_ids(workers[0])
+        assert [] == get_experiment_ids(workers[1])
+
+        await asyncio.wait_for(scheduling_loop, timeout=1)
+        await asyncio.sleep(0.05)
+        scheduler.check_runs()
+        await asyncio.sleep(0.01)
+        # The experiment is a straggler: a copy runs on the free worker
+        assert ["exp_1"] == get_experiment_ids(workers[1])
+        first_run_id = workers[0].session.messages[0]["run_id"]
+        copy_run_id = workers[1].session.messages[0]["run_id"]
+        assert first_run_id != copy_run_id
+
+        experiments[0].update_status(ExperimentStatus.COMPLETED)
+        SuiteScheduler.notify_done(experiments[0], copy_run_id)
+        await asyncio.sleep(0.01)
+        assert [first_run_id] == workers[0].session.stopped_runs
+        assert [] == workers[1].session.stopped_runs
+        assert SuiteScheduler.get_by_suite("dummy_suite") is None
+
+    asyncio.run(run_scenario())
+
+
+def test_scheduler_keeps_original_run_when_copy_fails(monkeypatch):
+    async def run_scenario():
+        monkeypatch.setattr(SuiteScheduler, "speculation_factor", 2.0)
+        monkeypatch.setattr(SuiteScheduler, "MIN_SPECULATION_TIME", 0.0)
+        monkeypatch.setattr(SuiteScheduler, "cost_model", CostModel(default_rate=1e-3))
+        workers = [DummyWorker("worker_1"), DummyWorker("worker_2")]
+        experiments = [DummyExperiment("exp_1")]
+        scheduler = SuiteScheduler.create("dummy_suite", workers, experiments)
+
+        await asyncio.wait_for(scheduler.run(), timeout=1)
+        await asyncio.sleep(0.05)
+        scheduler.check_runs()
+        await asyncio.sleep(0.01)
+        first_run_id = workers[0].session.messages[0]["run_id"]
+        copy_run_id = workers[1].session.messages[0]["run_id"]
+
+        # The copy fails: only the copy is stopped, the original run goes on
+        SuiteScheduler.notify_failed(experiments[0], copy_run_id)
+        await asyncio.sleep(0.01)
+        assert [copy_run_id] == workers[1].session.stopped_runs
+        assert [] == workers[0].session.stopped_runs
+        assert ExperimentStatus.SCHEDULED == experiments[0].status
+        assert not SuiteScheduler.is_live_run(experiments[0], copy_run_id)
+        assert SuiteScheduler.is_live_run(experiments[0], first_run_id)
+
+        # The experiment fails with its last run
+        SuiteScheduler.notify_failed(experiments[0], first_run_id)
+        assert ExperimentStatus.FAILED == experiments[0].status
+        assert SuiteScheduler.get_by_suite("dummy_suite") is None
+
+    asyncio.run(run_scenario())
+
+
+def test_scheduler_dispatches_again_tasks_of_dead_workers(monkeypatch):
+    async def run_scenario():
+        monkeypatch.setattr(SuiteScheduler, "worker_timeout", 30.0)
+        workers = [DummyWorker("worker_1"), DummyWorker("worker_2")]
+        experiments = [DummyExperiment("exp_1")]
+        scheduler = SuiteScheduler.create(
+            "dummy_suite", workers, experiments, ready=False
+        )
+        workers[0].last_heartbeat = time.monotonic()
+        scheduler.set_worker_ready(workers[0])
+
+        await asyncio.wait_for(scheduler.run(), timeout=1)
+        await asyncio.sleep(0.01)
+        assert ["exp_1"] == get_experiment_ids(workers[0])
+
+        workers[0].last_heartbeat -= 60
+        workers[1].last_heartbeat = time.monotonic()
+        scheduler.set_worker_ready(workers[1])
+        scheduler.check_runs()
+        await asyncio.sleep(0.01)
+        assert ExperimentStatus.SCHEDULED == experiments[0].status
+        assert ["exp_1"] == get_experiment_ids(workers[1])
+
+        experiments[0].update_status(ExperimentStatus.COMPLETED)
+        SuiteScheduler.notify_done(experiments[0])
+        assert SuiteScheduler.get_by_suite("dummy_suite") is None
+
+    asyncio.run(run_scenario())
+
+
+def test_scheduler_fails_tasks_out_of_retries(monkeypatch):
+    async def run_scenario():
+        monkeypatch.setattr(SuiteScheduler, "experiment_timeout", 0.01)
+        worker = DummyWorker("dummy_worker")
+        experiments = [DummyExperiment("exp_1")]
+        scheduler = SuiteScheduler.create("dummy_suite", [worker], experiments)
+
+        await asyncio.wait_for(scheduler.run(), timeout=1)
+        for _ in range(SuiteScheduler.MAX_RETRIES + 1):
+            await asyncio.sleep(0.02)
+            scheduler.check_runs()
+        await asyncio.sleep(0.01)
+        # Each timed out run is stopped and dispatched again
+        run_ids = [message["run_id"] for message in worker.session.messages]
+        assert SuiteScheduler.MAX_RETRIES + 1 == len(run_ids)
+        assert run_ids == worker.session.stopped_runs
+        assert ExperimentStatus.FAILED == experiments[0].status
+        assert SuiteScheduler.get_by_suite("dummy_suite") is None
+
+    asyncio.run(run_scenario())
+
+
+def test_scheduler_ignores_failure_of_timed_out_run(monkeypatch):
+    async def run_scenario():
+        monkeypatch.setattr(SuiteScheduler, "experiment_timeout", 0.01)
+        worker = DummyWorker("dummy_worker")
+        experiments = [DummyExperiment("exp_1")]
+        scheduler = SuiteScheduler.create("dummy_suite", [worker], experiments)
+
+        await asyncio.wait_for(scheduler.run(), timeout=1)
+        await asyncio.sleep(0.02)
+        scheduler.check_runs()
+        await asyncio.sleep(0.01)
+        timed_out_run_id, retry_run_id = [
+            message["run_id"] for message in worker.session.messages
+        ]
+
+        # The late failure of the timed out run does not affect the retry
+        assert not SuiteScheduler.is_live_run(experiments[0], timed_out_run_id)
+        assert SuiteScheduler.is_live_run(experiments[0], retry_run_id)
+        assert ExperimentStatus.SCHEDULED == experiments[0].status
+
+        experiments[0].update_status(ExperimentStatus.COMPLETED)
+        SuiteScheduler.notify_done(experiments[0], retry_run_id)
+        assert SuiteScheduler.get_by_suite("dummy_suite") is None
+
+    asyncio.run(run_scenario())
@@ -0,0 +1,80 @@
+from bad_framework.bad_master.models import (
+    Experiment,
+    Model,
+    Suite,
+    Worker,
+    restore_models,
+)
+from bad_framework.bad_master.store import ModelStore
+from bad_framework.bad_utils.adt import ExperimentStatus
+
+
+def test_model_store_coalesces_writes(tmp_path):
+    store = ModelStore(str(tmp_path / "master.db"))
+    store.save("Suite", "suit1234", {"id": "suit1234", "created_ts": "first"})
+    store.save("Suite", "suit1234", {"id": "suit1234", "created_ts": "second"})
+    assert [] == store.load("Suite")
+
+    store.flush()
+    assert [{"id": "suit1234", "created_ts": "second"}] == store.load("Suite")
+
+    store.delete("Suite", "suit1234")
+    store.flush()
+    assert [] == store.load("Suite")
+    store.close()
+
+
+def test_restore_models(tmp_path):
+    db_path = str(tmp_path / "master.db")
+    store = ModelStore(db_path)
+    Model.set_store(store)
+    try:
+        suite = Suite.create()
+        experiments = [
+            Experiment.create(suite.id, "dummy_candidate", "dummy_data", "k=1")
+            for _ in range(3)
+        ]
+        experiments[0].update_status(ExperimentStatus.RUNNING)
+        experiments[0].update_status(ExperimentStatus.COMPLETED)
+        experiments[1].update_status(ExperimentStatus.RUNNING)
+        store.close()
+
+        # Simulates a master restart
+        del Suite._objects[suite.id]
+        for experiment in experiments:
+            del Experiment._objects[experiment.id]
+        del Experiment._suite_index[suite.id]
+        del Experiment._status_counts[suite.id]
+        restore_models(ModelStore(db_path))
+    finally:
+        Model.set_store(None)
+
+    restored_experiments = Experiment.get_by_suite(suite.id)
+    assert [e.id for e in experiments] == [e.id for e in restored_experiments]
+    assert ExperimentStatus.COMPLETED == restored_experiments[0].status
+    assert experiments[0].completed_ts == restored_experiments[0].completed_ts
+    assert ExperimentStatus.CREATED == restored_experiments[1].status
+    assert 2 == Experiment.get_status_counts(suite.id)["created"]
+
+
+def test_setup_reconciles_workers(tmp_path):
+    store = ModelStore(str(tmp_path / "master.db"))
+    Model.set_store(store)
+    try:
+        Worker.setup([("host-a", 3291, 2), ("host-b", 3291, None)], "master:3290")
+        first_worker = next(w for w in Worker.get_all() if w.hostname == "host-a")
+
+        Worker.setup([("host-a", "3291", 4), ("host-c", 3291, None)], "master:3290")
+        store.flush()
+    finally:
+        Model.set_store(None)
+    workers = {w.hostname: w for w in Worker.get_all()}
+    try:
+        assert {"host-a", "host-c"} == set(workers)
+        assert first_worker is workers["host-a"]
+        assert 4 == workers["host-a"].slots
+        assert {"host-a", "host-c"} == {r["hostname"] for r in store.load("Worker")}
+    finally:
+        for worker in workers.values():
+            worker.delete()
+        store.close()
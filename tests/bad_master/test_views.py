@@ -0,0 +1,167 @@
+import asyncio
+import json
+import os
+
+import tornado.web
+
+from bad_framework.bad_master.models import Experiment, Worker
+from bad_framework.bad_master.views import (
+    DatasetHandler,
+    ResultHandler,
+    WorkerHeartbeatHandler,
+    assign_datasets,
+    get_worker_dataset_sources,
+)
+from bad_framework.bad_utils.files import get_file_hash
+from bad_framework.bad_utils.network import AsyncHTTPSessionManager
+from bad_framework.bad_utils.transfer import get_compressed_dataset_path
+
+
+def get_dataset_app(master_home):
+    return tornado.web.Application(
+        [(r"^/dataset/(?P<dataset_name>[a-z0-9-]+)/$", DatasetHandler)],
+        master_home=master_home,
+    )
+
+
+def test_dataset_download_resumes(tmp_path):
+    content = os.urandom(3 * DatasetHandler.CHUNK_SIZE // 2)
+    dataset_dir = tmp_path / "master" / "dataset"
+    dataset_dir.mkdir(parents=True)
+    (dataset_dir / "dummy-data.arff").write_bytes(content)
+    data_path = str(tmp_path / "worker" / "dummy-data.arff")
+
+    async def run_scenario():
+        server = get_dataset_app(str(tmp_path / "master")).listen(18932)
+        session = AsyncHTTPSessionManager("localhost:18932")
+        try:
+            await session.download_file("dataset/dummy-data/", data_path)
+            with open(data_path, "rb") as data_file:
+                assert content == data_file.read()
+
+            # Resumes an interrupted download
+            os.remove(data_path)
+            with open(data_path + ".part", "wb") as partial_file:
+                partial_file.write(content[:1000])
+            await session.download_file("dataset/dummy-data/", data_path)
+            with open(data_path, "rb") as data_file:
+                assert content == data_file.read()
+            assert not os.path.exists(data_path + ".part")
+
+            # Downloads again from the start a corrupted partial file
+            os.remove(data_path)
+            with open(data_path + ".part", "wb") as partial_file:
+                partial_file.write(b"x" * 1000)
+            await session.download_file("dataset/dummy-data/", data_path)
+            with open(data_path, "rb") as data_file:
+                assert content == data_file.read()
+            assert not os.path.exists(data_path + ".part")
+        finally:
+            await session.aclose()
+            server.stop()
+
+    asyncio.run(run_scenario())
+
+
+def test_dataset_download_is_compressed(tmp_path):
+    content = b"".join(b"%d,0.0,1.0,2.0\n" % i for i in range(100000))
+    master_home = tmp_path / "master"
+    (master_home / "dataset").mkdir(parents=True)
+    dataset_path = master_home / "dataset" / "dummy-data.arff"
+    dataset_path.write_bytes(content)
+    data_path = str(tmp_path / "worker" / "dummy-data.arff")
+
+    async def run_scenario():
+        server = get_dataset_app(str(master_home)).listen(18933)
+        session = AsyncHTTPSessionManager("localhost:18933")
+        try:
+            await session.download_file("dataset/dummy-data/", data_path)
+        finally:
+            await session.aclose()
+            server.stop()
+
+    asyncio.run(run_scenario())
+    with open(data_path, "rb") as data_file:
+        assert content == data_file.read()
+    compressed_path = get_compressed_dataset_path(
+        str(master_home), get_file_hash(str(dataset_path)), "gzip"
+    )
+    assert os.path.getsize(compressed_path) < len(content)
+
+
+def test_dataset_sources_with_more_datasets_than_workers():
+    workers = ["w0", "w1", "w2"]
+    datasets = ["d0", "d1", "d2", "d3"]
+    assigned_datasets = assign_datasets(datasets, len(workers))
+    # The master sends each dataset once
+    assert [{"d0": None, "d3": None}, {"d1": None}, {"d2": None}] == (
+        get_worker_dataset_sources(workers, assigned_datasets)
+    )
+
+    # Workers assigned different datasets still share the common ones
+    assigned_datasets = [["d0", "d1", "d2"], ["d0", "d1"], ["d0", "d2"]]
+    assert [
+        {"d0": None, "d1": None, "d2": None},
+        {"d0": "w0", "d1": "w0"},
+        {"d0": "w1", "d2": "w0"},
+    ] == get_worker_dataset_sources(workers, assigned_datasets, fanout=1)
+
+
+def test_worker_heartbeat():
+    worker = Worker.create("localhost", 18937, "localhost:18936")
+
+    async def run_scenario():
+        server = tornado.web.Application(
+            [(r"^/worker/(?P<worker_id>[a-z0-9-]+)/heartbeat/$", WorkerHeartbeatHandler)]
+        ).listen(18936)
+        session = AsyncHTTPSessionManager("localhost:18936")
+        try:
+            url = "worker/{}/heartbeat/".format(worker.id)
+            response = await session.post_json(url, {})
+            assert 200 == response.status_code
+            assert worker.last_heartbeat is not None
+
+            response = await session.post_json("worker/unknown/heartbeat/", {})
+            assert 404 == response.status_code
+        finally:
+            await session.aclose()
+            server.stop()
+
+    try:
+        asyncio.run(run_scenario())
+    finally:
+        worker.delete()
+
+
+def test_roc_plot_is_rendered_on_demand(tmp_path):
+    metrics_file = tmp_path / "metrics.json"
+    metrics_file.write_text(
+        json.dumps({"roc_curve": {"fpr": [0.0, 0.5, 1.0], "tpr": [0.0, 0.8, 1.0]}})
+    )
+    experiment = Experiment.create("roc_suite", "dummy_candidate", "dummy", "k=1")
+    experiment.metrics = str(metrics_file)
+
+    async def run_scenario():
+        server = tornado.web.Application(
+            [(r"^/experiment/(?P<experiment_id>[a-z0-9-]+)/roc.png$", ResultHandler)]
+        ).listen(18938)
+        session = AsyncHTTPSessionManager("localhost:18938")
+        try:
+            url = "experiment/{}/roc.png".format(experiment.id)
+            response = await session.get(url)
+            assert 200 == response.status_code
+            assert response.content.startswith(b"\x89PNG")
+            assert str(tmp_path / "roc.png") == experiment.roc
+
+            # The rendered plot is served from disk
+            os.remove(metrics_file)
+            response = await session.get(url)
+            assert 200 == response.status_code
+        finally:
+            await session.aclose()
+            server.stop()
+
+    try:
+        asyncio.run(run_scenario())
+    finally:
+        experiment.delete()
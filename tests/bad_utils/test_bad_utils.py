@@ -1,8 +1,12 @@
 import numpy as np
 
 from bad_framework.bad_utils import (
+    cache_data_matrix,
     generate_experiments_settings,
+    get_data_cache_path,
     get_parameter_combinations,
+    install_requirements,
+    load_cached_data_matrix,
     load_data_matrix,
 )
 from bad_framework.bad_utils.adt import (
@@ -74,3 +78,79 @@ def test_load_data_matrix(tmp_path):
         ]
     )
     assert expected_matrix.tolist() == load_data_matrix(data_file).tolist()
+
+
+def test_load_cached_data_matrix(tmp_path):
+    dummy_data_content = "\n".join(
+        [
+            "@ RELATION 'Dummy BAD data'",
+            "@ ATTRIBUTE 'id' integer",
+            "@ ATTRIBUTE 'outlier' real",
+            "@ ATTRIBUTE 'att1' real",
+            "",
+            "@ DATA",
+            "0, 0.0, 8.0",
+            "1, 1.0, 0.0",
+        ]
+    )
+    data_file = tmp_path / "dummy.arff"
+    data_file.write_text(dummy_data_content)
+    cache_dir = tmp_path / "cache"
+
+    digest = cache_data_matrix(data_file, cache_dir)
+    assert (cache_dir / (digest + ".npy")).exists()
+    assert str(cache_dir / (digest + ".npy")) == get_data_cache_path(cache_dir, digest)
+
+    data_matrix = load_cached_data_matrix(data_file, cache_dir, digest)
+    assert isinstance(data_matrix, np.memmap)
+    assert [[0.0, 0.0, 8.0], [1.0, 1.0, 0.0]] == data_matrix.tolist()
+
+
+def test_cache_data_matrix_is_keyed_by_content(tmp_path):
+    data_file = tmp_path / "dummy.arff"
+    cache_dir = tmp_path / "cache"
+    data_file.write_text("@ DATA\n0, 0.0, 1.0\n1, 0.0, 1.0\n")
+    first_digest = cache_data_matrix(data_file, cache_dir)
+    assert first_digest == cache_data_matrix(data_file, cache_dir)
+
+    data_file.write_text("@ DATA\n0, 1.0, 2.0\n1, 0.0, 1.0\n")
+    second_digest = cache_data_matrix(data_file, cache_dir)
+    assert first_digest != second_digest
+    expected_matrix = [[0.0, 1.0, 2.0], [1.0, 0.0, 1.0]]
+    assert expected_matrix == load_cached_data_matrix(data_file, cache_dir).tolist()
+
+
+def test_install_requirements_from_wheelhouse(monkeypatch):
+    commands = []
+
+    def dummy_call(command):
+        commands.append(command)
+        # The first offline install fails because the wheelhouse is empty
+        return 1 if len(commands) == 1 else 0
+
+    monkeypatch.setattr("subprocess.call", dummy_call)
+    monkeypatch.setattr("subprocess.check_call", dummy_call)
+    install_requirements(["pyod"], "wheelhouse", interpreter="python")
+    assert [
+        [
+            "python",
+            "-m",
+            "pip",
+            "install",
+            "--no-index",
+            "--find-links",
+            "wheelhouse",
+            "pyod",
+        ],
+        ["python", "-m", "pip", "wheel", "--wheel-dir", "wheelhouse", "pyod"],
+        [
+            "python",
+            "-m",
+            "pip",
+            "install",
+            "--no-index",
+            "--find-links",
+            "wheelhouse",
+            "pyod",
+        ],
+    ] == commands
@@ -0,0 +1,21 @@
+from bad_framework.bad_utils.compression import (
+    compress_file,
+    decompress_file,
+    get_supported_encodings,
+)
+
+
+def test_compress_file(tmp_path):
+    content = b"@DATA\n" + b"0,0.0,1.0\n" * 1000
+    data_file = tmp_path / "data.arff"
+    data_file.write_bytes(content)
+    for encoding in get_supported_encodings():
+        compressed_path = str(tmp_path / "data.arff.{}".format(encoding))
+        compress_file(str(data_file), compressed_path, encoding)
+        decompressed_path = str(tmp_path / "decompressed.arff")
+        decompress_file(compressed_path, decompressed_path, encoding)
+        with open(decompressed_path, "rb") as decompressed_file:
+            assert content == decompressed_file.read()
+    assert ["data.arff", "data.arff.gzip", "decompressed.arff"] == sorted(
+        path.name for path in tmp_path.iterdir() if "zstd" not in path.name
+    )
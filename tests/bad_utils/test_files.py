@@ -1,8 +1,13 @@
+import os
+
 import pytest
 
 from bad_framework.bad_utils.files import (
     get_candidate_filename,
     get_candidate_name,
+    get_candidate_sweep_parameter,
+    get_data_shape,
+    get_include_dir,
     parse_parameters,
     parse_requirements,
     save_file,
@@ -117,3 +122,17 @@ def test_save_file(tmp_path):
     save_file(dummy_content, test_file)
 
     assert dummy_content == test_file.read_bytes()
+
+
+def test_get_candidate_sweep_parameter(tmp_path):
+    candidate_file = tmp_path / "candidate.py"
+    candidate_file.write_text('class TestCandidate:\n    sweep_parameter = "k"\n')
+    assert "k" == get_candidate_sweep_parameter(candidate_file)
+
+    candidate_file.write_text("class TestCandidate:\n    pass\n")
+    assert get_candidate_sweep_parameter(candidate_file) is None
+
+
+def test_get_data_shape():
+    data_path = os.path.join(get_include_dir(), "data", "glass.arff")
+    assert (213, 9) == get_data_shape(data_path)
@@ -0,0 +1,66 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+import bad_framework
+from bad_framework.bad_utils.lazy import lazy_import
+
+# Cumulative import time budget of the server modules, in microseconds
+SERVER_IMPORT_BUDGET = 1000000
+HEAVY_MODULES = ("jinja2", "httpx", "matplotlib", "numpy", "requests", "sklearn")
+
+
+def test_lazy_import():
+    # Not imported by the test suite, so the first access imports it
+    module_name = "xml.dom.minidom"
+    sys.modules.pop(module_name, None)
+    minidom = lazy_import(module_name)
+    assert module_name not in sys.modules
+
+    assert "<a/>" == minidom.parseString("<a/>").documentElement.toxml()
+    assert module_name in sys.modules
+    assert "parseString" in dir(minidom)
+
+
+def test_lazy_import_of_missing_module():
+    missing_module = lazy_import("bad_framework.missing")
+    with pytest.raises(ImportError):
+        missing_module.missing_function()
+
+
+def get_import_times(module_name):
+    """Imports a module in a new interpreter, with -X importtime.
+
+    :param module_name: (string) module name.
+    :return: (dict) module name -> cumulative import time, in microseconds.
+    """
+    importtime_output = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import " + module_name],
+        stderr=subprocess.PIPE,
+        universal_newlines=True,
+        check=True,
+        # Other tests may change the working directory
+        cwd=os.path.dirname(os.path.dirname(bad_framework.__file__)),
+    ).stderr
+    import_times = {}
+    for line in importtime_output.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative_time, imported_module = line.split("|")
+        import_times[imported_module.strip()] = int(cumulative_time)
+    return import_times
+
+
+@pytest.mark.parametrize(
+    "server_module",
+    ["bad_framework.bad_worker.server", "bad_framework.bad_master.server"],
+)
+def test_server_import_time(server_module):
+    import_times = get_import_times(server_module)
+    assert import_times[server_module] < SERVER_IMPORT_BUDGET
+    imported_heavy_modules = [
+        module_name for module_name in HEAVY_MODULES if module_name in import_times
+    ]
+    assert [] == imported_heavy_modules
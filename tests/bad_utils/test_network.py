@@ -0,0 +1,62 @@
+import asyncio
+
+import pytest
+
+from bad_framework.bad_utils.network import (
+    AsyncHTTPSessionManager,
+    MockHTTPHandler,
+    MockServer,
+)
+
+
+@pytest.fixture(scope="function")
+def mock_server():
+    server = MockServer(MockHTTPHandler, port=18931)
+    server.start()
+    yield "localhost:18931"
+    server.stop()
+    MockHTTPHandler.clear()
+
+
+def test_get_session_is_shared():
+    session = AsyncHTTPSessionManager.get_session("dummy.host:1234")
+    assert session is AsyncHTTPSessionManager.get_session("dummy.host:1234")
+    assert session is not AsyncHTTPSessionManager.get_session("dummy.host:4321")
+    asyncio.run(AsyncHTTPSessionManager.close_all())
+    assert session.is_closed
+
+
+def test_get_session_after_close():
+    session = AsyncHTTPSessionManager.get_session("dummy.host:1234")
+    asyncio.run(session.aclose())
+    assert session is not AsyncHTTPSessionManager.get_session("dummy.host:1234")
+    asyncio.run(AsyncHTTPSessionManager.close_all())
+
+
+def test_check_health_with_unreachable_host():
+    async def run_scenario():
+        session = AsyncHTTPSessionManager("localhost:1")
+        try:
+            with pytest.raises(ValueError):
+                await session.check_health()
+        finally:
+            await session.aclose()
+
+    asyncio.run(run_scenario())
+
+
+def test_get_json_reuses_client(mock_server):
+    MockHTTPHandler.serve({"status": "ok"}, at="/status/")
+
+    async def run_scenario():
+        session = AsyncHTTPSessionManager(mock_server)
+        try:
+            await session.check_health()
+            for _ in range(3):
+                assert {"status": "ok"} == await session.get_json("status/")
+            assert not session.is_closed
+        finally:
+            await session.aclose()
+        assert session.is_closed
+
+    asyncio.run(run_scenario())
@@ -0,0 +1,100 @@
+import asyncio
+import io
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+from bad_framework.bad_worker.env_runner import serve
+from bad_framework.bad_worker.envs import (
+    RUNNER_REQUIREMENTS,
+    EnvironmentPool,
+    create_environment,
+    evict_environments,
+    get_environment_dir,
+    get_environment_python,
+)
+
+
+def test_env_runner_serve():
+    calls = io.StringIO(
+        "\n".join(
+            [
+                json.dumps(
+                    {
+                        "function": "bad_framework.bad_utils:get_parameter_string",
+                        "args": [{"a": 1}],
+                    }
+                ),
+                json.dumps({"function": "os:getcwd", "args": []}),
+            ]
+        )
+    )
+    replies = io.StringIO()
+    serve(calls, replies)
+    first_reply, second_reply = replies.getvalue().splitlines()
+    assert {"result": "a=1"} == json.loads(first_reply)
+    assert "error" in json.loads(second_reply)
+
+
+def test_environment_pool(tmp_path):
+    other_python = str(tmp_path / "python")
+    os.symlink(sys.executable, other_python)
+    ping = "bad_framework.bad_worker.env_runner:ping"
+
+    async def run_scenario():
+        pool = EnvironmentPool(max_processes=1)
+        try:
+            first_pid = await pool.call(sys.executable, ping)
+            assert first_pid == await pool.call(sys.executable, ping)
+
+            # The pool is full, the idle process is replaced
+            assert first_pid != await pool.call(other_python, ping)
+            assert {other_python} == pool.get_environments()
+
+            with pytest.raises(RuntimeError):
+                await pool.call(other_python, "bad_framework.bad_utils:missing")
+        finally:
+            await pool.close()
+
+    asyncio.run(run_scenario())
+
+
+def test_evict_environments(tmp_path):
+    home_dir = str(tmp_path)
+    env_dirs = [get_environment_dir(home_dir, "env_{}".format(i)) for i in range(3)]
+    for last_use, env_dir in enumerate(env_dirs):
+        os.makedirs(env_dir)
+        ready_path = os.path.join(env_dir, "bad_ready")
+        open(ready_path, "w").close()
+        os.utime(ready_path, (last_use, last_use))
+
+    assert [env_dirs[0]] == evict_environments(home_dir, 1, keep=[env_dirs[1]])
+    assert [False, True, True] == [os.path.isdir(env_dir) for env_dir in env_dirs]
+
+
+def test_create_environment_is_isolated(tmp_path, monkeypatch):
+    installed_requirements = []
+    monkeypatch.setattr(
+        "bad_framework.bad_worker.envs.install_requirements",
+        lambda requirements, *args, **kwargs: installed_requirements.append(requirements),
+    )
+    env_dir = str(tmp_path / "env")
+    create_environment(env_dir, ["dummy-package"])
+    assert [RUNNER_REQUIREMENTS, ["dummy-package"]] == installed_requirements
+
+    # The worker packages are not importable from the environment
+    env_python = get_environment_python(env_dir)
+    assert 0 != subprocess.call([env_python, "-c", "import tornado"], cwd=env_dir)
+
+    async def run_scenario():
+        pool = EnvironmentPool(max_processes=1)
+        try:
+            ping = "bad_framework.bad_worker.env_runner:ping"
+            assert await pool.call(env_python, ping) > 0
+        finally:
+            await pool.close()
+
+    asyncio.run(run_scenario())
@@ -0,0 +1,178 @@
+import asyncio
+import json
+import os
+import shutil
+import sys
+
+import numpy as np
+import pytest
+
+from bad_framework.bad_candidates.knn import KNN
+from bad_framework.bad_utils.files import get_include_dir
+from bad_framework.bad_utils.magic import RESOURCE_USAGE_FIELDS, TIMING_FIELDS
+from bad_framework.bad_worker.envs import EnvironmentPool
+from bad_framework.bad_worker.runner import (
+    get_candidate_path,
+    get_data_path,
+    get_roc_curve,
+    get_sweep_values,
+    load_candidate_class,
+    run_experiments,
+)
+
+
+def test_load_candidate_class_is_cached(tmp_path):
+    candidate_file = tmp_path / "candidate.py"
+    candidate_file.write_text("class FirstCandidate:\n    pass\n")
+
+    candidate_class = load_candidate_class(candidate_file, "dummy_suite")
+    assert "FirstCandidate" == candidate_class.__name__
+    assert candidate_class is load_candidate_class(candidate_file, "dummy_suite")
+
+
+def test_load_candidate_class_after_file_change(tmp_path):
+    candidate_file = tmp_path / "candidate.py"
+    candidate_file.write_text("class FirstCandidate:\n    pass\n")
+    first_class = load_candidate_class(candidate_file, "dummy_suite")
+
+    candidate_file.write_text("class SecondCandidate:\n    pass\n")
+    second_class = load_candidate_class(candidate_file, "dummy_suite")
+    assert first_class is not second_class
+    assert "SecondCandidate" == second_class.__name__
+
+
+def test_get_roc_curve():
+    random_state = np.random.RandomState(1)
+    labels = random_state.randint(2, size=1000)
+    scores = labels + random_state.normal(size=1000)
+
+    roc_curve = get_roc_curve(labels, scores, max_points=20)
+    assert 2 < len(roc_curve["fpr"]) <= 20
+    assert (0.0, 0.0) == (roc_curve["fpr"][0], roc_curve["tpr"][0])
+    assert (1.0, 1.0) == (roc_curve["fpr"][-1], roc_curve["tpr"][-1])
+    assert roc_curve == get_roc_curve(labels, scores, max_points=20)
+    assert len(get_roc_curve(labels, scores)["fpr"]) > 20
+
+
+def test_get_sweep_values():
+    experiments = [
+        ("exp_1", {"k": "5", "seed": "1"}),
+        ("exp_2", {"k": "10", "seed": "1"}),
+    ]
+    assert [5, 10] == get_sweep_values(KNN, experiments)
+    assert get_sweep_values(KNN, experiments[:1]) is None
+
+    experiments.append(("exp_3", {"k": "5", "seed": "2"}))
+    assert get_sweep_values(KNN, experiments) is None
+
+
+def create_suite(tmp_path, candidate_source):
+    """Creates a suite with the given candidate module and the dummy data set
+    in the worker home directory tmp_path."""
+    home_dir = str(tmp_path)
+    candidate_path = tmp_path / "dummy_suite" / "candidate.py"
+    candidate_path.parent.mkdir()
+    candidate_path.write_text(candidate_source)
+    assert str(candidate_path) == get_candidate_path(home_dir, "dummy_suite")
+    data_path = get_data_path(home_dir, "dummy")
+    (tmp_path / "datasets").mkdir()
+    shutil.copyfile(
+        os.path.join(get_include_dir(), "data", "dummy.arff"),
+        data_path,
+    )
+    return home_dir
+
+
+def test_run_experiments_with_invalid_sweep_value(tmp_path):
+    home_dir = create_suite(
+        tmp_path,
+        "from bad_framework.bad_candidates.knn import KNN\n\n\n"
+        "class SweepKNN(KNN):\n    pass\n",
+    )
+    experiments = [
+        ("exp_{}".format(k), {"k": str(k), "seed": "1", "trainset_size": "1.0"})
+        for k in (0, 1, 3)
+    ]
+
+    results = run_experiments(home_dir, "dummy_suite", None, "dummy", None, experiments)
+    assert ["exp_0", "exp_1", "exp_3"] == [r["experiment_id"] for r in results]
+    assert "error" in results[0]
+    for result in results[1:]:
+        assert "error" not in result
+        assert result["execution_time"] > 0
+        with open(result["metrics_path"]) as metrics_file:
+            metrics = json.load(metrics_file)
+        assert set(RESOURCE_USAGE_FIELDS) == set(metrics["resources"])
+        assert metrics["resources"]["peak_rss"] > 0
+        assert set(TIMING_FIELDS) == set(metrics["timings"])
+        # The sweep failed: the experiments ran one by one
+        assert 1 == metrics["sweep_size"]
+        assert len(metrics["roc_curve"]["fpr"]) == len(metrics["roc_curve"]["tpr"])
+
+
+def test_run_experiments_as_sweep(tmp_path):
+    home_dir = create_suite(
+        tmp_path,
+        "from bad_framework.bad_candidates.knn import KNN\n\n\n"
+        "class SweepKNN(KNN):\n    pass\n",
+    )
+    experiments = [
+        ("exp_{}".format(k), {"k": str(k), "seed": "1", "trainset_size": "1.0"})
+        for k in (1, 3)
+    ]
+
+    results = run_experiments(home_dir, "dummy_suite", None, "dummy", None, experiments)
+    timings = []
+    for result in results:
+        with open(result["metrics_path"]) as metrics_file:
+            metrics = json.load(metrics_file)
+        assert 2 == metrics["sweep_size"]
+        timings.append(metrics["timings"])
+    assert set(TIMING_FIELDS) == set(timings[0])
+    # The experiments share the data load and the fit
+    first_timings, second_timings = timings
+    for field in ("load_time_ns", "fit_time_ns", "score_time_ns"):
+        assert first_timings[field] == second_timings[field]
+
+
+def test_run_experiments_with_resource_limits(tmp_path):
+    home_dir = create_suite(
+        tmp_path,
+        "class GreedyCandidate:\n"
+        "    def __init__(self, greed, **parameters):\n"
+        "        self.greed = greed\n\n"
+        "    def fit(self, training_matrix):\n"
+        "        if self.greed == 'memory':\n"
+        "            self.buffer = bytearray(4 * 1024 ** 3)\n"
+        "        while self.greed == 'cpu':\n"
+        "            pass\n"
+        "        return self\n",
+    )
+    run_experiments = "bad_framework.bad_worker.runner:run_experiments"
+
+    def get_experiments(greed):
+        return [("exp_1", {"greed": greed, "seed": "1", "trainset_size": "1.0"})]
+
+    async def run_scenario():
+        pool = EnvironmentPool(max_processes=1, memory_limit=1024**3)
+        try:
+            (result,) = await pool.call(
+                sys.executable,
+                run_experiments,
+                *(home_dir, "dummy_suite", None, "dummy", None),
+                get_experiments("memory"),
+            )
+            assert "MemoryError" == result["error"]
+
+            with pytest.raises(RuntimeError, match="CPU time limit"):
+                await pool.call(
+                    sys.executable,
+                    run_experiments,
+                    *(home_dir, "dummy_suite", None, "dummy", None),
+                    get_experiments("cpu"),
+                    cpu_limit=1,
+                )
+        finally:
+            await pool.close()
+
+    asyncio.run(run_scenario())
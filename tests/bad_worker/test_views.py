@@ -0,0 +1,68 @@
+import asyncio
+
+import pytest
+import tornado.web
+
+from bad_framework.bad_utils.network import AsyncHTTPSessionManager
+from bad_framework.bad_worker.runner import get_data_path
+from bad_framework.bad_worker.views import DatasetHandler, StopHandler
+
+
+def test_dataset_handler_waits_for_download(tmp_path):
+    worker_home = str(tmp_path / "worker")
+    peer_data_path = str(tmp_path / "peer" / "dummy.arff")
+
+    async def run_scenario():
+        dataset_downloads = {"dummy": asyncio.get_event_loop().create_future()}
+        app = tornado.web.Application(
+            [(r"/dataset/(?P<dataset_name>[a-z0-9-]+)/", DatasetHandler)],
+            dataset_downloads=dataset_downloads,
+            worker_home=worker_home,
+        )
+        server = app.listen(18934)
+        session = AsyncHTTPSessionManager("localhost:18934")
+        try:
+            with pytest.raises(ValueError):
+                await session.download_file("dataset/missing/", peer_data_path)
+
+            peer_download = asyncio.ensure_future(
+                session.download_file("dataset/dummy/", peer_data_path)
+            )
+            await asyncio.sleep(0.05)
+            assert not peer_download.done()
+
+            data_path = get_data_path(worker_home, "dummy")
+            tmp_path.joinpath("worker", "datasets").mkdir(parents=True)
+            with open(data_path, "w") as data_file:
+                data_file.write("@DATA\n0,0.0,1.0\n")
+            dataset_downloads.pop("dummy").set_result(None)
+            await asyncio.wait_for(peer_download, timeout=5)
+        finally:
+            await session.aclose()
+            server.stop()
+
+    asyncio.run(run_scenario())
+    with open(peer_data_path, "r") as peer_data_file:
+        assert "@DATA\n0,0.0,1.0\n" == peer_data_file.read()
+
+
+def test_stop_handler_cancels_run():
+    async def run_scenario():
+        run = asyncio.ensure_future(asyncio.sleep(10))
+        app = tornado.web.Application([(r"/stop/", StopHandler)], runs={"run-1": run})
+        server = app.listen(18935)
+        session = AsyncHTTPSessionManager("localhost:18935")
+        try:
+            response = await session.post_json("stop/", {"run_id": "run-0"})
+            assert 200 == response.status_code
+            assert not run.done()
+
+            response = await session.post_json("stop/", {"run_id": "run-1"})
+            assert 200 == response.status_code
+            await asyncio.sleep(0.01)
+            assert run.cancelled()
+        finally:
+            await session.aclose()
+            server.stop()
+
+    asyncio.run(run_scenario())